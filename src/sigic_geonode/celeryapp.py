@@ -20,16 +20,15 @@
 
 from __future__ import absolute_import
 
-import json
 import logging
 import os
 
-import requests
 from celery import Celery
 from geonode.base import enumerations
-from requests.auth import HTTPBasicAuth
 
+from sigic_geonode.sigic_georeference import jobs
 from sigic_geonode.sigic_georeference.utils import get_dataset, get_name_from_ds
+from sigic_geonode.utils.geoserver_client import geoserver
 
 logger = logging.getLogger(__name__)
 
@@ -49,9 +48,32 @@ def debug_task(self):
 
 
 def set_dataset_failed(self, exc, task_id, args, kwargs, einfo):
-    ds = get_dataset(args["layer_id"])
+    ds = get_dataset(args[0] if args else kwargs["layer_id"])
     ds.state = enumerations.STATE_INVALID
     ds.save()
+    jobs.fail_job(kwargs.get("job_id"), f"failed syncing geoserver: {exc}")
+
+
+@app.task(
+    bind=True,
+    name="sigic_geonode.join_dataframes",
+    queue="sigic_geonode.sync_geoserver",
+)
+def join_dataframes(self, job_id: str, params: dict):
+    """
+    Run a dataset join queued by JoinDataframes (see sigic_georeference.jobs).
+    On success it chains sync_geoserver and generate_column_styles for the
+    same job; they report the remaining phases and release the join lock.
+    """
+    from sigic_geonode.sigic_georeference.table_operations import run_join
+
+    try:
+        run_join(job_id, params)
+    except Exception as e:
+        logger.warning(f"join_dataframes failed for job {job_id}: {e}")
+        jobs.fail_job(job_id, str(e))
+        return {"status": "failed", "job_id": job_id, "msg": str(e)}
+    return {"status": "queued sync", "job_id": job_id}
 
 
 @app.task(
@@ -61,27 +83,17 @@ def set_dataset_failed(self, exc, task_id, args, kwargs, einfo):
     max_retries=5,
     on_failure=set_dataset_failed,
 )
-def sync_geoserver(self, layer_id: int):
-    gs_server = os.getenv("GEOSERVER_LOCATION", "")
-    url = (
-        f"{gs_server}rest/workspaces/geonode/datastores/sigic_geonode_data/featuretypes"
-    )
-
+def sync_geoserver(self, layer_id: int, job_id: str = None):
     ds = get_dataset(layer_id)
     if ds.state not in [enumerations.STATE_WAITING, enumerations.STATE_INVALID]:
+        jobs.fail_job(job_id, f"dataset not in valid state to sync: {ds.state}")
         return {"status": "failed", "msg": "Dataset not in valid state"}
     layer = get_name_from_ds(ds)
+    jobs.set_phase(job_id, jobs.PHASE_SYNCING_GEOSERVER)
 
     try:
         # Obtener los datos actuales para sobrescribir
-        response = requests.get(
-            f"{url}/{layer}.json",
-            auth=HTTPBasicAuth(
-                username=os.getenv("GEOSERVER_ADMIN_USER", ""),
-                password=os.getenv("GEOSERVER_ADMIN_PASSWORD", ""),
-            ),
-            timeout=15,
-        )
+        response = geoserver.get_featuretype("geonode", "sigic_geonode_data", layer)
         if response.status_code != 200:
             raise Exception(f"Geoserver did not respond with 200, dataset {ds.id}")
 
@@ -89,15 +101,12 @@ def sync_geoserver(self, layer_id: int):
         feature_types = response.json()
         feature_types["featureType"]["srs"] = ds.srid
 
-        response = requests.put(
-            f"{url}/{layer}.json?recalculate=nativebbox,latlonbbox",
-            data=json.dumps(feature_types),
-            auth=HTTPBasicAuth(
-                username=os.getenv("GEOSERVER_ADMIN_USER", ""),
-                password=os.getenv("GEOSERVER_ADMIN_PASSWORD", ""),
-            ),
-            headers={"Content-Type": "application/json"},
-            timeout=15,
+        response = geoserver.put_featuretype(
+            "geonode",
+            "sigic_geonode_data",
+            layer,
+            feature_types,
+            recalculate="nativebbox,latlonbbox",
         )
         if response.status_code != 200:
             raise Exception(f"Geoserver did not respond with 200, dataset {ds.id}")
@@ -118,11 +127,12 @@ def sync_geoserver(self, layer_id: int):
     queue="sigic_geonode.sync_geoserver",
     max_retries=3,
 )
-def generate_column_styles(self, layer_id: int, data_columns: list):
+def generate_column_styles(self, layer_id: int, data_columns: list, job_id: str = None):
     """
     Generate smart SLD styles for each data column added via a join operation.
     Runs as the second step in a Celery chain after sync_geoserver.
-    Style generation failure is non-fatal for the dataset state.
+    Style generation failure is non-fatal for the dataset state (the join job
+    finishes with a warning).
     """
     from sigic_geonode.sigic_georeference.style_generator import (
         generate_and_register_styles,
@@ -133,12 +143,17 @@ def generate_column_styles(self, layer_id: int, data_columns: list):
         logger.warning(
             f"generate_column_styles: dataset {layer_id} not STATE_PROCESSED, skipping"
         )
+        jobs.fail_job(job_id, f"dataset not processed after sync: {ds.state}")
         return {"status": "skipped", "reason": "dataset not in STATE_PROCESSED"}
 
+    jobs.set_phase(job_id, jobs.PHASE_GENERATING_STYLES)
     try:
         generate_and_register_styles(ds, data_columns)
     except Exception as e:
         logger.error(f"generate_column_styles failed for dataset {layer_id}: {e}")
+        if self.request.retries >= self.max_retries:
+            jobs.finish_job(job_id, warning=f"style generation failed: {e}")
         raise self.retry(exc=e, countdown=30)
 
+    jobs.finish_job(job_id)
     return {"status": "success", "layer_id": layer_id, "columns": data_columns}
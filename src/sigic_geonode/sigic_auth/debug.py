@@ -2,6 +2,8 @@ from django.views.decorators.csrf import csrf_exempt
 from django.http import JsonResponse
 from geonode.base import auth as gba
 from sigic_geonode.sigic_auth.keycloak import KeycloakJWTAuthentication
+from sigic_geonode.sigic_auth.guard import rejection_guard
+from sigic_geonode.sigic_auth.token_cache import token_cache
 import re
 
 try:
@@ -114,6 +116,9 @@ def whoami(request):
             raw = _extract_bearer(auth_header)
             out["details"]["bearer_is_jwt_format"] = _is_jwt(raw)
             out["details"]["bearer_raw"] = _summarize_token(raw, full=verbose)
+            if verbose:
+                out["details"]["token_cache"] = token_cache.stats()
+                out["details"]["rejections"] = rejection_guard.stats()
 
             kc_user = None
             try:
@@ -0,0 +1,187 @@
+# ==============================================================================
+#  SIGIC – Sistema Integral de Gestión e Información Científica
+#
+#  Derechos patrimoniales: CentroGeo (2025)
+#
+#  Nota:
+#    Este código fue desarrollado para el proyecto SIGIC de
+#    CentroGeo. Se mantiene crédito de autoría, pero la titularidad del código
+#    pertenece a CentroGeo conforme a obra por encargo.
+#
+#  SPDX-License-Identifier: LicenseRef-SIGIC-CentroGeo
+# ==============================================================================
+
+"""
+Protección ante tormentas de tokens inválidos o expirados.
+
+- Cache negativo: el digest de un token que falló la verificación se recuerda
+  `KEYCLOAK_REJECTED_TOKEN_TTL` segundos; reintentos con el mismo token se
+  rechazan sin JWKS ni criptografía.
+- Conteo por cliente: los rechazos de cada IP se cuentan en ventanas de
+  `KEYCLOAK_CLIENT_FAILURE_WINDOW` segundos y el total se registra en el log.
+  Es solo observabilidad: nunca se rechaza un token sin verificar su firma
+  por la IP de origen (bloquearía a todos los usuarios detrás de un NAT).
+  X-Real-IP solo se acepta si la conexión viene de un proxy listado en
+  `KEYCLOAK_TRUSTED_PROXIES`.
+
+Los rechazos se cuentan por motivo y se registran en el logger
+`geonode.sigic_auth` con campos estructurados (sin imprimir el token).
+"""
+
+import logging
+import os
+import threading
+from collections import Counter
+
+from django.core.cache import cache
+
+from .token_cache import token_digest
+
+log = logging.getLogger("geonode.sigic_auth")
+
+REJECTED_TOKEN_TTL = int(os.getenv("KEYCLOAK_REJECTED_TOKEN_TTL", "60"))
+CLIENT_FAILURE_WINDOW = int(os.getenv("KEYCLOAK_CLIENT_FAILURE_WINDOW", "60"))
+
+REJECTED_KEY_PREFIX = "sigic_kc_rejected_"
+CLIENT_FAILURES_KEY_PREFIX = "sigic_kc_failures_"
+
+TRUSTED_PROXIES = frozenset(
+    ip.strip()
+    for ip in os.getenv("KEYCLOAK_TRUSTED_PROXIES", "").split(",")
+    if ip.strip()
+)
+
+REASON_CACHED = "cached_rejection"
+# kid que el JWKS aún no publica: puede ser una llave recién rotada y el
+# mismo token validar en cuanto se vuelva a leer el JWKS, así que nunca se
+# guarda en el cache negativo
+REASON_UNKNOWN_KID = "unknown_kid"
+NOT_REMEMBERED_REASONS = frozenset({REASON_UNKNOWN_KID})
+
+
+def client_id(request, trusted_proxies=TRUSTED_PROXIES):
+    """
+    IP del cliente. X-Real-IP (fijado por nginx) solo se usa si REMOTE_ADDR
+    es un proxy de confianza; en otro caso el encabezado es falsificable.
+    """
+    meta = getattr(request, "META", None) or {}
+    remote = meta.get("REMOTE_ADDR") or None
+    if remote in trusted_proxies:
+        return meta.get("HTTP_X_REAL_IP") or remote
+    return remote
+
+
+class RejectionGuard:
+    def __init__(
+        self,
+        rejected_ttl: int = REJECTED_TOKEN_TTL,
+        failure_window: int = CLIENT_FAILURE_WINDOW,
+    ):
+        self.rejected_ttl = rejected_ttl
+        self.failure_window = failure_window
+        self._lock = threading.Lock()
+        self.rejections = Counter()
+
+    def check(self, token: str) -> tuple:
+        """
+        Regresa `(motivo, detalle)` si este mismo token fue rechazado hace poco,
+        o `(None, None)` si debe seguir el flujo normal.
+        """
+        try:
+            detail = cache.get(f"{REJECTED_KEY_PREFIX}{token_digest(token)}")
+        except Exception as e:
+            log.debug("[sigic_auth] guard cache no disponible: %s", e)
+            return None, None
+
+        if detail is not None:
+            return REASON_CACHED, detail
+        return None, None
+
+    async def acheck(self, token: str) -> tuple:
+        """Versión async de `check` (Django async cache API)."""
+        try:
+            detail = await cache.aget(f"{REJECTED_KEY_PREFIX}{token_digest(token)}")
+        except Exception as e:
+            log.debug("[sigic_auth] guard cache no disponible: %s", e)
+            return None, None
+
+        if detail is not None:
+            return REASON_CACHED, detail
+        return None, None
+
+    def record(
+        self, token: str, client, reason: str, detail: str, remember: bool = True
+    ):
+        """
+        Cuenta y registra un rechazo; si `remember` (y el motivo no está en
+        `NOT_REMEMBERED_REASONS`), lo guarda en el cache negativo.
+        """
+        digest = token_digest(token)
+        with self._lock:
+            self.rejections[reason] += 1
+
+        failures = None
+        try:
+            if self._remembers(reason, remember):
+                cache.set(
+                    f"{REJECTED_KEY_PREFIX}{digest}", detail, timeout=self.rejected_ttl
+                )
+            if client and reason != REASON_CACHED:
+                key = f"{CLIENT_FAILURES_KEY_PREFIX}{client}"
+                cache.add(key, 0, timeout=self.failure_window)
+                failures = cache.incr(key)
+        except Exception as e:
+            log.debug("[sigic_auth] guard cache no disponible: %s", e)
+
+        self._log(digest, client, reason, detail, failures)
+
+    async def arecord(
+        self, token: str, client, reason: str, detail: str, remember: bool = True
+    ):
+        """Versión async de `record`."""
+        digest = token_digest(token)
+        with self._lock:
+            self.rejections[reason] += 1
+
+        failures = None
+        try:
+            if self._remembers(reason, remember):
+                await cache.aset(
+                    f"{REJECTED_KEY_PREFIX}{digest}", detail, timeout=self.rejected_ttl
+                )
+            if client and reason != REASON_CACHED:
+                key = f"{CLIENT_FAILURES_KEY_PREFIX}{client}"
+                await cache.aadd(key, 0, timeout=self.failure_window)
+                failures = await cache.aincr(key)
+        except Exception as e:
+            log.debug("[sigic_auth] guard cache no disponible: %s", e)
+
+        self._log(digest, client, reason, detail, failures)
+
+    def _remembers(self, reason: str, remember: bool) -> bool:
+        return (
+            remember and reason not in NOT_REMEMBERED_REASONS and self.rejected_ttl > 0
+        )
+
+    def _log(self, digest, client, reason, detail, failures):
+        log.info(
+            "[sigic_auth] bearer rechazado reason=%s client=%s token=%s failures=%s detail=%s",
+            reason,
+            client,
+            digest[:12],
+            failures,
+            detail,
+            extra={
+                "sigic_auth_reason": reason,
+                "sigic_auth_client": client,
+                "sigic_auth_token_digest": digest[:12],
+                "sigic_auth_client_failures": failures,
+            },
+        )
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self.rejections)
+
+
+rejection_guard = RejectionGuard()
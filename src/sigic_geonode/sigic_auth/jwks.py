@@ -0,0 +1,180 @@
+# ==============================================================================
+#  SIGIC – Sistema Integral de Gestión e Información Científica
+#
+#  Derechos patrimoniales: CentroGeo (2025)
+#
+#  Nota:
+#    Este código fue desarrollado para el proyecto SIGIC de
+#    CentroGeo. Se mantiene crédito de autoría, pero la titularidad del código
+#    pertenece a CentroGeo conforme a obra por encargo.
+#
+#  SPDX-License-Identifier: LicenseRef-SIGIC-CentroGeo
+# ==============================================================================
+
+"""
+Almacén en proceso de las llaves públicas (JWKS) del realm de Keycloak.
+
+Evita un GET al IdP por cada request Bearer:
+- Las llaves se cachean por proceso durante `KEYCLOAK_JWKS_CACHE_TTL` segundos.
+- Un `kid` desconocido provoca *un* refetch (limitado por
+  `KEYCLOAK_JWKS_MIN_REFRESH_INTERVAL` para que kids basura no golpeen al IdP).
+- El refetch es single-flight: una ráfaga de requests tras expirar el TTL
+  produce una sola llamada; el resto espera y reutiliza el resultado.
+- Si el IdP falla y hay llaves previas, se siguen usando (stale) en lugar de
+  tumbar toda la plataforma. Si no hay ninguna, no se reintenta antes de
+  `KEYCLOAK_JWKS_FAILURE_BACKOFF` segundos: con el IdP caído las requests
+  fallan de inmediato en lugar de esperar cada una su propio timeout.
+
+`aget_key` es la variante async (ASGI): el refetch corre en un hilo
+(`sync_to_async`) por el mismo `_refresh` con lock que `get_key`, de modo que
+el single-flight y el backoff valen para ambos caminos y no se crea estado
+atado a ningún event loop.
+"""
+
+import logging
+import os
+import threading
+import time
+
+import requests
+from asgiref.sync import sync_to_async
+from jose import jwk
+
+log = logging.getLogger("geonode.sigic_auth")
+
+JWKS_CACHE_TTL = int(os.getenv("KEYCLOAK_JWKS_CACHE_TTL", "3600"))
+JWKS_MIN_REFRESH_INTERVAL = int(os.getenv("KEYCLOAK_JWKS_MIN_REFRESH_INTERVAL", "30"))
+JWKS_FETCH_TIMEOUT = float(os.getenv("KEYCLOAK_JWKS_FETCH_TIMEOUT", "5"))
+JWKS_FAILURE_BACKOFF = float(os.getenv("KEYCLOAK_JWKS_FAILURE_BACKOFF", "5"))
+
+
+class JWKSUnavailable(Exception):
+    pass
+
+
+class JWKSKeyStore:
+    def __init__(
+        self,
+        url: str,
+        ttl: int = JWKS_CACHE_TTL,
+        min_refresh_interval: int = JWKS_MIN_REFRESH_INTERVAL,
+        timeout: float = JWKS_FETCH_TIMEOUT,
+        failure_backoff: float = JWKS_FAILURE_BACKOFF,
+    ):
+        self.url = url
+        self.ttl = ttl
+        self.min_refresh_interval = min_refresh_interval
+        self.timeout = timeout
+        self.failure_backoff = failure_backoff
+        self._lock = threading.Lock()
+        # kid -> (dict JWK, llave pública construida o None si aún no se usa)
+        self._keys = {}
+        self._fetched_at = 0.0
+        self._last_attempt = 0.0
+        self._failed_at = None
+        self._attempts = 0
+
+    def get_key(self, kid: str):
+        """
+        Regresa `(jwk_dict, public_key)` para el `kid` dado.
+
+        Lanza `KeyError` si el kid no existe tras el refetch permitido y
+        `JWKSUnavailable` si nunca se pudieron obtener llaves.
+        """
+        now = time.monotonic()
+        attempts = self._attempts
+        fresh = self._keys and now - self._fetched_at < self.ttl
+
+        if not (fresh and kid in self._keys):
+            # TTL expirado o kid desconocido: refetch salvo que sea muy reciente
+            if self._may_refresh(now):
+                self._refresh(attempts)
+
+        if kid not in self._keys:
+            if not self._keys:
+                raise JWKSUnavailable("No fue posible obtener el JWKS de Keycloak")
+            raise KeyError(kid)
+
+        return self._public_key(kid)
+
+    async def aget_key(self, kid: str):
+        """Versión async de `get_key`."""
+        now = time.monotonic()
+        attempts = self._attempts
+        fresh = self._keys and now - self._fetched_at < self.ttl
+
+        if not (fresh and kid in self._keys):
+            if self._may_refresh(now):
+                await sync_to_async(self._refresh, thread_sensitive=False)(attempts)
+
+        if kid not in self._keys:
+            if not self._keys:
+                raise JWKSUnavailable("No fue posible obtener el JWKS de Keycloak")
+            raise KeyError(kid)
+
+        return self._public_key(kid)
+
+    def clear(self):
+        with self._lock:
+            self._keys = {}
+            self._fetched_at = 0.0
+            self._last_attempt = 0.0
+            self._failed_at = None
+            self._attempts += 1
+
+    def _may_refresh(self, now: float) -> bool:
+        if self._keys:
+            return now - self._last_attempt >= self.min_refresh_interval
+        # Sin llaves: se reintenta en cada request salvo tras una falla reciente
+        return self._failed_at is None or now - self._failed_at >= self.failure_backoff
+
+    def _public_key(self, kid):
+        key, public_key = self._keys[kid]
+        if public_key is None:
+            public_key = jwk.construct(key)
+            self._keys[kid] = (key, public_key)
+        return key, public_key
+
+    def _refresh(self, observed_attempts: int):
+        with self._lock:
+            # Otro hilo (o corrutina) ya intentó mientras esperábamos el lock:
+            # reutilizar su resultado
+            if self._attempts != observed_attempts:
+                return
+            if not self._may_refresh(time.monotonic()):
+                return
+            self._attempts += 1
+            self._last_attempt = time.monotonic()
+            try:
+                jwks = self._fetch()
+            except Exception as e:
+                if self._keys:
+                    log.warning(
+                        "[sigic_auth] JWKS refetch falló, se usan llaves previas: %s", e
+                    )
+                else:
+                    log.error("[sigic_auth] JWKS no disponible: %s", e)
+                self._failed_at = time.monotonic()
+                return
+
+            self._store(jwks)
+
+    def _fetch(self) -> dict:
+        response = requests.get(self.url, timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()
+
+    def _store(self, jwks: dict):
+        previous = self._keys
+        keys = {}
+        for key in jwks.get("keys", []):
+            kid = key.get("kid")
+            if not kid or key.get("use", "sig") != "sig":
+                continue
+            # Conserva la llave construida si el JWK no cambió
+            old = previous.get(kid)
+            keys[kid] = old if old and old[0] == key else (key, None)
+        self._keys = keys
+        self._fetched_at = time.monotonic()
+        self._failed_at = None
+        log.debug("[sigic_auth] JWKS actualizado (%d llaves)", len(keys))
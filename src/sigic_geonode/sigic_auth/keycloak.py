@@ -12,24 +12,129 @@
 #  SPDX-License-Identifier: LicenseRef-SIGIC-CentroGeo
 # ==============================================================================
 
+import hashlib
+import json
+import logging
 import os
 from functools import wraps
 
-import requests
+from asgiref.sync import sync_to_async
 from django.contrib.auth import REDIRECT_FIELD_NAME, get_user_model
 from django.contrib.auth.decorators import user_passes_test
+from django.core.cache import cache
 from django.http import JsonResponse
-from jose import jwk, jwt
+from jose import jwt
 from jose.exceptions import ExpiredSignatureError, JWTClaimsError, JWTError
 from jose.utils import base64url_decode
 from rest_framework.authentication import BaseAuthentication
 from rest_framework.exceptions import AuthenticationFailed
 
+from .guard import REASON_UNKNOWN_KID, client_id, rejection_guard
+from .jwks import JWKSKeyStore, JWKSUnavailable
+from .token_cache import token_cache
+
+log = logging.getLogger("geonode.sigic_auth")
+
 SOCIALACCOUNT_OIDC_ID_TOKEN_ISSUER = os.getenv(
     "SOCIALACCOUNT_OIDC_ID_TOKEN_ISSUER", "https://iam.dev.geoint.mx/realms/sigic"
 )
 JWKS_URL = f"{SOCIALACCOUNT_OIDC_ID_TOKEN_ISSUER}/protocol/openid-connect/certs"
 
+# Llaves del realm cacheadas por proceso (TTL + refetch ante kid desconocido)
+jwks_store = JWKSKeyStore(JWKS_URL)
+
+# Atributo del HttpRequest donde se memoriza el resultado de autenticar el Bearer
+REQUEST_AUTH_ATTR = "_sigic_keycloak_auth"
+
+# Hash de los claims de perfil ya sincronizados, por usuario
+PROFILE_DIGEST_KEY_PREFIX = "sigic_kc_profile_"
+PROFILE_SYNC_ASYNC = os.getenv("KEYCLOAK_PROFILE_SYNC_ASYNC", "True").lower() == "true"
+
+
+class UnknownSigningKey(AuthenticationFailed):
+    """El `kid` del token no está en el JWKS (ni tras volver a pedirlo)."""
+
+
+def profile_fields(payload: dict) -> dict:
+    """Campos del User que se derivan de los claims del JWT (solo los presentes)."""
+    fields = {
+        "first_name": payload.get("given_name") or payload.get("first_name"),
+        "last_name": payload.get("family_name") or payload.get("last_name"),
+    }
+    return {k: v for k, v in fields.items() if v}
+
+
+def profile_digest(fields: dict) -> str:
+    return hashlib.sha256(
+        json.dumps(fields, sort_keys=True).encode("utf-8")
+    ).hexdigest()
+
+
+def _synced_profile_digest(user_id):
+    try:
+        return cache.get(f"{PROFILE_DIGEST_KEY_PREFIX}{user_id}")
+    except Exception as e:
+        log.debug("[sigic_auth] profile cache no disponible: %s", e)
+        return None
+
+
+def remember_profile_digest(user_id, digest: str):
+    """Solo después de que el perfil quedó guardado en la base de datos."""
+    try:
+        cache.set(f"{PROFILE_DIGEST_KEY_PREFIX}{user_id}", digest, timeout=None)
+    except Exception as e:
+        log.debug("[sigic_auth] profile cache no disponible: %s", e)
+
+
+async def _asynced_profile_digest(user_id):
+    try:
+        return await cache.aget(f"{PROFILE_DIGEST_KEY_PREFIX}{user_id}")
+    except Exception as e:
+        log.debug("[sigic_auth] profile cache no disponible: %s", e)
+        return None
+
+
+async def aremember_profile_digest(user_id, digest: str):
+    try:
+        await cache.aset(f"{PROFILE_DIGEST_KEY_PREFIX}{user_id}", digest, timeout=None)
+    except Exception as e:
+        log.debug("[sigic_auth] profile cache no disponible: %s", e)
+
+
+def _apply_profile_fields(user, fields: dict) -> dict:
+    """
+    Aplica en memoria los campos que cambiaron (la request actual ya ve los
+    datos nuevos) y los regresa para la escritura diferida.
+    """
+    updated = {k: v for k, v in fields.items() if getattr(user, k) != v}
+    for field, value in updated.items():
+        setattr(user, field, value)
+    return updated
+
+
+def _schedule_profile_sync(user, fields: dict, digest: str):
+    """
+    Encola la escritura del perfil; si Celery no está disponible, escribe
+    directo. El digest se guarda solo cuando la escritura tuvo éxito (aquí o
+    en `sync_user_profile`): si la tarea falla, la siguiente request vuelve
+    a intentarlo.
+    """
+    if PROFILE_SYNC_ASYNC:
+        try:
+            from .tasks import sync_user_profile
+
+            sync_user_profile.apply_async((user.pk, fields, digest))
+            return
+        except Exception as e:
+            log.warning("[sigic_auth] no se pudo encolar sync_user_profile: %s", e)
+    user.save(update_fields=list(fields))
+    remember_profile_digest(user.pk, digest)
+
+
+def _django_request(request):
+    """HttpRequest subyacente (DRF envuelve el original en `request._request`)."""
+    return getattr(request, "_request", request)
+
 
 class KeycloakJWTAuthentication(BaseAuthentication):
     def authenticate(self, request):
@@ -40,56 +145,241 @@ class KeycloakJWTAuthentication(BaseAuthentication):
 
         token = auth_header.split(" ")[1]
 
+        # Middleware, DRF y jwt_or_session_login_required autentican la misma
+        # request: el primero que llega resuelve y los demás reutilizan.
+        http_request = _django_request(request)
+        memo = getattr(http_request, REQUEST_AUTH_ATTR, None)
+        if memo is not None and memo[0] == token:
+            _, result, error = memo
+            if error is not None:
+                raise AuthenticationFailed(error)
+            return result
+
         try:
-            jwks = requests.get(JWKS_URL).json()
-            unverified_header = jwt.get_unverified_header(token)
+            result = self._authenticate_token(token, request)
+        except AuthenticationFailed as e:
+            setattr(http_request, REQUEST_AUTH_ATTR, (token, None, e.detail))
+            raise
+        setattr(http_request, REQUEST_AUTH_ATTR, (token, result, None))
+        return result
 
-            key = next(k for k in jwks["keys"] if k["kid"] == unverified_header["kid"])
-            public_key = jwk.construct(key)
+    async def aauthenticate(self, request):
+        """
+        Versión async de `authenticate` para middleware/vistas ASGI: JWKS vía
+        `aget_key`, cache y ORM con su API async. Comparte memo por request.
+        """
+        auth_header = request.headers.get("Authorization")
 
-            message, encoded_signature = token.rsplit(".", 1)
-            decoded_signature = base64url_decode(encoded_signature.encode("utf-8"))
+        if not auth_header or not auth_header.startswith("Bearer "):
+            return None
+
+        token = auth_header.split(" ")[1]
 
-            if not public_key.verify(message.encode("utf8"), decoded_signature):
-                raise AuthenticationFailed("Firma inválida")
+        http_request = _django_request(request)
+        memo = getattr(http_request, REQUEST_AUTH_ATTR, None)
+        if memo is not None and memo[0] == token:
+            _, result, error = memo
+            if error is not None:
+                raise AuthenticationFailed(error)
+            return result
+
+        try:
+            result = await self._aauthenticate_token(token, request)
+        except AuthenticationFailed as e:
+            setattr(http_request, REQUEST_AUTH_ATTR, (token, None, e.detail))
+            raise
+        setattr(http_request, REQUEST_AUTH_ATTR, (token, result, None))
+        return result
+
+    def _authenticate_token(self, token: str, request):
+        # Token ya verificado en una llamada previa (este u otro worker)
+        cached = token_cache.get(token)
+        if cached is not None:
+            user = token_cache.cached_user(cached)
+            if user is None:
+                user = self.get_cached_user(cached)
+                if user is not None:
+                    token_cache.remember_user(token, user)
+            if user is not None:
+                return user, None
+            token_cache.discard(token)
+
+        # Token rechazado hace poco: sin JWKS ni cripto
+        client = client_id(request)
+        reason, detail = rejection_guard.check(token)
+        if reason is not None:
+            rejection_guard.record(token, client, reason, detail, remember=False)
+            raise AuthenticationFailed(detail)
+
+        try:
+            payload = self.verify_token(token)
+            user = self.get_or_create_user(payload)
+        except Exception as e:
+            reason, detail, remember = self._rejection(e)
+            rejection_guard.record(token, client, reason, detail, remember=remember)
+            raise AuthenticationFailed(detail)
 
-            payload = jwt.decode(
-                token,
-                public_key,
-                algorithms=[key["alg"]],
-                audience="account",
-                issuer=SOCIALACCOUNT_OIDC_ID_TOKEN_ISSUER,
+        token_cache.set(token, user.pk, payload, user=user)
+        return user, None
+
+    async def _aauthenticate_token(self, token: str, request):
+        cached = await token_cache.aget(token)
+        if cached is not None:
+            user = token_cache.cached_user(cached)
+            if user is None:
+                user = await self.aget_cached_user(cached)
+                if user is not None:
+                    token_cache.remember_user(token, user)
+            if user is not None:
+                return user, None
+            await token_cache.adiscard(token)
+
+        client = client_id(request)
+        reason, detail = await rejection_guard.acheck(token)
+        if reason is not None:
+            await rejection_guard.arecord(token, client, reason, detail, remember=False)
+            raise AuthenticationFailed(detail)
+
+        try:
+            payload = await self.averify_token(token)
+            user = await self.aget_or_create_user(payload)
+        except Exception as e:
+            reason, detail, remember = self._rejection(e)
+            await rejection_guard.arecord(
+                token, client, reason, detail, remember=remember
             )
+            raise AuthenticationFailed(detail)
+
+        await token_cache.aset(token, user.pk, payload, user=user)
+        return user, None
+
+    @staticmethod
+    def _rejection(error) -> tuple:
+        """`(motivo, detalle, recordar)` para una excepción de verificación."""
+        if isinstance(error, AuthenticationFailed):
+            message = error.detail
+        else:
+            message = str(error)
+        detail = f"Token inválido: {message}"
+
+        if isinstance(error, ExpiredSignatureError):
+            return "expired", detail, True
+        if isinstance(error, JWTClaimsError):
+            return "invalid_claims", detail, True
+        if isinstance(error, JWTError):
+            return "invalid_token", detail, True
+        if isinstance(error, UnknownSigningKey):
+            # Posible rotación de llaves: no se guarda en el cache negativo
+            return REASON_UNKNOWN_KID, detail, False
+        if isinstance(error, AuthenticationFailed):
+            return "invalid_signature", detail, True
+        if isinstance(error, JWKSUnavailable):
+            # Falla del IdP, no del token: no se guarda en el cache negativo
+            return "jwks_unavailable", detail, False
+        return "error", detail, False
+
+    def verify_token(self, token: str) -> dict:
+        """Verifica firma y claims del token; regresa el payload."""
+        unverified_header = jwt.get_unverified_header(token)
+
+        try:
+            key, public_key = jwks_store.get_key(unverified_header.get("kid"))
+        except KeyError:
+            raise UnknownSigningKey("Llave de firma desconocida (kid)")
+
+        return self._decode(token, key, public_key)
+
+    async def averify_token(self, token: str) -> dict:
+        unverified_header = jwt.get_unverified_header(token)
+
+        try:
+            key, public_key = await jwks_store.aget_key(unverified_header.get("kid"))
+        except KeyError:
+            raise UnknownSigningKey("Llave de firma desconocida (kid)")
+
+        return self._decode(token, key, public_key)
+
+    def _decode(self, token: str, key: dict, public_key) -> dict:
+        message, encoded_signature = token.rsplit(".", 1)
+        decoded_signature = base64url_decode(encoded_signature.encode("utf-8"))
+
+        if not public_key.verify(message.encode("utf8"), decoded_signature):
+            raise AuthenticationFailed("Firma inválida")
+
+        payload = jwt.decode(
+            token,
+            public_key,
+            algorithms=[key["alg"]],
+            audience="account",
+            issuer=SOCIALACCOUNT_OIDC_ID_TOKEN_ISSUER,
+        )
+
+        if "preferred_username" not in payload:
+            raise AuthenticationFailed("Token válido pero sin 'preferred_username'")
+
+        return payload
+
+    def get_or_create_user(self, payload: dict):
+        User = get_user_model()
+
+        email = payload.get("email")
+        fields = profile_fields(payload)
+
+        # Alta: los nombres viajan en el mismo INSERT
+        user, created = User.objects.get_or_create(
+            email=email, username=email, defaults=fields
+        )
+
+        digest = profile_digest(fields)
+        if created:
+            remember_profile_digest(user.pk, digest)
+            return user
 
-            if "preferred_username" not in payload:
-                raise AuthenticationFailed("Token válido pero sin 'preferred_username'")
+        # Sin cambios en los claims desde la última sincronización: nada que hacer
+        if _synced_profile_digest(user.pk) == digest:
+            return user
 
-            User = get_user_model()
+        updated = _apply_profile_fields(user, fields)
+        if updated:
+            _schedule_profile_sync(user, updated, digest)
+        else:
+            remember_profile_digest(user.pk, digest)
+        return user
 
-            email = payload.get("email")
+    async def aget_or_create_user(self, payload: dict):
+        User = get_user_model()
 
-            user, created = User.objects.get_or_create(email=email, username=email)
+        email = payload.get("email")
+        fields = profile_fields(payload)
 
-            updated_fields = []
+        user, created = await User.objects.aget_or_create(
+            email=email, username=email, defaults=fields
+        )
 
-            first_name = payload.get("given_name") or payload.get("first_name")
-            if first_name and user.first_name != first_name:
-                user.first_name = first_name
-                updated_fields.append("first_name")
+        digest = profile_digest(fields)
+        if created:
+            await aremember_profile_digest(user.pk, digest)
+            return user
 
-            last_name = payload.get("family_name") or payload.get("last_name")
-            if last_name and user.last_name != last_name:
-                user.last_name = last_name
-                updated_fields.append("last_name")
+        if await _asynced_profile_digest(user.pk) == digest:
+            return user
 
-            if updated_fields:
-                user.save(update_fields=updated_fields)
+        updated = _apply_profile_fields(user, fields)
+        if updated:
+            # Encolar en Celery es bloqueante: se delega a un hilo
+            await sync_to_async(_schedule_profile_sync)(user, updated, digest)
+        else:
+            await aremember_profile_digest(user.pk, digest)
+        return user
 
-            return user, None
+    def get_cached_user(self, cached: dict):
+        """Usuario de una entrada del token cache; None si ya no existe."""
+        User = get_user_model()
+        return User.objects.filter(pk=cached["user_id"]).first()
 
-        except (ExpiredSignatureError, JWTClaimsError, JWTError, Exception) as e:
-            print("Excepción al autenticar:", e)
-            raise AuthenticationFailed(f"Token inválido: {str(e)}")
+    async def aget_cached_user(self, cached: dict):
+        User = get_user_model()
+        return await User.objects.filter(pk=cached["user_id"]).afirst()
 
 
 def jwt_or_session_login_required(
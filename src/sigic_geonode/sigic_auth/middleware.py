@@ -12,6 +12,8 @@
 #  SPDX-License-Identifier: LicenseRef-SIGIC-CentroGeo
 # ==============================================================================
 
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
 from django.contrib.auth import get_user
 from django.contrib.auth.models import AnonymousUser
 from django.middleware.csrf import CsrfViewMiddleware
@@ -21,6 +23,7 @@ from rest_framework.exceptions import AuthenticationFailed
 from .keycloak import KeycloakJWTAuthentication
 
 # Middleware para saltarse CSRF si viene Authorization Bearer
+# (hereda de MiddlewareMixin: ya es sync y async capable)
 
 
 class SkipCSRFMiddlewareForJWT(CsrfViewMiddleware):
@@ -36,6 +39,8 @@ def _resolve_user(request):
     """
     Respeta sesión si existe. Si no, intenta Bearer con tu KeycloakJWTAuthentication.
     Nunca revienta la request: si el token no sirve, deja AnonymousUser.
+    El resultado queda memorizado en la request, así que DRF y
+    jwt_or_session_login_required no vuelven a verificar el token.
     """
     # Si AuthenticationMiddleware ya autenticó por sesión, respétalo
     user = get_user(request)
@@ -66,16 +71,67 @@ def _resolve_user(request):
     return AnonymousUser()
 
 
+async def _aresolve_user(request):
+    """
+    Versión async de `_resolve_user`. Solo se consulta la sesión (síncrona en
+    Django 4.2) si la request trae cookie de sesión; los clientes Bearer puros
+    se autentican sin salir del event loop.
+    """
+    if settings.SESSION_COOKIE_NAME in request.COOKIES:
+        user = await sync_to_async(get_user)(request)
+        if getattr(user, "is_authenticated", False):
+            return user
+
+    authenticator = KeycloakJWTAuthentication()
+    try:
+        result = await authenticator.aauthenticate(request)
+        if result:
+            user, auth_obj = result
+            request.auth = auth_obj
+            request._cached_user = user
+            return user
+    except AuthenticationFailed:
+        pass
+    except Exception:
+        pass
+
+    return AnonymousUser()
+
+
 class KeycloakUserFromBearerInjectionMiddleware:
     """
     Inyecta request.user si viene Authorization: Bearer ... válido.
     Colócala DESPUÉS de AuthenticationMiddleware.
+
+    Soporta WSGI y ASGI: en modo async el Bearer se resuelve antes de la vista
+    (no hay lazy async posible) y también se expone `request.auser()`.
     """
 
+    sync_capable = True
+    async_capable = True
+
     def __init__(self, get_response):
         self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
 
     def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
         # Reemplazamos request.user por un lazy que resuelve con sesión o Bearer
         request.user = SimpleLazyObject(lambda: _resolve_user(request))
         return self.get_response(request)
+
+    async def __acall__(self, request):
+        # Sin Bearer no hay nada que inyectar: se respeta lo que dejó
+        # AuthenticationMiddleware (sesión o anónimo, resuelto en lazy)
+        if request.META.get("HTTP_AUTHORIZATION", "").startswith("Bearer "):
+            user = await _aresolve_user(request)
+            request.user = user
+
+            async def auser():
+                return user
+
+            request.auser = auser
+        return await self.get_response(request)
@@ -0,0 +1,72 @@
+# ==============================================================================
+#  SIGIC – Sistema Integral de Gestión e Información Científica
+#
+#  Derechos patrimoniales: CentroGeo (2025)
+#
+#  Nota:
+#    Este código fue desarrollado para el proyecto SIGIC de
+#    CentroGeo. Se mantiene crédito de autoría, pero la titularidad del código
+#    pertenece a CentroGeo conforme a obra por encargo.
+#
+#  SPDX-License-Identifier: LicenseRef-SIGIC-CentroGeo
+# ==============================================================================
+
+"""
+Tareas Celery para el módulo sigic_auth.
+
+Incluye:
+- sync_user_profile: escritura diferida del nombre del usuario a partir de
+  los claims del JWT (fuera del camino caliente de autenticación).
+"""
+
+import logging
+
+from django.contrib.auth import get_user_model
+
+from sigic_geonode.celeryapp import app
+
+logger = logging.getLogger(__name__)
+
+
+@app.task(
+    bind=True,
+    name="sigic_geonode.sigic_auth.sync_user_profile",
+    queue="default",
+    max_retries=3,
+)
+def sync_user_profile(self, user_id: int, fields: dict, digest: str = None):
+    """
+    Aplica `fields` (`first_name`/`last_name`) al usuario si difieren.
+    Es idempotente: varias tareas para el mismo cambio no escriben de más.
+    Con el perfil ya guardado se registra `digest` (ver
+    `keycloak.remember_profile_digest`).
+    """
+    from .keycloak import remember_profile_digest
+
+    User = get_user_model()
+    user = User.objects.filter(pk=user_id).first()
+    if user is None:
+        return {"status": "skipped", "reason": "user not found"}
+
+    updated_fields = [
+        field
+        for field, value in fields.items()
+        if value and getattr(user, field) != value
+    ]
+    if not updated_fields:
+        if digest:
+            remember_profile_digest(user_id, digest)
+        return {"status": "unchanged"}
+
+    for field in updated_fields:
+        setattr(user, field, fields[field])
+
+    try:
+        user.save(update_fields=updated_fields)
+    except Exception as e:
+        logger.warning(f"[SIGIC] sync_user_profile falló para usuario {user_id}: {e}")
+        raise self.retry(exc=e, countdown=10)
+
+    if digest:
+        remember_profile_digest(user_id, digest)
+    return {"status": "updated", "fields": updated_fields}
@@ -0,0 +1,260 @@
+import asyncio
+import sys
+import threading
+import time
+from types import ModuleType, SimpleNamespace
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import SimpleTestCase
+from rest_framework.exceptions import AuthenticationFailed
+
+from sigic_geonode.sigic_auth import keycloak
+from sigic_geonode.sigic_auth.guard import (
+    REASON_CACHED,
+    REASON_UNKNOWN_KID,
+    RejectionGuard,
+    client_id,
+)
+from sigic_geonode.sigic_auth.jwks import JWKSKeyStore, JWKSUnavailable
+from sigic_geonode.sigic_auth.token_cache import (
+    TOKEN_CACHE_KEY_PREFIX,
+    VerifiedTokenCache,
+    token_digest,
+)
+
+PROXY = "10.0.0.2"
+
+
+def _request(remote, real_ip=None):
+    meta = {"REMOTE_ADDR": remote}
+    if real_ip:
+        meta["HTTP_X_REAL_IP"] = real_ip
+    return SimpleNamespace(META=meta)
+
+
+class ClientIdTests(SimpleTestCase):
+    def test_real_ip_from_trusted_proxy(self):
+        request = _request(PROXY, real_ip="203.0.113.7")
+        self.assertEqual(client_id(request, frozenset({PROXY})), "203.0.113.7")
+
+    def test_real_ip_ignored_from_untrusted_peer(self):
+        request = _request("198.51.100.9", real_ip="203.0.113.7")
+        self.assertEqual(client_id(request, frozenset({PROXY})), "198.51.100.9")
+
+
+class RejectionGuardTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.guard = RejectionGuard(rejected_ttl=60, failure_window=60)
+
+    def test_rejected_token_is_short_circuited(self):
+        self.guard.record("malo", PROXY, "invalid_signature", "Firma inválida")
+        self.assertEqual(self.guard.check("malo"), (REASON_CACHED, "Firma inválida"))
+
+    def test_failures_from_one_ip_do_not_block_other_tokens(self):
+        for i in range(500):
+            self.guard.record(f"malo-{i}", PROXY, "expired", "Token expirado")
+
+        self.assertEqual(self.guard.check("valido"), (None, None))
+
+    def test_unknown_kid_is_never_cached(self):
+        self.guard.record("rotado", PROXY, REASON_UNKNOWN_KID, "kid desconocido")
+        self.assertEqual(self.guard.check("rotado"), (None, None))
+
+    def test_unremembered_rejection_is_not_cached(self):
+        self.guard.record("raro", PROXY, "jwks_unavailable", "x", remember=False)
+        self.assertEqual(self.guard.check("raro"), (None, None))
+
+
+class UnknownKidTests(SimpleTestCase):
+    token = "firmado-con-llave-nueva"
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(keycloak.token_cache.discard, self.token)
+        self.auth = keycloak.KeycloakJWTAuthentication()
+
+    def test_unknown_kid_is_a_transient_rejection(self):
+        error = keycloak.UnknownSigningKey("Llave de firma desconocida (kid)")
+        reason, _, remember = keycloak.KeycloakJWTAuthentication._rejection(error)
+
+        self.assertEqual(reason, REASON_UNKNOWN_KID)
+        self.assertFalse(remember)
+
+    def test_token_validates_once_rotated_key_is_published(self):
+        request = _request(PROXY)
+        with mock.patch.object(
+            self.auth, "verify_token", side_effect=keycloak.UnknownSigningKey("kid")
+        ):
+            with self.assertRaises(AuthenticationFailed):
+                self.auth._authenticate_token(self.token, request)
+
+        user = SimpleNamespace(pk=7)
+        with mock.patch.object(
+            self.auth, "verify_token", return_value={"exp": time.time() + 300}
+        ), mock.patch.object(self.auth, "get_or_create_user", return_value=user):
+            authenticated, _ = self.auth._authenticate_token(self.token, request)
+
+        self.assertEqual(authenticated.pk, 7)
+
+
+class ProfileSyncTests(SimpleTestCase):
+    fields = {"first_name": "Ana"}
+
+    def setUp(self):
+        cache.clear()
+        self.user = mock.Mock(pk=7)
+        self.digest = keycloak.profile_digest(self.fields)
+
+    def test_direct_write_remembers_digest_after_save(self):
+        with mock.patch.object(keycloak, "PROFILE_SYNC_ASYNC", False):
+            keycloak._schedule_profile_sync(self.user, self.fields, self.digest)
+
+        self.user.save.assert_called_once_with(update_fields=["first_name"])
+        self.assertEqual(keycloak._synced_profile_digest(7), self.digest)
+
+    def test_failed_write_does_not_remember_digest(self):
+        self.user.save.side_effect = RuntimeError("db down")
+        with mock.patch.object(keycloak, "PROFILE_SYNC_ASYNC", False):
+            with self.assertRaises(RuntimeError):
+                keycloak._schedule_profile_sync(self.user, self.fields, self.digest)
+
+        self.assertIsNone(keycloak._synced_profile_digest(7))
+
+    def test_queued_sync_leaves_digest_to_the_task(self):
+        tasks = ModuleType("sigic_geonode.sigic_auth.tasks")
+        tasks.sync_user_profile = mock.Mock()
+        with mock.patch.dict(sys.modules, {tasks.__name__: tasks}), mock.patch(
+            "sigic_geonode.sigic_auth.tasks", tasks, create=True
+        ), mock.patch.object(keycloak, "PROFILE_SYNC_ASYNC", True):
+            keycloak._schedule_profile_sync(self.user, self.fields, self.digest)
+
+        tasks.sync_user_profile.apply_async.assert_called_once_with(
+            (7, self.fields, self.digest)
+        )
+        self.user.save.assert_not_called()
+        self.assertIsNone(keycloak._synced_profile_digest(7))
+
+
+class JWKSBackoffTests(SimpleTestCase):
+    def setUp(self):
+        self.now = 1000.0
+        patcher = mock.patch(
+            "sigic_geonode.sigic_auth.jwks.time.monotonic", lambda: self.now
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.store = JWKSKeyStore("https://idp/certs", failure_backoff=5)
+        self.fetch = mock.patch.object(
+            self.store, "_fetch", side_effect=OSError("idp down")
+        ).start()
+        self.addCleanup(mock.patch.stopall)
+
+    def get_key(self):
+        with self.assertRaises(JWKSUnavailable):
+            self.store.get_key("kid")
+
+    def test_failed_fetch_is_not_retried_within_backoff(self):
+        for _ in range(20):
+            self.get_key()
+        self.assertEqual(self.fetch.call_count, 1)
+
+    def test_fetch_is_retried_after_backoff(self):
+        self.get_key()
+        self.now += 5
+        self.get_key()
+        self.assertEqual(self.fetch.call_count, 2)
+
+    def test_recovery_uses_fresh_keys(self):
+        self.get_key()
+        self.now += 5
+        self.fetch.side_effect = None
+        self.fetch.return_value = {
+            "keys": [{"kid": "kid", "kty": "oct", "alg": "HS256", "k": "c2s"}]
+        }
+
+        key, _ = self.store.get_key("kid")
+        self.assertEqual(key["kid"], "kid")
+
+
+class TokenUserCacheTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.now = 1000.0
+        patcher = mock.patch(
+            "sigic_geonode.sigic_auth.token_cache.time.monotonic", lambda: self.now
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.tokens = VerifiedTokenCache(maxsize=8, user_ttl=60)
+        self.user = SimpleNamespace(pk=7, username="ana")
+        self.tokens.set("tok", 7, {"exp": time.time() + 300}, user=self.user)
+
+    def test_local_hit_returns_copy_of_user(self):
+        user = self.tokens.cached_user(self.tokens.get("tok"))
+
+        self.assertIsNot(user, self.user)
+        self.assertEqual(user.username, "ana")
+
+    def test_user_expires_before_token(self):
+        self.now += 60
+        entry = self.tokens.get("tok")
+
+        self.assertEqual(entry["user_id"], 7)
+        self.assertIsNone(self.tokens.cached_user(entry))
+
+    def test_remember_user_renews_expired_user(self):
+        self.now += 60
+        self.tokens.remember_user("tok", self.user)
+
+        self.assertIsNotNone(self.tokens.cached_user(self.tokens.get("tok")))
+
+    def test_shared_entry_has_no_user(self):
+        shared = cache.get(f"{TOKEN_CACHE_KEY_PREFIX}{token_digest('tok')}")
+
+        self.assertEqual(shared["user_id"], 7)
+        self.assertNotIn("user", shared)
+
+
+class JWKSMixedRefreshTests(SimpleTestCase):
+    jwks = {"keys": [{"kid": "kid", "kty": "oct", "alg": "HS256", "k": "c2s"}]}
+
+    def test_sync_and_async_share_one_fetch(self):
+        store = JWKSKeyStore("https://idp/certs")
+        in_fetch = threading.Event()
+        release = threading.Event()
+
+        def fetch():
+            in_fetch.set()
+            release.wait(5)
+            return self.jwks
+
+        results = []
+        with mock.patch.object(store, "_fetch", side_effect=fetch) as fetch_mock:
+            sync = threading.Thread(
+                target=lambda: results.append(store.get_key("kid")[0])
+            )
+            sync.start()
+            in_fetch.wait(5)
+            asynchronous = threading.Thread(
+                target=lambda: results.append(asyncio.run(store.aget_key("kid"))[0])
+            )
+            asynchronous.start()
+            time.sleep(0.05)
+            release.set()
+            sync.join(5)
+            asynchronous.join(5)
+
+        self.assertEqual(fetch_mock.call_count, 1)
+        self.assertEqual([key["kid"] for key in results], ["kid", "kid"])
+
+    def test_async_refresh_works_from_any_event_loop(self):
+        store = JWKSKeyStore("https://idp/certs")
+        with mock.patch.object(store, "_fetch", return_value=self.jwks) as fetch:
+            for _ in range(2):
+                store.clear()
+                key, _ = asyncio.run(store.aget_key("kid"))
+                self.assertEqual(key["kid"], "kid")
+
+        self.assertEqual(fetch.call_count, 2)
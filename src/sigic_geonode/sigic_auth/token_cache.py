@@ -0,0 +1,215 @@
+# ==============================================================================
+#  SIGIC – Sistema Integral de Gestión e Información Científica
+#
+#  Derechos patrimoniales: CentroGeo (2025)
+#
+#  Nota:
+#    Este código fue desarrollado para el proyecto SIGIC de
+#    CentroGeo. Se mantiene crédito de autoría, pero la titularidad del código
+#    pertenece a CentroGeo conforme a obra por encargo.
+#
+#  SPDX-License-Identifier: LicenseRef-SIGIC-CentroGeo
+# ==============================================================================
+
+"""
+Cache de tokens Bearer ya verificados.
+
+Un mismo access token se reutiliza en decenas de llamadas durante su vida
+útil. Tras la primera verificación guardamos `digest(token) -> user_id + claims`
+hasta el `exp` del token, de modo que las siguientes llamadas no repiten la
+verificación RSA ni el `get_or_create` del usuario.
+
+Dos niveles:
+- LRU en proceso, acotado por `KEYCLOAK_TOKEN_CACHE_SIZE` entradas.
+- Django cache (compartido entre workers de gunicorn).
+
+El LRU local guarda además el `User` ya resuelto durante
+`KEYCLOAK_TOKEN_USER_TTL` segundos, para no leerlo de la base de datos en
+cada request. Pasado ese tiempo se vuelve a leer, de modo que un usuario
+desactivado o con otros permisos se refleja a más tardar en ese plazo
+(0 = leerlo siempre). El compartido solo guarda `user_id`.
+
+Nunca se guarda el token en claro, solo su SHA-256.
+"""
+
+import copy
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache import cache
+
+log = logging.getLogger("geonode.sigic_auth")
+
+TOKEN_CACHE_SIZE = int(os.getenv("KEYCLOAK_TOKEN_CACHE_SIZE", "1024"))
+TOKEN_CACHE_KEY_PREFIX = "sigic_kc_token_"
+TOKEN_USER_TTL = int(os.getenv("KEYCLOAK_TOKEN_USER_TTL", "60"))
+
+
+def token_digest(token: str) -> str:
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+
+class VerifiedTokenCache:
+    def __init__(self, maxsize: int = TOKEN_CACHE_SIZE, user_ttl: int = TOKEN_USER_TTL):
+        self.maxsize = maxsize
+        self.user_ttl = user_ttl
+        self._local = OrderedDict()
+        self._lock = threading.Lock()
+        self.local_hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+
+    def get(self, token: str):
+        """Regresa `{"user_id", "claims", "exp"}` o None si no hay entrada vigente."""
+        digest = token_digest(token)
+        entry = self._get_local(digest)
+        if entry is not None:
+            return entry
+
+        try:
+            entry = cache.get(f"{TOKEN_CACHE_KEY_PREFIX}{digest}")
+        except Exception as e:
+            log.debug("[sigic_auth] token cache no disponible: %s", e)
+            entry = None
+
+        return self._shared_result(digest, entry)
+
+    async def aget(self, token: str):
+        """Versión async de `get` (Django async cache API)."""
+        digest = token_digest(token)
+        entry = self._get_local(digest)
+        if entry is not None:
+            return entry
+
+        try:
+            entry = await cache.aget(f"{TOKEN_CACHE_KEY_PREFIX}{digest}")
+        except Exception as e:
+            log.debug("[sigic_auth] token cache no disponible: %s", e)
+            entry = None
+
+        return self._shared_result(digest, entry)
+
+    def _get_local(self, digest: str):
+        with self._lock:
+            entry = self._local.get(digest)
+            if entry is not None:
+                if entry["exp"] > time.time():
+                    self._local.move_to_end(digest)
+                    self.local_hits += 1
+                    return entry
+                del self._local[digest]
+        return None
+
+    def _shared_result(self, digest: str, entry):
+        if entry is not None and entry.get("exp", 0) > time.time():
+            self._remember(digest, entry)
+            with self._lock:
+                self.shared_hits += 1
+            return entry
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def cached_user(self, entry: dict):
+        """
+        Copia del `User` resuelto en este proceso para la entrada, o None si
+        no lo hay o ya venció (hay que leerlo de la base de datos). Cada
+        request recibe su propia copia.
+        """
+        user = entry.get("user")
+        if user is None or entry["user_until"] <= time.monotonic():
+            return None
+        return copy.copy(user)
+
+    def remember_user(self, token: str, user) -> None:
+        """Asocia `user` a la entrada local del token (ver `cached_user`)."""
+        digest = token_digest(token)
+        with self._lock:
+            entry = self._local.get(digest)
+            if entry is not None:
+                self._local[digest] = self._with_user(entry, user)
+
+    def _with_user(self, entry: dict, user) -> dict:
+        if user is None or self.user_ttl <= 0:
+            return entry
+        return {**entry, "user": copy.copy(user), "user_until": time.monotonic() + self.user_ttl}
+
+    def set(self, token: str, user_id, claims: dict, user=None):
+        prepared = self._prepare(token, user_id, claims, user)
+        if prepared is None:
+            return
+        key, entry, timeout = prepared
+        try:
+            cache.set(key, entry, timeout=timeout)
+        except Exception as e:
+            log.debug("[sigic_auth] token cache no disponible: %s", e)
+
+    async def aset(self, token: str, user_id, claims: dict, user=None):
+        prepared = self._prepare(token, user_id, claims, user)
+        if prepared is None:
+            return
+        key, entry, timeout = prepared
+        try:
+            await cache.aset(key, entry, timeout=timeout)
+        except Exception as e:
+            log.debug("[sigic_auth] token cache no disponible: %s", e)
+
+    def _prepare(self, token: str, user_id, claims: dict, user=None):
+        """Guarda la entrada en el LRU local; regresa (key, entry, timeout) para el compartido."""
+        exp = claims.get("exp")
+        if not exp:
+            return None
+        timeout = int(exp - time.time())
+        if timeout <= 0:
+            return None
+
+        digest = token_digest(token)
+        entry = {"user_id": user_id, "claims": claims, "exp": exp}
+        self._remember(digest, self._with_user(entry, user))
+        return f"{TOKEN_CACHE_KEY_PREFIX}{digest}", entry, timeout
+
+    def discard(self, token: str):
+        digest = token_digest(token)
+        with self._lock:
+            self._local.pop(digest, None)
+        try:
+            cache.delete(f"{TOKEN_CACHE_KEY_PREFIX}{digest}")
+        except Exception as e:
+            log.debug("[sigic_auth] token cache no disponible: %s", e)
+
+    async def adiscard(self, token: str):
+        digest = token_digest(token)
+        with self._lock:
+            self._local.pop(digest, None)
+        try:
+            await cache.adelete(f"{TOKEN_CACHE_KEY_PREFIX}{digest}")
+        except Exception as e:
+            log.debug("[sigic_auth] token cache no disponible: %s", e)
+
+    def stats(self) -> dict:
+        with self._lock:
+            hits = self.local_hits + self.shared_hits
+            total = hits + self.misses
+            return {
+                "local_hits": self.local_hits,
+                "shared_hits": self.shared_hits,
+                "misses": self.misses,
+                "hit_ratio": round(hits / total, 4) if total else None,
+                "size": len(self._local),
+                "maxsize": self.maxsize,
+            }
+
+    def _remember(self, digest: str, entry: dict):
+        with self._lock:
+            self._local[digest] = entry
+            self._local.move_to_end(digest)
+            while len(self._local) > self.maxsize:
+                self._local.popitem(last=False)
+
+
+token_cache = VerifiedTokenCache()
@@ -7,14 +7,16 @@
 # =============================================================================
 
 # -*- encoding: utf-8 -*-
+import logging
 import traceback
 
 import jenkspy
 import numpy as np
 import pandas as pd
-import psycopg2
 
-from django.conf import settings
+from sigic_geonode.utils.geodata_conn import geodata
+
+logger = logging.getLogger(__name__)
 
 
 def get_data_from_db(attributes, field_id, table_name):
@@ -31,18 +33,7 @@ def get_data_from_db(attributes, field_id, table_name):
     Return:
         (list): Lista de tuplas con los atributos de la capa.
     """
-    db = settings.DATABASES["geonode_data"]
-    conn = psycopg2.connect(
-        dbname=db["NAME"],
-        user=db["USER"],
-        password=db["PASSWORD"],
-        port=db["PORT"],
-        host=db["HOST"],
-    )
-
     try:
-        cur = conn.cursor()
-
         if isinstance(attributes, list):
             fields = (
                 '"'
@@ -56,13 +47,13 @@ def get_data_from_db(attributes, field_id, table_name):
         else:
             fields = '"' + attributes + '","' + field_id + '"'
 
-        cur.execute("select %s from %s;" % (fields, table_name))
-        results = cur.fetchall()
+        # Conexión del pool de geodata (sin abrir una nueva por llamada)
+        with geodata.cursor() as cur:
+            cur.execute("select %s from %s;" % (fields, table_name))
+            results = cur.fetchall()
         return results
-    except Exception as e:
-        print(e)
-    finally:
-        conn.close()
+    except Exception:
+        logger.exception(f"Error consultando la tabla {table_name}")
 
 
 def gen_data_dicts(indicadores, attributes, field_id):
@@ -0,0 +1,162 @@
+"""
+Tracking of background join jobs.
+
+A join runs as a chain of Celery tasks (join_dataframes -> sync_geoserver ->
+generate_column_styles). Each task reports its phase to a job record kept in
+the Django cache, so the web process can answer status requests without
+touching the database or the broker:
+
+    {
+        "job_id": "...",
+        "dataset": 20,
+        "state": "queued" | "running" | "done" | "failed",
+        "phase": "queued" | "adding_columns" | "updating_rows"
+                 | "syncing_geoserver" | "generating_styles" | "done",
+        "rows_done": 0, "rows_total": null, "rows_matched": 0,
+        "error": null, "warnings": [],
+        "created": 1700000000.0, "updated": 1700000000.0,
+    }
+
+Only one join per target dataset may run at a time; the lock is a
+`cache.add` on the dataset id holding the job id, released when the job
+finishes or fails (and by expiry after SIGIC_JOIN_LOCK_TTL seconds if a
+worker dies mid-job).
+
+The cache alias (SIGIC_JOB_CACHE, "default" by default) must be shared by
+the web and Celery processes (Redis/memcached), not a per-process cache.
+"""
+
+import logging
+import os
+import time
+import uuid
+from typing import Optional
+
+from django.core.cache import caches
+
+logger = logging.getLogger(__name__)
+
+JOB_CACHE = os.getenv("SIGIC_JOB_CACHE", "default")
+JOB_TTL = int(os.getenv("SIGIC_JOB_TTL", str(7 * 24 * 3600)))
+JOIN_LOCK_TTL = int(os.getenv("SIGIC_JOIN_LOCK_TTL", str(6 * 3600)))
+
+JOB_KEY_PREFIX = "sigic_georeference_job_"
+LOCK_KEY_PREFIX = "sigic_georeference_join_lock_"
+LATEST_KEY_PREFIX = "sigic_georeference_latest_job_"
+
+STATE_QUEUED = "queued"
+STATE_RUNNING = "running"
+STATE_DONE = "done"
+STATE_FAILED = "failed"
+
+PHASE_QUEUED = "queued"
+PHASE_ADDING_COLUMNS = "adding_columns"
+PHASE_UPDATING_ROWS = "updating_rows"
+PHASE_SYNCING_GEOSERVER = "syncing_geoserver"
+PHASE_GENERATING_STYLES = "generating_styles"
+PHASE_DONE = "done"
+
+
+def _cache():
+    return caches[JOB_CACHE]
+
+
+def _job_key(job_id: str) -> str:
+    return f"{JOB_KEY_PREFIX}{job_id}"
+
+
+def _lock_key(dataset_id: int) -> str:
+    return f"{LOCK_KEY_PREFIX}{dataset_id}"
+
+
+def _latest_key(dataset_id: int) -> str:
+    return f"{LATEST_KEY_PREFIX}{dataset_id}"
+
+
+def create_job(dataset_id: int, **params) -> Optional[str]:
+    """
+    Register a queued job for dataset_id and take its join lock.
+    Return the job id, or None if another join holds the lock.
+    """
+    job_id = uuid.uuid4().hex
+    if not _cache().add(_lock_key(dataset_id), job_id, timeout=JOIN_LOCK_TTL):
+        return None
+
+    now = time.time()
+    job = {
+        "job_id": job_id,
+        "dataset": dataset_id,
+        "state": STATE_QUEUED,
+        "phase": PHASE_QUEUED,
+        "rows_done": 0,
+        "rows_total": None,
+        "rows_matched": 0,
+        "error": None,
+        "warnings": [],
+        "params": params,
+        "created": now,
+        "updated": now,
+    }
+    _cache().set_many(
+        {_job_key(job_id): job, _latest_key(dataset_id): job_id}, timeout=JOB_TTL
+    )
+    return job_id
+
+
+def get_job(job_id: str) -> Optional[dict]:
+    return _cache().get(_job_key(job_id))
+
+
+def latest_job(dataset_id: int) -> Optional[dict]:
+    job_id = _cache().get(_latest_key(dataset_id))
+    return get_job(job_id) if job_id else None
+
+
+def running_job_id(dataset_id: int) -> Optional[str]:
+    """Id of the join currently holding the dataset lock, if any."""
+    return _cache().get(_lock_key(dataset_id))
+
+
+def update_job(job_id: Optional[str], **fields) -> None:
+    """
+    Merge fields into the job record. job_id=None is a no-op so the tasks
+    can also run outside a tracked job (e.g. /reset).
+    """
+    if not job_id:
+        return
+    try:
+        job = get_job(job_id)
+        if job is None:
+            return
+        job.update(fields, updated=time.time())
+        _cache().set(_job_key(job_id), job, timeout=JOB_TTL)
+    except Exception as e:
+        # Progress reporting must never break the join itself
+        logger.warning(f"Could not update join job {job_id}: {e}")
+
+
+def set_phase(job_id: Optional[str], phase: str, **fields) -> None:
+    update_job(job_id, state=STATE_RUNNING, phase=phase, **fields)
+
+
+def _release_lock(job: dict) -> None:
+    key = _lock_key(job["dataset"])
+    if _cache().get(key) == job["job_id"]:
+        _cache().delete(key)
+
+
+def finish_job(job_id: Optional[str], warning: str = None) -> None:
+    job = get_job(job_id) if job_id else None
+    if job is None:
+        return
+    warnings = job["warnings"] + ([warning] if warning else [])
+    update_job(job_id, state=STATE_DONE, phase=PHASE_DONE, warnings=warnings)
+    _release_lock(job)
+
+
+def fail_job(job_id: Optional[str], error: str) -> None:
+    job = get_job(job_id) if job_id else None
+    if job is None:
+        return
+    update_job(job_id, state=STATE_FAILED, error=error)
+    _release_lock(job)
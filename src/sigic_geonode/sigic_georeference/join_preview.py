@@ -0,0 +1,267 @@
+"""
+Dry run of an attribute join: how well the pivots match, without touching
+either table.
+
+All statistics come from one aggregate query over a FULL JOIN of the
+pivot values of both tables, grouped by key:
+
+    target: rows, matched, unmatched, null_pivot, match_ratio
+    source: rows, matched, unmatched, duplicate_keys, duplicate_rows
+
+plus a few unmatched keys of each side. Targets above
+SIGIC_JOIN_PREVIEW_SAMPLE_ROWS rows are read with `TABLESAMPLE SYSTEM`;
+target figures are then scaled to the estimated table size and the source
+matched/unmatched counts (which depend on every target key) are null.
+
+A second query returns up to SIGIC_JOIN_PREVIEW_ROWS joined rows. Both run
+in a READ ONLY transaction under SIGIC_JOIN_PREVIEW_TIMEOUT_MS.
+"""
+
+import os
+
+from psycopg2.sql import SQL, Identifier
+
+from .join_sql import (
+    JoinSpec,
+    _estimate_rows,
+    _get_source_col_types,
+    _new_columns,
+    choose_strategy,
+)
+
+JOIN_PREVIEW_SAMPLE_ROWS = int(os.getenv("SIGIC_JOIN_PREVIEW_SAMPLE_ROWS", "200000"))
+JOIN_PREVIEW_ROWS = int(os.getenv("SIGIC_JOIN_PREVIEW_ROWS", "10"))
+JOIN_PREVIEW_UNMATCHED_KEYS = int(os.getenv("SIGIC_JOIN_PREVIEW_UNMATCHED_KEYS", "20"))
+JOIN_PREVIEW_TIMEOUT_MS = int(os.getenv("SIGIC_JOIN_PREVIEW_TIMEOUT_MS", "30000"))
+
+
+def _column_types(cur, table_name: str, col_names: list) -> dict:
+    """{column: (formatted type, pg_type.typcategory)} for existing columns."""
+    cur.execute(
+        """
+        SELECT a.attname, format_type(a.atttypid, a.atttypmod), t.typcategory
+        FROM pg_attribute a
+        JOIN pg_type t ON t.oid = a.atttypid
+        WHERE a.attrelid = to_regclass(quote_ident(%s))
+          AND a.attnum > 0 AND NOT a.attisdropped
+          AND a.attname = ANY(%s)
+        """,
+        [table_name, col_names],
+    )
+    return {name: (pg_type, category) for name, pg_type, category in cur.fetchall()}
+
+
+def _check(cur, spec: JoinSpec) -> dict:
+    """Pivot and column checks; "errors" lists what would make the join fail."""
+    errors = []
+
+    target_types = _column_types(
+        cur, spec.target_name, [spec.target_pivot] + spec.columns
+    )
+    source_types = _column_types(
+        cur, spec.source_name, [spec.source_pivot] + spec.columns
+    )
+
+    pivots = {
+        "target": {
+            "column": spec.target_pivot,
+            "type": target_types.get(spec.target_pivot, (None,))[0],
+        },
+        "source": {
+            "column": spec.source_pivot,
+            "type": source_types.get(spec.source_pivot, (None,))[0],
+        },
+    }
+    if spec.target_pivot not in target_types:
+        errors.append(f"target pivot {spec.target_pivot} does not exist")
+    if spec.source_pivot not in source_types:
+        errors.append(f"source pivot {spec.source_pivot} does not exist")
+
+    # Same type category (numeric, string, date...) means `=` works as is
+    compatible = None
+    if not errors:
+        compatible = (
+            target_types[spec.target_pivot][1] == source_types[spec.source_pivot][1]
+        )
+        if not compatible:
+            errors.append(
+                f"pivot types {pivots['target']['type']} and"
+                f" {pivots['source']['type']} cannot be compared"
+            )
+    pivots["compatible"] = compatible
+
+    data_cols = [c for c in spec.columns if c != "geometry"]
+    target_types_sql = (
+        _get_source_col_types(cur, spec.source_name, data_cols) if data_cols else {}
+    )
+    columns = []
+    for col in data_cols:
+        in_source = col in source_types
+        in_target = col in target_types
+        columns.append(
+            {
+                "name": col,
+                "source_type": source_types.get(col, (None,))[0],
+                "target_type": target_types_sql.get(col) if in_source else None,
+                "exists_in_target": in_target,
+            }
+        )
+        if not in_source:
+            errors.append(f"column {col} does not exist in the source")
+        if in_target:
+            errors.append(f"column {col} already exists in the target")
+    if spec.reverse and "geometry" in spec.columns and "geometry" in target_types:
+        errors.append("column geometry already exists in the target")
+
+    return {"pivots": pivots, "columns": columns, "errors": errors}
+
+
+def _match_stats(cur, spec: JoinSpec, sample_percent) -> dict:
+    sample = (
+        SQL("TABLESAMPLE SYSTEM (%(percent)s) REPEATABLE (0)")
+        if sample_percent
+        else SQL("")
+    )
+    cur.execute(
+        SQL(
+            """
+            WITH t AS (
+                SELECT {target_pivot} AS k, count(*) AS n
+                FROM {target} {sample} GROUP BY 1
+            ), s AS (
+                SELECT {source_pivot} AS k, count(*) AS n
+                FROM {source} GROUP BY 1
+            )
+            SELECT
+                coalesce(sum(t.n), 0)::bigint,
+                coalesce(sum(t.n) FILTER (WHERE s.n IS NOT NULL), 0)::bigint,
+                coalesce(sum(t.n) FILTER (WHERE t.k IS NULL), 0)::bigint,
+                coalesce(sum(s.n), 0)::bigint,
+                coalesce(sum(s.n) FILTER (WHERE t.n IS NOT NULL), 0)::bigint,
+                count(*) FILTER (WHERE s.k IS NOT NULL AND s.n > 1),
+                coalesce(
+                    sum(s.n - 1) FILTER (WHERE s.k IS NOT NULL AND s.n > 1), 0
+                )::bigint,
+                (array_agg(t.k::text ORDER BY t.k)
+                    FILTER (WHERE s.n IS NULL AND t.k IS NOT NULL))[1:%(keys)s],
+                (array_agg(s.k::text ORDER BY s.k)
+                    FILTER (WHERE t.n IS NULL AND s.k IS NOT NULL))[1:%(keys)s]
+            FROM t FULL JOIN s ON t.k = s.k
+            """
+        ).format(
+            target=Identifier(spec.target_name),
+            source=Identifier(spec.source_name),
+            target_pivot=Identifier(spec.target_pivot),
+            source_pivot=Identifier(spec.source_pivot),
+            sample=sample,
+        ),
+        {"percent": sample_percent, "keys": JOIN_PREVIEW_UNMATCHED_KEYS},
+    )
+    (
+        target_rows,
+        target_matched,
+        target_null,
+        source_rows,
+        source_matched,
+        duplicate_keys,
+        duplicate_rows,
+        target_unmatched_keys,
+        source_unmatched_keys,
+    ) = cur.fetchone()
+
+    scale = 100 / sample_percent if sample_percent else 1
+    target = {
+        "rows": round(target_rows * scale),
+        "matched": round(target_matched * scale),
+        "unmatched": round((target_rows - target_matched) * scale),
+        "null_pivot": round(target_null * scale),
+        "match_ratio": (
+            round(target_matched / target_rows, 4) if target_rows else None
+        ),
+        "unmatched_keys": target_unmatched_keys or [],
+    }
+    source = {
+        "rows": source_rows,
+        "matched": None if sample_percent else source_matched,
+        "unmatched": None if sample_percent else source_rows - source_matched,
+        "duplicate_keys": duplicate_keys,
+        "duplicate_rows": duplicate_rows,
+        "unmatched_keys": None if sample_percent else source_unmatched_keys or [],
+    }
+    return {"target": target, "source": source}
+
+
+def _sample_rows(cur, spec: JoinSpec, data_cols: list) -> list:
+    """A few joined rows: the target pivot and the source values it would get."""
+    cur.execute(
+        SQL(
+            """
+            SELECT t.{target_pivot} AS {target_pivot}{values}
+            FROM {target} t
+            JOIN {source} s ON t.{target_pivot} = s.{source_pivot}
+            LIMIT %s
+            """
+        ).format(
+            target=Identifier(spec.target_name),
+            source=Identifier(spec.source_name),
+            target_pivot=Identifier(spec.target_pivot),
+            source_pivot=Identifier(spec.source_pivot),
+            values=SQL("").join(
+                SQL(", s.{col} AS {col}").format(col=Identifier(c)) for c in data_cols
+            ),
+        ),
+        [JOIN_PREVIEW_ROWS],
+    )
+    names = [d[0] for d in cur.description]
+    return [dict(zip(names, row)) for row in cur.fetchall()]
+
+
+def preview_join(
+    conn,
+    target_name,
+    source_name,
+    target_pivot,
+    source_pivot,
+    columns,
+    reverse,
+) -> dict:
+    """
+    Match statistics and a sample of joined rows for the join that
+    run_join_sql would run with the same arguments. conn is a geodata pool
+    connection; nothing is written.
+    """
+    spec = JoinSpec(
+        target_name, source_name, target_pivot, source_pivot, list(columns), reverse
+    )
+    with conn.cursor() as cur:
+        cur.execute("SET TRANSACTION READ ONLY")
+        cur.execute("SET LOCAL statement_timeout = %s", [JOIN_PREVIEW_TIMEOUT_MS])
+
+        result = _check(cur, spec)
+        result.update(target=None, source=None, rows=[], sample_percent=None)
+
+        rows_estimate = _estimate_rows(cur, target_name)
+        if rows_estimate > JOIN_PREVIEW_SAMPLE_ROWS:
+            result["sample_percent"] = round(
+                100 * JOIN_PREVIEW_SAMPLE_ROWS / rows_estimate, 4
+            )
+
+        # Pivots missing or not comparable: the queries below would fail
+        if result["pivots"]["compatible"]:
+            result.update(_match_stats(cur, spec, result["sample_percent"]))
+            result["rows"] = _sample_rows(
+                cur, spec, [c["name"] for c in result["columns"] if c["source_type"]]
+            )
+
+        try:
+            new_cols = _new_columns(cur, spec)
+        except Exception as e:
+            result["errors"].append(str(e))
+
+        result["valid"] = not result["errors"]
+        result["strategy"] = (
+            choose_strategy(cur, spec, rows_estimate, new_cols)
+            if result["valid"]
+            else None
+        )
+    return result
@@ -0,0 +1,977 @@
+"""
+SQL side of the attribute join between two geodata tables.
+
+The join copies `columns` from the source table into the target table,
+matching rows on `target.pivot = source.pivot`, with one of two strategies
+(see choose_strategy).
+
+STRATEGY_UPDATE, in three short phases so that neither locks nor WAL grow
+with the size of the table:
+
+1. One `ALTER TABLE ... ADD COLUMN a, ADD COLUMN b, ...` (catalog-only, so
+   ACCESS EXCLUSIVE is held briefly), committed right away; then a btree
+   index on the source pivot, built in a transaction of its own that only
+   takes SHARE locks (see build_indexes).
+2. `UPDATE ... FROM source` in batches of SIGIC_JOIN_BATCH_SIZE target rows,
+   walking the target's primary key (keyset pagination) and committing
+   after each batch. Tables without a single-column primary key fall back
+   to one UPDATE, with the target pivot indexed too.
+3. `ANALYZE` of the target, so the new columns have planner statistics.
+
+Indexes created here are dropped at the end unless SIGIC_JOIN_KEEP_INDEXES
+is true; pivots that already lead an existing btree/hash index are reused.
+If phase 2 or 3 fails, the columns added in phase 1 are dropped again, so
+the join can be retried on the same dataset.
+
+STRATEGY_REWRITE, for large tables or many columns, where updating every
+row would leave a dead copy of the table behind: `CREATE TABLE ... AS
+SELECT ... LEFT JOIN` builds the joined table, which gets the target's
+defaults, constraints, indexes, sequences and grants and replaces it by
+name, all in one transaction.
+
+run_multi_join_sql joins several sources at once with either strategy: one
+ALTER and one UPDATE (or one CREATE TABLE AS) with a LEFT JOIN per source.
+"""
+
+import hashlib
+import logging
+import os
+from typing import Callable, NamedTuple, Optional
+
+from psycopg2.sql import SQL, Identifier
+
+from .jobs import PHASE_ADDING_COLUMNS, PHASE_UPDATING_ROWS
+
+logger = logging.getLogger(__name__)
+
+JOIN_BATCH_SIZE = int(os.getenv("SIGIC_JOIN_BATCH_SIZE", "10000"))
+JOIN_KEEP_INDEXES = os.getenv("SIGIC_JOIN_KEEP_INDEXES", "False").lower() == "true"
+
+STRATEGY_UPDATE = "update"
+STRATEGY_REWRITE = "rewrite"
+
+JOIN_REWRITE_MIN_ROWS = int(os.getenv("SIGIC_JOIN_REWRITE_MIN_ROWS", "1000000"))
+JOIN_REWRITE_MIN_COLUMNS = int(os.getenv("SIGIC_JOIN_REWRITE_MIN_COLUMNS", "20"))
+# Budget for each statement of a join task (batched UPDATEs, CREATE INDEX,
+# the multi-join UPDATE); 0 disables the pool's statement_timeout. Applied
+# per session, so it holds across the commit after each batch.
+JOIN_STATEMENT_TIMEOUT_MS = int(os.getenv("SIGIC_JOIN_STATEMENT_TIMEOUT_MS", "0"))
+# The rewrite is one long transaction; 0 disables the pool's statement_timeout
+JOIN_REWRITE_STATEMENT_TIMEOUT_MS = int(
+    os.getenv("SIGIC_JOIN_REWRITE_STATEMENT_TIMEOUT_MS", "0")
+)
+
+_SAFE_PG_TYPES = {
+    "integer": "INTEGER",
+    "bigint": "BIGINT",
+    "smallint": "SMALLINT",
+    "double precision": "DOUBLE PRECISION",
+    "real": "REAL",
+    "numeric": "NUMERIC",
+    "decimal": "NUMERIC",
+    "boolean": "BOOLEAN",
+    "date": "DATE",
+    "timestamp without time zone": "TIMESTAMP",
+    "timestamp with time zone": "TIMESTAMPTZ",
+}
+
+
+def _no_progress(phase, **fields):
+    pass
+
+
+def _get_source_col_types(cur, source_name: str, col_names: list) -> dict:
+    """Return {col_name: pg_type_sql} for the given columns in source_name."""
+    cur.execute(
+        """
+        SELECT column_name, data_type
+        FROM information_schema.columns
+        WHERE table_name = %s AND table_schema = 'public'
+          AND column_name = ANY(%s)
+        """,
+        [source_name, col_names],
+    )
+    result = {}
+    for col_name, data_type in cur.fetchall():
+        result[col_name] = _SAFE_PG_TYPES.get(data_type.lower(), "TEXT")
+    return result
+
+
+def _estimate_rows(cur, table_name: str) -> int:
+    """Planner row estimate (pg_class.reltuples); exact count if never analyzed."""
+    cur.execute(
+        "SELECT reltuples::bigint FROM pg_class"
+        " WHERE oid = to_regclass(quote_ident(%s))",
+        [table_name],
+    )
+    row = cur.fetchone()
+    if row and row[0] is not None and row[0] >= 0:
+        return row[0]
+    cur.execute(SQL("SELECT count(*) FROM {}").format(Identifier(table_name)))
+    return cur.fetchone()[0]
+
+
+def _primary_key(cur, table_name: str) -> Optional[str]:
+    """Name of the table's primary key column, if it is a single column."""
+    cur.execute(
+        """
+        SELECT a.attname
+        FROM pg_index i
+        JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = i.indkey[0]
+        WHERE i.indrelid = to_regclass(quote_ident(%s))
+          AND i.indisprimary AND i.indnatts = 1
+        """,
+        [table_name],
+    )
+    row = cur.fetchone()
+    return row[0] if row else None
+
+
+def _has_index_on(cur, table_name: str, column: str, methods=("btree", "hash")) -> bool:
+    """True if some full index of one of methods on the table starts with column."""
+    cur.execute(
+        """
+        SELECT 1
+        FROM pg_index i
+        JOIN pg_class c ON c.oid = i.indexrelid
+        JOIN pg_am am ON am.oid = c.relam
+        JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = i.indkey[0]
+        WHERE i.indrelid = to_regclass(quote_ident(%s))
+          AND a.attname = %s
+          AND i.indpred IS NULL
+          AND am.amname = ANY(%s)
+        LIMIT 1
+        """,
+        [table_name, column, list(methods)],
+    )
+    return cur.fetchone() is not None
+
+
+def _index_name(table_name: str, column: str, method: str = "btree") -> str:
+    # Identifiers are capped at 63 bytes, table and column names may not be
+    key = (
+        f"{table_name}.{column}"
+        if method == "btree"
+        else f"{table_name}.{column}.{method}"
+    )
+    digest = hashlib.md5(key.encode()).hexdigest()[:16]
+    return f"sigic_join_{digest}"
+
+
+def ensure_index(
+    cur, table_name: str, column: str, method: str = "btree"
+) -> Optional[str]:
+    """
+    Index table_name(column) with method (btree, or gist for geometries)
+    unless an index already covers it. Return the name of the index created
+    here (to drop later), or None.
+    """
+    methods = ("btree", "hash") if method == "btree" else (method,)
+    if _has_index_on(cur, table_name, column, methods):
+        return None
+    name = _index_name(table_name, column, method)
+    cur.execute(
+        SQL(
+            "CREATE INDEX IF NOT EXISTS {name} ON {table} USING " + method + " ({col})"
+        ).format(
+            name=Identifier(name),
+            table=Identifier(table_name),
+            col=Identifier(column),
+        )
+    )
+    return name
+
+
+def build_indexes(conn, columns, method: str = "btree") -> list:
+    """
+    ensure_index every (table, column) of columns and commit. Call it after
+    the ALTER TABLE has been committed: CREATE INDEX only takes a SHARE lock,
+    so the tables stay readable while the indexes are built. Return the
+    names of the indexes created here.
+    """
+    created = []
+    with conn.cursor() as cur:
+        for table, column in columns:
+            name = ensure_index(cur, table, column, method)
+            if name:
+                created.append(name)
+    conn.commit()
+    return created
+
+
+def drop_indexes(conn, names: list) -> None:
+    """Drop the indexes created by ensure_index (no-op with KEEP_INDEXES)."""
+    if JOIN_KEEP_INDEXES or not names:
+        return
+    with conn.cursor() as cur:
+        cur.execute(
+            SQL("DROP INDEX IF EXISTS {}").format(
+                SQL(", ").join(Identifier(n) for n in names)
+            )
+        )
+    conn.commit()
+
+
+def drop_join_columns(conn, target_name: str, columns: list) -> None:
+    """
+    Undo phase 1: drop the columns added by the join. Best effort; the
+    connection is rolled back first in case it is in an aborted transaction.
+    """
+    if not columns:
+        return
+    try:
+        conn.rollback()
+        with conn.cursor() as cur:
+            cur.execute(
+                SQL("ALTER TABLE {target} {drops}").format(
+                    target=Identifier(target_name),
+                    drops=SQL(", ").join(
+                        SQL("DROP COLUMN IF EXISTS {}").format(Identifier(c))
+                        for c in columns
+                    ),
+                )
+            )
+        conn.commit()
+    except Exception as e:
+        logger.error(f"Could not drop join columns {columns} from {target_name}: {e}")
+
+
+class JoinSpec(NamedTuple):
+    target_name: str
+    source_name: str
+    target_pivot: str
+    source_pivot: str
+    columns: list
+    reverse: bool
+
+
+class NewColumn(NamedTuple):
+    """Column added to the target: its name, SQL type and source column."""
+
+    name: str
+    pg_type: str
+    source_col: str
+
+
+class JoinSource(NamedTuple):
+    """One source of a join: its table, the pivots and the columns it adds."""
+
+    source_name: str
+    target_pivot: str
+    source_pivot: str
+    new_cols: list
+
+
+def _new_columns(cur, spec: JoinSpec) -> list:
+    """Columns the join adds to the target, with the types taken from the source."""
+    new_cols = []
+
+    non_geom_cols = [c for c in spec.columns if c != "geometry"]
+    if non_geom_cols:
+        # Read source column types so they are preserved in the target table
+        col_types = _get_source_col_types(cur, spec.source_name, non_geom_cols)
+        for col in non_geom_cols:
+            new_cols.append(NewColumn(col, col_types.get(col, "TEXT"), col))
+
+    # When reverse=True and geometry is requested, read the real geom column name
+    if spec.reverse and "geometry" in spec.columns:
+        cur.execute(
+            SQL(
+                "SELECT srid, f_geometry_column FROM geometry_columns"
+                " WHERE f_table_name=%s"
+            ),
+            [spec.source_name],
+        )
+        row = cur.fetchone()
+        if row is None:
+            raise Exception(f"No geometry_columns entry found for {spec.source_name}")
+        srid, source_geom_col = int(row[0]), row[1]
+        new_cols.append(
+            NewColumn("geometry", f"geometry(Geometry,{srid})", source_geom_col)
+        )
+
+    return new_cols
+
+
+def _source_geom_col(new_cols: list) -> Optional[str]:
+    for col in new_cols:
+        if col.name == "geometry":
+            return col.source_col
+    return None
+
+
+def _add_columns(cur, target_name: str, new_cols: list) -> None:
+    """Phase 1 of the update strategy: every new column in one ALTER TABLE."""
+    if not new_cols:
+        return
+    cur.execute(
+        SQL("ALTER TABLE {target} {additions}").format(
+            target=Identifier(target_name),
+            additions=SQL(", ").join(
+                SQL("ADD COLUMN {col} " + col.pg_type).format(col=Identifier(col.name))
+                for col in new_cols
+            ),
+        )
+    )
+
+
+def _set_command(spec: JoinSpec, source_geom_col: Optional[str]) -> SQL:
+    # For "geometry" entries use the actual source geom column name
+    def _col_assignment(col):
+        if col == "geometry" and source_geom_col:
+            # target."geometry" = source.<real_geom_col>
+            return SQL("{target_col} = {source}.{src_col}").format(
+                target_col=Identifier("geometry"),
+                source=Identifier(spec.source_name),
+                src_col=Identifier(source_geom_col),
+            )
+        return SQL("{col} = {source}.{col}").format(
+            col=Identifier(col),
+            source=Identifier(spec.source_name),
+        )
+
+    return SQL(", ").join([_col_assignment(col) for col in spec.columns])
+
+
+def _update_sql(spec: JoinSpec, set_command: SQL, extra_where: SQL) -> SQL:
+    return SQL(
+        """
+        UPDATE {target} SET {set_command}
+        FROM {source}
+        WHERE {target}.{target_pivot} = {source}.{source_pivot} AND {extra_where}
+        """
+    ).format(
+        target=Identifier(spec.target_name),
+        source=Identifier(spec.source_name),
+        target_pivot=Identifier(spec.target_pivot),
+        source_pivot=Identifier(spec.source_pivot),
+        set_command=set_command,
+        extra_where=extra_where,
+    )
+
+
+def _update_in_batches(
+    conn, target_name, key, update_sql, rows_total, progress, batch_size, params
+):
+    """
+    Phase 2 with a key: each batch covers the next batch_size target rows by
+    key order, (last, upper], and is committed on its own. update_sql(where)
+    builds the UPDATE restricted to the rows matching `where`.
+    """
+    target = Identifier(target_name)
+    key_col = SQL("{}.{}").format(target, Identifier(key))
+    rows_done = rows_matched = 0
+    last = None
+
+    while True:
+        lower = (
+            SQL("{} > %(last)s").format(key_col) if last is not None else SQL("TRUE")
+        )
+        with conn.cursor() as cur:
+            cur.execute(
+                SQL(
+                    "SELECT max(k), count(*) FROM ("
+                    " SELECT {key_col} AS k FROM {target} WHERE {lower}"
+                    " ORDER BY {key_col} LIMIT %(limit)s) batch"
+                ).format(key_col=key_col, target=target, lower=lower),
+                {"last": last, "limit": batch_size},
+            )
+            upper, count = cur.fetchone()
+            if not count:
+                break
+
+            cur.execute(
+                update_sql(
+                    SQL("{lower} AND {key_col} <= %(upper)s").format(
+                        lower=lower, key_col=key_col
+                    )
+                ),
+                {**params, "last": last, "upper": upper},
+            )
+            rows_matched += cur.rowcount
+        conn.commit()
+
+        rows_done += count
+        last = upper
+        progress(
+            PHASE_UPDATING_ROWS,
+            rows_done=rows_done,
+            rows_total=max(rows_total, rows_done),
+            rows_matched=rows_matched,
+        )
+        if count < batch_size:
+            break
+
+
+def _update_rows(
+    conn, target_name, key, update_sql, rows_total, progress, batch_size, params=None
+) -> None:
+    """
+    Phase 2: run update_sql in keyset batches over key, or as one UPDATE
+    when the target has no single-column primary key (key=None).
+    """
+    progress(PHASE_UPDATING_ROWS, rows_done=0, rows_total=rows_total)
+    if key is not None:
+        _update_in_batches(
+            conn,
+            target_name,
+            key,
+            update_sql,
+            rows_total,
+            progress,
+            batch_size,
+            params or {},
+        )
+        return
+
+    logger.warning(
+        f"{target_name} has no single-column primary key, joining in one UPDATE"
+    )
+    with conn.cursor() as cur:
+        cur.execute(update_sql(SQL("TRUE")), params or None)
+        rows_matched = cur.rowcount
+    conn.commit()
+    progress(
+        PHASE_UPDATING_ROWS,
+        rows_done=rows_total,
+        rows_total=rows_total,
+        rows_matched=rows_matched,
+    )
+
+
+def choose_strategy(cur, spec: JoinSpec, rows_total: int, new_cols: list) -> str:
+    """
+    STRATEGY_REWRITE for tables of at least SIGIC_JOIN_REWRITE_MIN_ROWS rows
+    or joins adding at least SIGIC_JOIN_REWRITE_MIN_COLUMNS columns, unless
+    the target cannot be swapped safely (see _rewrite_blocker).
+    """
+    if len(new_cols) != len(spec.columns):
+        # Some requested column already exists in the target (a non-reverse
+        # "geometry"); only an UPDATE can overwrite it
+        return STRATEGY_UPDATE
+    return _pick_strategy(cur, spec.target_name, rows_total, len(new_cols))
+
+
+def _pick_strategy(cur, target_name: str, rows_total: int, n_columns: int) -> str:
+    if rows_total < JOIN_REWRITE_MIN_ROWS and n_columns < JOIN_REWRITE_MIN_COLUMNS:
+        return STRATEGY_UPDATE
+
+    blocker = _rewrite_blocker(cur, target_name)
+    if blocker:
+        logger.info(f"Not rewriting {target_name} ({blocker}), using UPDATE")
+        return STRATEGY_UPDATE
+    return STRATEGY_REWRITE
+
+
+def run_join_sql(
+    conn,
+    target_name,
+    source_name,
+    target_pivot,
+    source_pivot,
+    columns,
+    reverse,
+    progress: Callable = None,
+    batch_size: int = None,
+    strategy: str = None,
+) -> list:
+    """
+    Execute the join on conn (a geodata pool connection).
+
+    reverse=True  → target is the tabular layer; may receive a geometry column
+    reverse=False → target is the geographic layer; only data columns are added
+
+    strategy is STRATEGY_UPDATE or STRATEGY_REWRITE; by default it is picked
+    with choose_strategy. progress(phase, **fields), if given, is called as
+    each phase starts and after every batch (see jobs.py). Return the
+    columns added to the target, for drop_join_columns if a later step fails.
+    """
+    spec = JoinSpec(
+        target_name, source_name, target_pivot, source_pivot, list(columns), reverse
+    )
+    progress = progress or _no_progress
+
+    with conn.cursor() as cur:
+        new_cols = _new_columns(cur, spec)
+        rows_total = _estimate_rows(cur, target_name)
+        strategy = strategy or choose_strategy(cur, spec, rows_total, new_cols)
+    conn.commit()
+
+    progress(PHASE_ADDING_COLUMNS, strategy=strategy)
+    if strategy == STRATEGY_REWRITE:
+        source = JoinSource(source_name, target_pivot, source_pivot, new_cols)
+        _rewrite_join(conn, target_name, [source], rows_total, progress)
+    else:
+        set_command = _set_command(spec, _source_geom_col(new_cols))
+        _update_join(
+            conn,
+            target_name,
+            new_cols,
+            [(source_name, source_pivot)],
+            [target_pivot],
+            lambda key: lambda where: _update_sql(spec, set_command, where),
+            rows_total,
+            progress,
+            batch_size or JOIN_BATCH_SIZE,
+        )
+    return [col.name for col in new_cols]
+
+
+# ---------------------------------------------------------------------------
+# Update strategy: ALTER + batched UPDATE ... FROM
+# ---------------------------------------------------------------------------
+
+
+def _update_join(
+    conn,
+    target_name,
+    new_cols,
+    source_pivots,
+    target_pivots,
+    make_update,
+    rows_total,
+    progress,
+    batch_size,
+) -> None:
+    """
+    ALTER, batched UPDATE and ANALYZE. source_pivots are (table, column)
+    pairs to index; target_pivots are only indexed when the target has no
+    primary key to batch on. make_update(key) returns the update_sql(where)
+    builder for _update_rows.
+    """
+    # Phase 1: columns, committed before any index build keeps the lock
+    with conn.cursor() as cur:
+        _add_columns(cur, target_name, new_cols)
+        key = _primary_key(cur, target_name)
+    conn.commit()
+
+    created_indexes = []
+    try:
+        pivots = list(source_pivots)
+        if key is None:
+            pivots += [(target_name, pivot) for pivot in dict.fromkeys(target_pivots)]
+        created_indexes = build_indexes(conn, pivots)
+
+        # Phase 2: rows
+        _update_rows(
+            conn,
+            target_name,
+            key,
+            make_update(key),
+            rows_total,
+            progress,
+            batch_size,
+        )
+
+        # Phase 3: statistics for the new columns
+        with conn.cursor() as cur:
+            cur.execute(SQL("ANALYZE {}").format(Identifier(target_name)))
+        conn.commit()
+    except Exception:
+        drop_join_columns(conn, target_name, [col.name for col in new_cols])
+        raise
+    finally:
+        try:
+            drop_indexes(conn, created_indexes)
+        except Exception as e:
+            logger.warning(f"Could not drop join indexes {created_indexes}: {e}")
+
+
+# ---------------------------------------------------------------------------
+# Rewrite strategy: CREATE TABLE AS + swap
+# ---------------------------------------------------------------------------
+
+
+def _rewrite_blocker(cur, table_name: str) -> Optional[str]:
+    """
+    Reason why table_name cannot be rebuilt and swapped by name, or None.
+    Objects that point at the table by OID (views, foreign keys, triggers,
+    inheritance) or columns CTAS cannot reproduce are left to UPDATE.
+    """
+    cur.execute(
+        """
+        SELECT
+          c.relowner <> (SELECT oid FROM pg_roles WHERE rolname = current_user),
+          c.relkind <> 'r' OR c.relispartition OR c.relhassubclass
+            OR EXISTS (SELECT 1 FROM pg_inherits WHERE inhrelid = c.oid),
+          EXISTS (SELECT 1 FROM pg_trigger WHERE tgrelid = c.oid AND NOT tgisinternal),
+          EXISTS (
+            SELECT 1 FROM pg_constraint
+            WHERE contype = 'f' AND (confrelid = c.oid OR conrelid = c.oid)
+          ),
+          EXISTS (
+            SELECT 1 FROM pg_depend d JOIN pg_rewrite r ON r.oid = d.objid
+            WHERE d.refobjid = c.oid AND r.ev_class <> c.oid
+          ),
+          EXISTS (
+            SELECT 1 FROM pg_attribute
+            WHERE attrelid = c.oid AND attnum > 0 AND NOT attisdropped
+              AND (attidentity <> '' OR attgenerated <> '')
+          )
+        FROM pg_class c
+        WHERE c.oid = to_regclass(quote_ident(%s))
+        """,
+        [table_name],
+    )
+    row = cur.fetchone()
+    if row is None:
+        return "table not found"
+    reasons = (
+        "not owned by the geodata user",
+        "partitioned or inherited",
+        "has triggers",
+        "has foreign keys",
+        "has dependent views",
+        "has identity or generated columns",
+    )
+    for reason, blocked in zip(reasons, row):
+        if blocked:
+            return reason
+    return None
+
+
+def _rewrite_name(name: str) -> str:
+    digest = hashlib.md5(name.encode()).hexdigest()[:16]
+    return f"sigic_rw_{digest}"
+
+
+def _source_joins(target_name: str, sources: list) -> tuple:
+    """
+    (select list, LEFT JOIN clauses) bringing the new columns of every
+    source, aliased s0, s1... Each source is reduced to one row per pivot
+    (DISTINCT ON) so target rows are never duplicated; like UPDATE ... FROM,
+    which duplicate wins is unspecified.
+    """
+    target = Identifier(target_name)
+    select_new = []
+    joins = []
+    for i, source in enumerate(sources):
+        alias = Identifier(f"s{i}")
+        source_cols = [source.source_pivot] + [c.source_col for c in source.new_cols]
+        joins.append(
+            SQL(
+                """
+                LEFT JOIN (
+                    SELECT DISTINCT ON ({source_pivot}) {source_cols}
+                    FROM {source}
+                    ORDER BY {source_pivot}
+                ) {alias} ON {target}.{target_pivot} = {alias}.{source_pivot}
+                """
+            ).format(
+                source=Identifier(source.source_name),
+                source_pivot=Identifier(source.source_pivot),
+                source_cols=SQL(", ").join(
+                    Identifier(c) for c in dict.fromkeys(source_cols)
+                ),
+                alias=alias,
+                target=target,
+                target_pivot=Identifier(source.target_pivot),
+            )
+        )
+        for col in source.new_cols:
+            select_new.append(
+                SQL("{alias}.{src}::" + col.pg_type + " AS {col}").format(
+                    alias=alias,
+                    src=Identifier(col.source_col),
+                    col=Identifier(col.name),
+                )
+            )
+    return SQL(", ").join(select_new), SQL("").join(joins)
+
+
+def _create_joined_table(cur, target_name: str, sources: list, new_table: str) -> int:
+    """CREATE TABLE new_table AS target LEFT JOIN each source."""
+    select_new, joins = _source_joins(target_name, sources)
+    cur.execute(
+        SQL(
+            """
+            CREATE TABLE {new_table} AS
+            SELECT {target}.*, {select_new}
+            FROM {target}
+            {joins}
+            """
+        ).format(
+            new_table=Identifier(new_table),
+            target=Identifier(target_name),
+            select_new=select_new,
+            joins=joins,
+        )
+    )
+    return cur.rowcount
+
+
+def _copy_table_definition(cur, target_name: str, new_table: str) -> list:
+    """
+    Give new_table the defaults, NOT NULLs, constraints, indexes, owned
+    sequences and grants of target_name. Index and index-backed constraint
+    names must be unique in the schema, so they are created under temporary
+    names; return [(temporary, original)] for the rename after the swap.
+    """
+    new = Identifier(new_table)
+    renames = []
+
+    cur.execute(
+        """
+        SELECT a.attname, pg_get_expr(d.adbin, d.adrelid)
+        FROM pg_attrdef d
+        JOIN pg_attribute a ON a.attrelid = d.adrelid AND a.attnum = d.adnum
+        WHERE d.adrelid = to_regclass(quote_ident(%s))
+        """,
+        [target_name],
+    )
+    for column, default in cur.fetchall():
+        cur.execute(
+            SQL("ALTER TABLE {} ALTER COLUMN {} SET DEFAULT ").format(
+                new, Identifier(column)
+            )
+            + SQL(default)
+        )
+
+    cur.execute(
+        """
+        SELECT attname FROM pg_attribute
+        WHERE attrelid = to_regclass(quote_ident(%s))
+          AND attnum > 0 AND NOT attisdropped AND attnotnull
+        """,
+        [target_name],
+    )
+    for (column,) in cur.fetchall():
+        cur.execute(
+            SQL("ALTER TABLE {} ALTER COLUMN {} SET NOT NULL").format(
+                new, Identifier(column)
+            )
+        )
+
+    # CHECK (e.g. old-style enforce_srid_*), PRIMARY KEY, UNIQUE, EXCLUDE
+    cur.execute(
+        """
+        SELECT conname, contype, pg_get_constraintdef(oid)
+        FROM pg_constraint
+        WHERE conrelid = to_regclass(quote_ident(%s))
+          AND contype IN ('c', 'p', 'u', 'x')
+        """,
+        [target_name],
+    )
+    for name, contype, definition in cur.fetchall():
+        new_name = name if contype == "c" else _rewrite_name(name)
+        cur.execute(
+            SQL("ALTER TABLE {} ADD CONSTRAINT {} ").format(new, Identifier(new_name))
+            + SQL(definition)
+        )
+        if new_name != name:
+            renames.append((new_name, name))
+
+    # Remaining indexes (GiST on the geometry, pivots...)
+    cur.execute(
+        """
+        SELECT c.relname, i.indisunique, pg_get_indexdef(i.indexrelid)
+        FROM pg_index i
+        JOIN pg_class c ON c.oid = i.indexrelid
+        WHERE i.indrelid = to_regclass(quote_ident(%s))
+          AND NOT EXISTS (
+            SELECT 1 FROM pg_constraint
+            WHERE conrelid = i.indrelid AND conindid = i.indexrelid
+          )
+        """,
+        [target_name],
+    )
+    for name, unique, definition in cur.fetchall():
+        new_name = _rewrite_name(name)
+        # "CREATE [UNIQUE] INDEX name ON schema.table USING method (...)"
+        method_and_keys = definition.split(" USING ", 1)[1]
+        cur.execute(
+            SQL(
+                "CREATE " + ("UNIQUE " if unique else "") + "INDEX {} ON {} USING "
+            ).format(Identifier(new_name), new)
+            + SQL(method_and_keys)
+        )
+        renames.append((new_name, name))
+
+    # serial columns: the sequence would be dropped with the old table
+    cur.execute(
+        """
+        SELECT d.objid::regclass::text, a.attname
+        FROM pg_depend d
+        JOIN pg_class s ON s.oid = d.objid AND s.relkind = 'S'
+        JOIN pg_attribute a ON a.attrelid = d.refobjid AND a.attnum = d.refobjsubid
+        WHERE d.refobjid = to_regclass(quote_ident(%s)) AND d.deptype = 'a'
+        """,
+        [target_name],
+    )
+    for sequence, column in cur.fetchall():
+        cur.execute(
+            SQL("ALTER SEQUENCE ")
+            + SQL(sequence)
+            + SQL(" OWNED BY {}.{}").format(new, Identifier(column))
+        )
+
+    cur.execute(
+        """
+        SELECT
+          CASE WHEN a.grantee = 0 THEN 'PUBLIC' ELSE quote_ident(r.rolname) END,
+          a.privilege_type
+        FROM pg_class c
+        CROSS JOIN LATERAL aclexplode(c.relacl) a
+        LEFT JOIN pg_roles r ON r.oid = a.grantee
+        WHERE c.oid = to_regclass(quote_ident(%s)) AND a.grantee <> c.relowner
+        """,
+        [target_name],
+    )
+    for grantee, privilege in cur.fetchall():
+        cur.execute(SQL("GRANT " + privilege + " ON {} TO ").format(new) + SQL(grantee))
+
+    return renames
+
+
+def _rewrite_join(conn, target_name, sources, rows_total, progress) -> None:
+    """
+    Build the joined table next to the target and swap it in, all in one
+    transaction: a failure leaves the target untouched. Writes to the target
+    are blocked (reads are not) until the swap, which takes ACCESS EXCLUSIVE
+    only for the DROP/RENAME.
+    """
+    target = Identifier(target_name)
+    new_table = _rewrite_name(target_name)
+
+    with conn.cursor() as cur:
+        cur.execute(
+            "SET LOCAL statement_timeout = %s", [JOIN_REWRITE_STATEMENT_TIMEOUT_MS]
+        )
+        cur.execute(SQL("LOCK TABLE {} IN EXCLUSIVE MODE").format(target))
+
+        progress(PHASE_UPDATING_ROWS, rows_done=0, rows_total=rows_total)
+        rows_done = _create_joined_table(cur, target_name, sources, new_table)
+        renames = _copy_table_definition(cur, target_name, new_table)
+        cur.execute(SQL("ANALYZE {}").format(Identifier(new_table)))
+
+        cur.execute(SQL("DROP TABLE {}").format(target))
+        cur.execute(
+            SQL("ALTER TABLE {} RENAME TO {}").format(Identifier(new_table), target)
+        )
+        for temporary, original in renames:
+            cur.execute(
+                SQL("ALTER INDEX {} RENAME TO {}").format(
+                    Identifier(temporary), Identifier(original)
+                )
+            )
+    conn.commit()
+
+    # Matches are not counted: it would take another pass over the table
+    progress(
+        PHASE_UPDATING_ROWS,
+        rows_done=rows_done,
+        rows_total=rows_done,
+        rows_matched=None,
+    )
+
+
+# ---------------------------------------------------------------------------
+# Several sources in one pass
+# ---------------------------------------------------------------------------
+
+
+def _multi_update_sql(target_name: str, sources: list, key: Optional[str]):
+    """
+    update_sql(where) for a join with several sources: each target row is
+    written once with the columns of all sources (LEFT JOINs), and rows no
+    source matches are skipped. Without a primary key the single UPDATE
+    matches its rows back by ctid, stable within one statement.
+    """
+    target = Identifier(target_name)
+    rid = Identifier(key) if key else SQL("ctid")
+    select_new, joins = _source_joins(target_name, sources)
+    any_match = SQL(" OR ").join(
+        SQL("{}.{} IS NOT NULL").format(
+            Identifier(f"s{i}"), Identifier(source.source_pivot)
+        )
+        for i, source in enumerate(sources)
+    )
+    assignments = SQL(", ").join(
+        SQL("{col} = m.{col}").format(col=Identifier(col.name))
+        for source in sources
+        for col in source.new_cols
+    )
+
+    def update_sql(extra_where: SQL) -> SQL:
+        return SQL(
+            """
+            UPDATE {target} SET {assignments}
+            FROM (
+                SELECT {target}.{rid} AS __rid, {select_new}
+                FROM {target}
+                {joins}
+                WHERE {extra_where} AND ({any_match})
+            ) m
+            WHERE {target}.{rid} = m.__rid
+            """
+        ).format(
+            target=target,
+            assignments=assignments,
+            rid=rid,
+            select_new=select_new,
+            joins=joins,
+            extra_where=extra_where,
+            any_match=any_match,
+        )
+
+    return update_sql
+
+
+def run_multi_join_sql(
+    conn,
+    target_name: str,
+    sources: list,
+    progress: Callable = None,
+    batch_size: int = None,
+    strategy: str = None,
+) -> list:
+    """
+    Join the columns of several sources into target_name in a single pass:
+    one ALTER and one batched UPDATE, or one CREATE TABLE AS with a LEFT
+    JOIN per source, so the target is rewritten once instead of once per
+    source.
+
+    sources is a list of (source_name, target_pivot, source_pivot, columns);
+    the columns must be data columns, unique across sources. Otherwise as
+    run_join_sql (always in the tabular → geographic direction).
+    """
+    progress = progress or _no_progress
+
+    with conn.cursor() as cur:
+        join_sources = []
+        seen = set()
+        for source_name, target_pivot, source_pivot, columns in sources:
+            repeated = seen.intersection(columns)
+            if repeated:
+                raise Exception(
+                    f"Columns {sorted(repeated)} requested from more than one source"
+                )
+            seen.update(columns)
+            col_types = _get_source_col_types(cur, source_name, columns)
+            new_cols = [NewColumn(c, col_types.get(c, "TEXT"), c) for c in columns]
+            join_sources.append(
+                JoinSource(source_name, target_pivot, source_pivot, new_cols)
+            )
+        new_cols = [col for source in join_sources for col in source.new_cols]
+        rows_total = _estimate_rows(cur, target_name)
+        strategy = strategy or _pick_strategy(
+            cur, target_name, rows_total, len(new_cols)
+        )
+    conn.commit()
+
+    progress(PHASE_ADDING_COLUMNS, strategy=strategy)
+    if strategy == STRATEGY_REWRITE:
+        _rewrite_join(conn, target_name, join_sources, rows_total, progress)
+    else:
+        _update_join(
+            conn,
+            target_name,
+            new_cols,
+            [(s.source_name, s.source_pivot) for s in join_sources],
+            [s.target_pivot for s in join_sources],
+            lambda key: _multi_update_sql(target_name, join_sources, key),
+            rows_total,
+            progress,
+            batch_size or JOIN_BATCH_SIZE,
+        )
+    return [col.name for col in new_cols]
@@ -0,0 +1,343 @@
+"""
+Local legend rendering for the styles built by style_generator.
+
+The generated SLDs only use one Polygon/Line/Point symbolizer per rule with a
+solid color, so their legends can be drawn here instead of asking GeoServer's
+GetLegendGraphic for every request. Anything else (external graphics, text
+symbolizers, several symbolizers per rule...) is reported as unsupported and
+callers fall back to GeoServer.
+
+Rendered images are stored through Django's default_storage under a name that
+includes a hash of the SLD, so a legend is rendered once per SLD version and
+regenerated only when the SLD changes.
+"""
+
+import hashlib
+import io
+import logging
+import os
+import re
+from functools import lru_cache
+from typing import NamedTuple, Optional
+from xml.sax.saxutils import escape, quoteattr
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from lxml import etree
+from PIL import Image, ImageDraw, ImageFont
+
+logger = logging.getLogger(__name__)
+
+SLD_NS = "http://www.opengis.net/sld"
+_S = f"{{{SLD_NS}}}"
+
+LEGEND_DIR = "legends"
+LEGEND_FORMATS = {"png": "image/png", "svg": "image/svg+xml"}
+
+ROW_HEIGHT = 20
+SWATCH_SIZE = 16
+PADDING = 4
+TEXT_OFFSET = SWATCH_SIZE + 2 * PADDING
+FONT_SIZE = 12
+STROKE_COLOR = "#666666"
+FALLBACK_COLOR = "#808080"
+# Hex colors only: they go verbatim into SVG attributes and Pillow. Lengths
+# are the ones both understand (#rgb, #rgba, #rrggbb, #rrggbbaa)
+_HEX_COLOR = re.compile(r"^#(?:[0-9a-fA-F]{3,4}|[0-9a-fA-F]{6}|[0-9a-fA-F]{8})$")
+LEGEND_FONT = os.getenv("SIGIC_LEGEND_FONT", "DejaVuSans.ttf")
+
+_SYMBOLIZERS = {
+    f"{_S}PolygonSymbolizer": "Polygon",
+    f"{_S}LineSymbolizer": "Line",
+    f"{_S}PointSymbolizer": "Point",
+}
+
+
+class LegendEntry(NamedTuple):
+    label: str
+    kind: str  # "Polygon" | "Line" | "Point"
+    color: str
+    mark: str = "circle"
+
+
+def sld_hash(sld_body) -> str:
+    if isinstance(sld_body, str):
+        sld_body = sld_body.encode("utf-8")
+    return hashlib.sha256(sld_body).hexdigest()[:16]
+
+
+# ---------------------------------------------------------------------------
+# SLD parsing
+# ---------------------------------------------------------------------------
+
+
+def _css(parent, name: str) -> Optional[str]:
+    if parent is None:
+        return None
+    for param in parent.iterfind(f"{_S}CssParameter"):
+        if param.get("name") == name:
+            return (param.text or "").strip() or None
+    return None
+
+
+def _color(parent, name: str) -> Optional[str]:
+    """
+    Color CssParameter of parent; None if absent, FALLBACK_COLOR if it is not
+    a hex color (the SLD is user-supplied).
+    """
+    color = _css(parent, name)
+    if color is None:
+        return None
+    if not _HEX_COLOR.match(color):
+        logger.warning(f"Unsupported legend color {color!r}, using {FALLBACK_COLOR}")
+        return FALLBACK_COLOR
+    return color
+
+
+def _entry(rule) -> Optional[LegendEntry]:
+    symbolizers = [
+        el for el in rule if isinstance(el.tag, str) and el.tag.endswith("Symbolizer")
+    ]
+    if len(symbolizers) != 1 or symbolizers[0].tag not in _SYMBOLIZERS:
+        return None
+
+    symbolizer = symbolizers[0]
+    kind = _SYMBOLIZERS[symbolizer.tag]
+    label = rule.findtext(f"{_S}Title") or rule.findtext(f"{_S}Name") or ""
+
+    if kind == "Polygon":
+        color = _color(symbolizer.find(f"{_S}Fill"), "fill")
+        return LegendEntry(label, kind, color) if color else None
+
+    if kind == "Line":
+        color = _color(symbolizer.find(f"{_S}Stroke"), "stroke")
+        return LegendEntry(label, kind, color) if color else None
+
+    graphic = symbolizer.find(f"{_S}Graphic")
+    mark = graphic.find(f"{_S}Mark") if graphic is not None else None
+    if mark is None:
+        return None  # ExternalGraphic
+    color = _color(mark.find(f"{_S}Fill"), "fill")
+    shape = (mark.findtext(f"{_S}WellKnownName") or "circle").strip()
+    if not color or shape not in ("circle", "square"):
+        return None
+    return LegendEntry(label, kind, color, shape)
+
+
+def legend_entries(sld_body) -> Optional[list]:
+    """
+    Return one LegendEntry per rule, or None if the SLD uses anything this
+    module cannot draw.
+    """
+    if isinstance(sld_body, str):
+        sld_body = sld_body.encode("utf-8")
+    try:
+        root = etree.fromstring(
+            sld_body,
+            parser=etree.XMLParser(resolve_entities=False, no_network=True),
+        )
+    except etree.XMLSyntaxError:
+        return None
+
+    entries = []
+    for rule in root.iter(f"{_S}Rule"):
+        entry = _entry(rule)
+        if entry is None:
+            return None
+        entries.append(entry)
+    return entries or None
+
+
+# ---------------------------------------------------------------------------
+# Renderers
+# ---------------------------------------------------------------------------
+
+
+def _svg_element(tag: str, **attrs) -> str:
+    """Empty SVG element; attribute names use "-" for "_"."""
+    quoted = (f"{k.replace('_', '-')}={quoteattr(str(v))}" for k, v in attrs.items())
+    return f"<{tag} {' '.join(quoted)}/>"
+
+
+def _svg_swatch(entry: LegendEntry, y: int) -> str:
+    x = PADDING
+    if entry.kind == "Polygon":
+        return _svg_element(
+            "rect",
+            x=x,
+            y=y + 2,
+            width=SWATCH_SIZE,
+            height=SWATCH_SIZE,
+            fill=entry.color,
+            stroke=STROKE_COLOR,
+            stroke_width=0.5,
+        )
+    if entry.kind == "Line":
+        mid = y + ROW_HEIGHT // 2
+        return _svg_element(
+            "line",
+            x1=x,
+            y1=mid,
+            x2=x + SWATCH_SIZE,
+            y2=mid,
+            stroke=entry.color,
+            stroke_width=2,
+        )
+    if entry.mark == "square":
+        return _svg_element(
+            "rect", x=x + 4, y=y + 6, width=8, height=8, fill=entry.color
+        )
+    return _svg_element(
+        "circle",
+        cx=x + SWATCH_SIZE // 2,
+        cy=y + ROW_HEIGHT // 2,
+        r=4,
+        fill=entry.color,
+    )
+
+
+def render_svg(entries: list) -> bytes:
+    # Approximate text width; SVG viewers do not clip overflowing text anyway
+    width = TEXT_OFFSET + max(len(e.label) for e in entries) * 7 + PADDING
+    height = len(entries) * ROW_HEIGHT + PADDING
+
+    rows = []
+    for i, entry in enumerate(entries):
+        y = PADDING // 2 + i * ROW_HEIGHT
+        rows.append(_svg_swatch(entry, y))
+        rows.append(
+            f"<text x={quoteattr(str(TEXT_OFFSET))}"
+            f" y={quoteattr(str(y + ROW_HEIGHT // 2 + 4))}>"
+            f"{escape(entry.label)}</text>"
+        )
+
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" '
+        f'font-family="sans-serif" font-size="{FONT_SIZE}">' + "".join(rows) + "</svg>"
+    ).encode("utf-8")
+
+
+def _png_swatch(draw, entry: LegendEntry, y: int) -> None:
+    x = PADDING
+    if entry.kind == "Polygon":
+        draw.rectangle(
+            [x, y + 2, x + SWATCH_SIZE, y + 2 + SWATCH_SIZE],
+            fill=entry.color,
+            outline=STROKE_COLOR,
+        )
+    elif entry.kind == "Line":
+        mid = y + ROW_HEIGHT // 2
+        draw.line([x, mid, x + SWATCH_SIZE, mid], fill=entry.color, width=2)
+    elif entry.mark == "square":
+        draw.rectangle([x + 4, y + 6, x + 12, y + 14], fill=entry.color)
+    else:
+        cx, cy = x + SWATCH_SIZE // 2, y + ROW_HEIGHT // 2
+        draw.ellipse([cx - 4, cy - 4, cx + 4, cy + 4], fill=entry.color)
+
+
+@lru_cache(maxsize=1)
+def _font():
+    # Pillow's built-in font has no accented glyphs; prefer a system TrueType
+    try:
+        return ImageFont.truetype(LEGEND_FONT, FONT_SIZE)
+    except OSError:
+        logger.warning(f"Legend font {LEGEND_FONT!r} not found, using Pillow default")
+    try:
+        return ImageFont.load_default(size=FONT_SIZE)
+    except TypeError:  # Pillow < 10.1
+        return ImageFont.load_default()
+
+
+def render_png(entries: list) -> bytes:
+    font = _font()
+
+    measure = ImageDraw.Draw(Image.new("RGBA", (1, 1)))
+    text_width = max(int(measure.textlength(e.label, font=font)) for e in entries)
+    width = TEXT_OFFSET + text_width + PADDING
+    height = len(entries) * ROW_HEIGHT + PADDING
+
+    image = Image.new("RGBA", (width, height), (255, 255, 255, 0))
+    draw = ImageDraw.Draw(image)
+    for i, entry in enumerate(entries):
+        y = PADDING // 2 + i * ROW_HEIGHT
+        _png_swatch(draw, entry, y)
+        draw.text(
+            (TEXT_OFFSET, y + (ROW_HEIGHT - FONT_SIZE) // 2),
+            entry.label,
+            fill="#000000",
+            font=font,
+        )
+
+    output = io.BytesIO()
+    image.save(output, format="PNG", optimize=True)
+    return output.getvalue()
+
+
+_RENDERERS = {"png": render_png, "svg": render_svg}
+
+
+# ---------------------------------------------------------------------------
+# Storage
+# ---------------------------------------------------------------------------
+
+
+def legend_path(style_name: str, digest: str, fmt: str) -> str:
+    return f"{LEGEND_DIR}/{style_name}-{digest}.{fmt}"
+
+
+def get_or_render_legend(style_name: str, sld_body, fmt: str = "png"):
+    """
+    Return (path, digest) of the stored legend, rendering it on first use.
+    Return None if the SLD is not one this module can draw.
+    """
+    if fmt not in _RENDERERS:
+        raise ValueError(f"Unsupported legend format: {fmt}")
+
+    digest = sld_hash(sld_body)
+    path = legend_path(style_name, digest, fmt)
+    if default_storage.exists(path):
+        return path, digest
+
+    entries = legend_entries(sld_body)
+    if entries is None:
+        return None
+
+    # Another worker may have stored it meanwhile: same content, same name
+    saved = default_storage.save(path, ContentFile(_RENDERERS[fmt](entries)))
+    if saved != path:
+        default_storage.delete(saved)
+    return path, digest
+
+
+def _delete_stale_legends(style_name: str, digest: str) -> None:
+    try:
+        _, files = default_storage.listdir(LEGEND_DIR)
+    except (FileNotFoundError, NotImplementedError):
+        return
+    prefix = f"{style_name}-"
+    for filename in files:
+        stem = filename.rsplit(".", 1)[0]
+        if not stem.startswith(prefix):
+            continue
+        old_digest = stem.removeprefix(prefix)
+        # Only "<style>-<hash>", not other styles sharing the prefix
+        if len(old_digest) == len(digest) and old_digest != digest:
+            default_storage.delete(f"{LEGEND_DIR}/{filename}")
+
+
+def render_legends(style_name: str, sld_body) -> None:
+    """
+    Pre-render every legend format for a freshly generated style and drop
+    the legends of its previous SLD versions.
+    """
+    for fmt in _RENDERERS:
+        try:
+            get_or_render_legend(style_name, sld_body, fmt)
+        except Exception as e:
+            logger.warning(f"Legend rendering failed for {style_name} ({fmt}): {e}")
+
+    try:
+        _delete_stale_legends(style_name, sld_hash(sld_body))
+    except Exception as e:
+        logger.warning(f"Could not clean up old legends for {style_name}: {e}")
@@ -0,0 +1,304 @@
+"""
+Spatial join between two geographic tables in PostGIS.
+
+Each target row receives `columns` of the source rows related to it by
+`predicate`:
+
+- intersects: source geometries intersecting the target geometry
+- contains:   source geometries inside the target geometry
+- nearest:    the closest source geometry, optionally only within
+              max_distance meters
+
+When several source rows match (intersects/contains), their values are
+combined with `aggregate` (first, min, max, sum, avg); `count_column`, if
+given, also stores how many source rows matched (0 for none). This covers
+both polygon attributes onto points (intersects + first) and points per
+polygon (contains + count/sum/avg).
+
+Target geometries are reprojected to the source SRID inside the predicate,
+so the source GiST index stays usable. Both geometry columns get a GiST
+index if they lack one; unlike the pivot btrees these are kept, since
+GeoServer uses them as well.
+
+Rows are written like the attribute join (see join_sql.py): one ALTER for
+the new columns, committed before the GiST indexes are built, keyset
+batches over the target primary key, ANALYZE, and the new columns dropped
+again if the update fails.
+"""
+
+from typing import Callable, NamedTuple, Optional
+
+from psycopg2.sql import SQL, Identifier
+
+from .jobs import PHASE_ADDING_COLUMNS
+from .join_sql import (
+    JOIN_BATCH_SIZE,
+    NewColumn,
+    _add_columns,
+    _estimate_rows,
+    _get_source_col_types,
+    _no_progress,
+    _primary_key,
+    _update_rows,
+    build_indexes,
+    drop_join_columns,
+)
+
+PREDICATE_INTERSECTS = "intersects"
+PREDICATE_CONTAINS = "contains"
+PREDICATE_NEAREST = "nearest"
+PREDICATES = (PREDICATE_INTERSECTS, PREDICATE_CONTAINS, PREDICATE_NEAREST)
+
+AGGREGATE_FIRST = "first"
+AGGREGATES = (AGGREGATE_FIRST, "min", "max", "sum", "avg")
+
+_INTEGER_TYPES = {"SMALLINT", "INTEGER", "BIGINT"}
+_NUMERIC_TYPES = _INTEGER_TYPES | {"REAL", "DOUBLE PRECISION", "NUMERIC"}
+
+
+class SpatialJoinSpec(NamedTuple):
+    target_name: str
+    source_name: str
+    predicate: str
+    columns: list
+    aggregate: str = AGGREGATE_FIRST
+    count_column: Optional[str] = None
+    max_distance: Optional[float] = None
+
+
+def _geometry_column(cur, table_name: str) -> tuple:
+    """(geometry column, srid) of table_name, from geometry_columns."""
+    cur.execute(
+        "SELECT f_geometry_column, srid FROM geometry_columns WHERE f_table_name=%s",
+        [table_name],
+    )
+    row = cur.fetchone()
+    if row is None:
+        raise Exception(f"No geometry_columns entry found for {table_name}")
+    return row[0], int(row[1])
+
+
+def _result_type(aggregate: str, pg_type: str) -> str:
+    if aggregate == "avg":
+        return "DOUBLE PRECISION"
+    if aggregate == "sum" and pg_type in _INTEGER_TYPES:
+        return "BIGINT"
+    return pg_type
+
+
+def _new_columns(cur, spec: SpatialJoinSpec, source_geom: str) -> list:
+    col_types = _get_source_col_types(cur, spec.source_name, spec.columns)
+    missing = [c for c in spec.columns if c not in col_types]
+    if missing:
+        raise Exception(f"Columns {missing} do not exist in {spec.source_name}")
+    if source_geom in spec.columns:
+        raise Exception("A spatial join cannot copy the source geometry")
+
+    aggregate = spec.aggregate if spec.predicate != PREDICATE_NEAREST else None
+    new_cols = []
+    for col in spec.columns:
+        pg_type = col_types[col]
+        if aggregate in ("sum", "avg") and pg_type not in _NUMERIC_TYPES:
+            raise Exception(f"Cannot {aggregate} non-numeric column {col}")
+        new_cols.append(NewColumn(col, _result_type(aggregate, pg_type), col))
+    if spec.count_column:
+        new_cols.append(NewColumn(spec.count_column, "BIGINT DEFAULT 0", None))
+    return new_cols
+
+
+class _Geometries(NamedTuple):
+    target_col: str
+    target_srid: int
+    source_col: str
+    source_srid: int
+
+
+def _in_srid(geom: SQL, from_srid: int, to_srid: int) -> SQL:
+    if from_srid == to_srid:
+        return geom
+    return SQL("ST_Transform({}, " + str(to_srid) + ")").format(geom)
+
+
+def _matches_sql(spec, data_cols, geoms, rid, extra_where) -> SQL:
+    """
+    One row per matched target row among those in extra_where: its row id
+    (__rid), the number of matches (__n) and the value of each column.
+    """
+    target = Identifier(spec.target_name)
+    target_geom = SQL("{}.{}").format(target, Identifier(geoms.target_col))
+    t_geom = _in_srid(target_geom, geoms.target_srid, geoms.source_srid)
+    s_geom = SQL("s.{}").format(Identifier(geoms.source_col))
+    rid_col = SQL("{}.{}").format(target, rid)
+
+    if spec.predicate == PREDICATE_NEAREST:
+        # KNN (<->) over the source GiST index picks the candidate; the
+        # distance limit is checked in meters on the spheroid
+        distance = SQL("")
+        if spec.max_distance is not None:
+            distance = SQL(
+                " AND ST_DWithin(ST_Transform(n.__geom, 4326)::geography,"
+                " ST_Transform({}, 4326)::geography, %(max_distance)s)"
+            ).format(target_geom)
+        return SQL(
+            """
+            SELECT {rid_col} AS __rid, 1 AS __n{values}
+            FROM {target} CROSS JOIN LATERAL (
+                SELECT {source_cols}
+                FROM {source} s
+                ORDER BY {s_geom} <-> {t_geom}
+                LIMIT 1
+            ) n
+            WHERE {extra_where}{distance}
+            """
+        ).format(
+            rid_col=rid_col,
+            values=SQL("").join(
+                SQL(", n.{col}::" + c.pg_type + " AS {col}").format(
+                    col=Identifier(c.name)
+                )
+                for c in data_cols
+            ),
+            target=target,
+            source_cols=SQL(", ").join(
+                [SQL("s.{}").format(Identifier(c.source_col)) for c in data_cols]
+                + [SQL("{} AS __geom").format(s_geom)]
+            ),
+            source=Identifier(spec.source_name),
+            s_geom=s_geom,
+            t_geom=t_geom,
+            extra_where=extra_where,
+            distance=distance,
+        )
+
+    if spec.predicate == PREDICATE_CONTAINS:
+        condition = SQL("ST_Contains({}, {})").format(t_geom, s_geom)
+    else:
+        condition = SQL("ST_Intersects({}, {})").format(s_geom, t_geom)
+
+    def _aggregated(c):
+        value = SQL("s.{}").format(Identifier(c.source_col))
+        if spec.aggregate == AGGREGATE_FIRST:
+            value = SQL("(array_agg({}))[1]").format(value)
+        else:
+            value = SQL(spec.aggregate + "({})").format(value)
+        return SQL(", {value}::" + c.pg_type + " AS {col}").format(
+            value=value, col=Identifier(c.name)
+        )
+
+    return SQL(
+        """
+        SELECT {rid_col} AS __rid, count(*) AS __n{values}
+        FROM {target} JOIN {source} s ON {condition}
+        WHERE {extra_where}
+        GROUP BY {rid_col}
+        """
+    ).format(
+        rid_col=rid_col,
+        values=SQL("").join(_aggregated(c) for c in data_cols),
+        target=target,
+        source=Identifier(spec.source_name),
+        condition=condition,
+        extra_where=extra_where,
+    )
+
+
+def _spatial_update_sql(spec, new_cols, geoms, key) -> Callable:
+    """
+    update_sql(where) for _update_rows. Without a primary key the single
+    UPDATE matches its rows back by ctid, stable within one statement.
+    """
+    target = Identifier(spec.target_name)
+    rid = Identifier(key) if key else SQL("ctid")
+    data_cols = [c for c in new_cols if c.source_col]
+
+    assignments = [
+        SQL("{col} = m.{col}").format(col=Identifier(c.name)) for c in data_cols
+    ]
+    if spec.count_column:
+        assignments.append(SQL("{} = m.__n").format(Identifier(spec.count_column)))
+
+    def update_sql(extra_where: SQL) -> SQL:
+        return SQL(
+            """
+            UPDATE {target} SET {assignments}
+            FROM ({matches}) m
+            WHERE {target}.{rid} = m.__rid
+            """
+        ).format(
+            target=target,
+            assignments=SQL(", ").join(assignments),
+            matches=_matches_sql(spec, data_cols, geoms, rid, extra_where),
+            rid=rid,
+        )
+
+    return update_sql
+
+
+def run_spatial_join_sql(
+    conn,
+    spec: SpatialJoinSpec,
+    progress: Callable = None,
+    batch_size: int = None,
+) -> list:
+    """
+    Execute the spatial join on conn (a geodata pool connection), committing
+    after each phase and batch. progress(phase, **fields) is called like in
+    run_join_sql. Return the columns added to the target.
+    """
+    if spec.predicate not in PREDICATES:
+        raise Exception(f"Unknown spatial predicate {spec.predicate}")
+    if spec.aggregate not in AGGREGATES:
+        raise Exception(f"Unknown aggregate {spec.aggregate}")
+    if not spec.columns and not spec.count_column:
+        raise Exception("Nothing to join: no columns and no count_column")
+    progress = progress or _no_progress
+
+    # Phase 1: columns, committed before the GiST builds
+    progress(PHASE_ADDING_COLUMNS, strategy="spatial")
+    with conn.cursor() as cur:
+        geoms = _Geometries(
+            *_geometry_column(cur, spec.target_name),
+            *_geometry_column(cur, spec.source_name),
+        )
+        if geoms.target_srid != geoms.source_srid and 0 in (
+            geoms.target_srid,
+            geoms.source_srid,
+        ):
+            raise Exception("Cannot reproject a geometry without SRID")
+        new_cols = _new_columns(cur, spec, geoms.source_col)
+        _add_columns(cur, spec.target_name, new_cols)
+        key = _primary_key(cur, spec.target_name)
+        rows_total = _estimate_rows(cur, spec.target_name)
+    conn.commit()
+
+    added = [c.name for c in new_cols]
+    try:
+        build_indexes(
+            conn,
+            [
+                (spec.target_name, geoms.target_col),
+                (spec.source_name, geoms.source_col),
+            ],
+            method="gist",
+        )
+
+        # Phase 2: rows
+        _update_rows(
+            conn,
+            spec.target_name,
+            key,
+            _spatial_update_sql(spec, new_cols, geoms, key),
+            rows_total,
+            progress,
+            batch_size or JOIN_BATCH_SIZE,
+            {"max_distance": spec.max_distance},
+        )
+
+        # Phase 3: statistics for the new columns
+        with conn.cursor() as cur:
+            cur.execute(SQL("ANALYZE {}").format(Identifier(spec.target_name)))
+        conn.commit()
+    except Exception:
+        drop_join_columns(conn, spec.target_name, added)
+        raise
+    return added
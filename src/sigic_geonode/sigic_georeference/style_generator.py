@@ -1,9 +1,9 @@
 import logging
 import re
 
-import requests
 from psycopg2.sql import SQL, Identifier
 
+from .legend import render_legends
 from .utils import get_name_from_ds
 
 logger = logging.getLogger(__name__)
@@ -374,17 +374,13 @@ def build_numeric_sld(
 
 def set_default_style_in_geoserver(style_name: str, layer_alternate: str) -> None:
     """Set the default style for a layer in GeoServer via PUT /rest/layers/{alternate}."""
-    from django.conf import settings
+    from sigic_geonode.sigic_styles.cache import invalidate_layer_metadata
+    from sigic_geonode.utils.geoserver_client import geoserver
 
-    gs_url = settings.OGC_SERVER["default"]["LOCATION"].rstrip("/")
-    auth = (
-        settings.OGC_SERVER["default"]["USER"],
-        settings.OGC_SERVER["default"]["PASSWORD"],
-    )
     workspace = layer_alternate.split(":")[0]
-    r = requests.put(
-        f"{gs_url}/rest/layers/{layer_alternate}",
-        json={
+    r = geoserver.put_layer(
+        layer_alternate,
+        {
             "layer": {
                 "defaultStyle": {
                     "name": style_name,
@@ -392,10 +388,9 @@ def set_default_style_in_geoserver(style_name: str, layer_alternate: str) -> Non
                 }
             }
         },
-        auth=auth,
-        headers={"Content-Type": "application/json"},
-        timeout=15,
+        fmt="json",
     )
+    invalidate_layer_metadata(layer_alternate)
     if r.status_code not in (200, 201):
         raise Exception(
             f"GeoServer rejected default style update for {layer_alternate}: "
@@ -407,72 +402,26 @@ def push_style_to_geoserver(style_name: str, sld_body: str, layer_alternate: str
     """
     Create/update a style in GeoServer and associate it with the layer.
 
-    Steps (same pattern as sigic_styles/views.py):
-    1. POST /rest/workspaces/{ws}/styles  — create style entry
-    2. PUT  /rest/workspaces/{ws}/styles/{name}  — upload SLD
-    3. POST /rest/layers/{alternate}/styles  — associate with layer
+    Runs the style write pipeline (sigic_styles/pipeline.py):
+    1. POST /rest/workspaces/{ws}/styles?name={name}&raw=true  — create with
+       the SLD inline (PUT of the SLD instead if the style already exists)
+    2. POST /rest/layers/{alternate}/styles  — associate with layer
+
+    If the association fails, a style created in step 1 is deleted again.
+    All calls go through the shared pooled GeoServer client.
     """
-    from django.conf import settings
+    from sigic_geonode.sigic_styles.pipeline import plan_create
+    from sigic_geonode.utils.sld_utils import normalize_sld
 
-    gs_url = settings.OGC_SERVER["default"]["LOCATION"].rstrip("/")
-    auth = (
-        settings.OGC_SERVER["default"]["USER"],
-        settings.OGC_SERVER["default"]["PASSWORD"],
-    )
     workspace = layer_alternate.split(":")[0]  # "geonode"
 
-    # 1. Create style entry
-    wrapper = (
-        f"<style>"
-        f"<name>{style_name}</name>"
-        f"<filename>{style_name}.sld</filename>"
-        f"</style>"
-    )
-    r = requests.post(
-        f"{gs_url}/rest/workspaces/{workspace}/styles",
-        data=wrapper,
-        auth=auth,
-        headers={"Content-Type": "text/xml"},
-        timeout=15,
-    )
-    if r.status_code not in (200, 201, 409):
-        raise Exception(
-            f"GeoServer rejected style creation for {style_name}: "
-            f"{r.status_code} {r.text}"
-        )
-
-    # 2. Upload SLD content (apply fix for QGIS/SLD 1.1.0 compatibility)
-    from sigic_geonode.utils.sld_utils import fix_sld, needs_fix
-
-    if needs_fix(sld_body):
-        sld_body = fix_sld(sld_body)
-
-    r = requests.put(
-        f"{gs_url}/rest/workspaces/{workspace}/styles/{style_name}",
-        data=sld_body.encode("utf-8"),
-        auth=auth,
-        headers={"Content-Type": "application/vnd.ogc.sld+xml"},
-        timeout=15,
-    )
-    if r.status_code not in (200, 201):
-        raise Exception(
-            f"GeoServer rejected SLD upload for {style_name}: "
-            f"{r.status_code} {r.text}"
-        )
+    # Apply fix for QGIS/SLD 1.1.0 compatibility before uploading
+    sld_body = normalize_sld(sld_body).body
 
-    # 3. Associate with layer
-    r = requests.post(
-        f"{gs_url}/rest/layers/{layer_alternate}/styles",
-        data=f"<style><name>{style_name}</name></style>",
-        auth=auth,
-        headers={"Content-Type": "application/xml"},
-        timeout=15,
-    )
-    if r.status_code not in (200, 201):
-        raise Exception(
-            f"GeoServer rejected style association {style_name} → {layer_alternate}: "
-            f"{r.status_code} {r.text}"
-        )
+    # Raises PipelineError with the failed step and GeoServer's response
+    plan_create(
+        workspace, layer_alternate, style_name, sld_body, overwrite=True
+    ).run()
 
 
 def register_style_in_geonode(ds, style_name: str, sld_body: str):
@@ -525,13 +474,17 @@ def generate_and_register_styles(ds, data_columns: list) -> None:
     5. Register in GeoNode
 
     Failures per column are logged but do not abort the loop.
+
+    Steps 1-3 run on one pooled geodata connection, which is released before
+    the GeoServer/GeoNode calls so it is not held during network I/O.
     """
-    from sigic_geonode.utils.geodata_conn import connection
+    from sigic_geonode.utils.geodata_conn import geodata
 
     layer_name = get_name_from_ds(ds)
     first_style = None
+    generated = []
 
-    with connection.cursor() as cur:
+    with geodata.cursor() as cur:
         geom_type = get_geometry_type(layer_name, cur)
 
         for col_name in data_columns:
@@ -568,17 +521,23 @@ def generate_and_register_styles(ds, data_columns: list) -> None:
                     )
             except Exception as e:
                 logger.error(f"SLD generation failed for column {col_name}: {e}")
+                # Read-only queries: reset an aborted transaction and go on
+                cur.connection.rollback()
                 continue
 
-            try:
-                push_style_to_geoserver(style_name, sld_body, ds.alternate)
-                sty = register_style_in_geonode(ds, style_name, sld_body)
-                logger.info(f"Style {style_name} created for dataset {ds.id}")
-                if first_style is None:
-                    first_style = sty
-            except Exception as e:
-                logger.error(f"Style registration failed for {style_name}: {e}")
-                continue
+            generated.append((style_name, sld_body))
+
+    for style_name, sld_body in generated:
+        try:
+            push_style_to_geoserver(style_name, sld_body, ds.alternate)
+            sty = register_style_in_geonode(ds, style_name, sld_body)
+            render_legends(style_name, sld_body)
+            logger.info(f"Style {style_name} created for dataset {ds.id}")
+            if first_style is None:
+                first_style = sty
+        except Exception as e:
+            logger.error(f"Style registration failed for {style_name}: {e}")
+            continue
 
     # Set the first generated style as the dataset's default style
     if first_style is not None:
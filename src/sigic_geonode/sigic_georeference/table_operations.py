@@ -1,122 +1,354 @@
-import traceback
+from typing import NamedTuple
 
 from celery import chain as celery_chain
+from django.urls import reverse as reverse_url
 from geonode.base import enumerations
 from geonode.layers.models import Attribute, Dataset, Style
-from psycopg2.sql import SQL, Identifier
 from rest_framework import status
+from rest_framework.exceptions import PermissionDenied
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.request import Request
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
-from sigic_geonode.celeryapp import generate_column_styles, sync_geoserver
-from sigic_geonode.utils.geodata_conn import connection
-
+from sigic_geonode.celeryapp import (
+    generate_column_styles,
+    join_dataframes,
+    sync_geoserver,
+)
+from sigic_geonode.utils.geodata_conn import geodata
+
+from .jobs import (
+    create_job,
+    fail_job,
+    get_job,
+    latest_job,
+    running_job_id,
+    set_phase,
+)
+from .join_preview import preview_join
+from .join_sql import (
+    JOIN_STATEMENT_TIMEOUT_MS,
+    drop_join_columns,
+    run_join_sql,
+    run_multi_join_sql,
+)
+from .spatial_join import (
+    AGGREGATE_FIRST,
+    AGGREGATES,
+    PREDICATE_INTERSECTS,
+    PREDICATES,
+    SpatialJoinSpec,
+    run_spatial_join_sql,
+)
 from .utils import get_dataset, get_name_from_ds
 
+JOIN_ATTRIBUTE = "attribute"
+JOIN_SPATIAL = "spatial"
+JOIN_MULTI = "multi"
+
+
+class JoinSides(NamedTuple):
+    """Target (dataset being modified) and source (dataset providing data)."""
+
+    target_ds: Dataset
+    target_name: str
+    target_pivot: str
+    source_ds: Dataset
+    source_name: str
+    source_pivot: str
+
+
+def _join_params(request_data) -> dict:
+    """Join parameters shared by /join and /join/preview."""
+    return {
+        "layer": int(request_data.get("layer", -1)),
+        "geo_layer": int(request_data.get("geo_layer", -1)),
+        "layer_pivot": request_data.get("layer_pivot", ""),
+        "geo_pivot": request_data.get("geo_pivot", ""),
+        "columns": request_data.getlist("columns", []),
+        "reverse": request_data.get("reverse", "false").lower() == "true",
+    }
+
+
+def _spatial_join_params(request_data) -> dict:
+    """Parameters of /join/spatial; raises ValueError if one is invalid."""
+    predicate = request_data.get("predicate", PREDICATE_INTERSECTS)
+    if predicate not in PREDICATES:
+        raise ValueError(f"predicate must be one of {', '.join(PREDICATES)}")
+    aggregate = request_data.get("aggregate", AGGREGATE_FIRST)
+    if aggregate not in AGGREGATES:
+        raise ValueError(f"aggregate must be one of {', '.join(AGGREGATES)}")
+    max_distance = request_data.get("max_distance") or None
+
+    return {
+        "operation": JOIN_SPATIAL,
+        "layer": int(request_data.get("layer", -1)),
+        "source_layer": int(request_data.get("source_layer", -1)),
+        "predicate": predicate,
+        "columns": request_data.getlist("columns", []),
+        "aggregate": aggregate,
+        "count_column": request_data.get("count_column") or None,
+        "max_distance": float(max_distance) if max_distance else None,
+        "reverse": False,
+    }
+
+
+def _multi_join_params(request_data) -> dict:
+    """
+    Parameters of /join/multi (a JSON body); raises ValueError if one is
+    invalid. Each source may override the default geo_pivot.
+    """
+    sources = request_data.get("sources")
+    if not isinstance(sources, list) or not sources:
+        raise ValueError("sources must be a non-empty list")
+
+    geo_pivot = request_data.get("geo_pivot", "")
+    parsed = []
+    for i, source in enumerate(sources):
+        if not isinstance(source, dict):
+            raise ValueError(f"sources[{i}] must be an object")
+        columns = source.get("columns")
+        if not isinstance(columns, list) or not columns:
+            raise ValueError(f"sources[{i}].columns must be a non-empty list")
+        if "geometry" in columns:
+            raise ValueError(f"sources[{i}].columns cannot include geometry")
+        parsed.append(
+            {
+                "layer": int(source.get("layer", -1)),
+                "layer_pivot": source.get("layer_pivot", ""),
+                "geo_pivot": source.get("geo_pivot", geo_pivot),
+                "columns": columns,
+            }
+        )
+        if not parsed[-1]["layer_pivot"] or not parsed[-1]["geo_pivot"]:
+            raise ValueError(f"sources[{i}] needs layer_pivot and geo_pivot")
+
+    columns = [c for source in parsed for c in source["columns"]]
+    repeated = sorted({c for c in columns if columns.count(c) > 1})
+    if repeated:
+        raise ValueError(f"columns requested from more than one source: {repeated}")
+
+    return {
+        "operation": JOIN_MULTI,
+        "geo_layer": int(request_data.get("geo_layer", -1)),
+        "sources": parsed,
+        "reverse": False,
+    }
+
+
+def _resolve_join(params: dict) -> JoinSides:
+    if params.get("operation") == JOIN_MULTI:
+        geo_ds = get_dataset(params["geo_layer"])
+        for source in params["sources"]:
+            get_dataset(source["layer"])
+        return JoinSides(geo_ds, get_name_from_ds(geo_ds), None, None, None, None)
+
+    if params.get("operation") == JOIN_SPATIAL:
+        ds = get_dataset(params["layer"])
+        source_ds = get_dataset(params["source_layer"])
+        return JoinSides(
+            ds, get_name_from_ds(ds), None, source_ds, get_name_from_ds(source_ds), None
+        )
 
-_SAFE_PG_TYPES = {
-    "integer": "INTEGER",
-    "bigint": "BIGINT",
-    "smallint": "SMALLINT",
-    "double precision": "DOUBLE PRECISION",
-    "real": "REAL",
-    "numeric": "NUMERIC",
-    "decimal": "NUMERIC",
-    "boolean": "BOOLEAN",
-    "date": "DATE",
-    "timestamp without time zone": "TIMESTAMP",
-    "timestamp with time zone": "TIMESTAMPTZ",
-}
-
-
-def _get_source_col_types(cur, source_name: str, col_names: list) -> dict:
-    """Return {col_name: pg_type_sql} for the given columns in source_name."""
-    cur.execute(
-        """
-        SELECT column_name, data_type
-        FROM information_schema.columns
-        WHERE table_name = %s AND table_schema = 'public'
-          AND column_name = ANY(%s)
-        """,
-        [source_name, col_names],
-    )
-    result = {}
-    for col_name, data_type in cur.fetchall():
-        result[col_name] = _SAFE_PG_TYPES.get(data_type.lower(), "TEXT")
-    return result
+    ds = get_dataset(params["layer"])
+    geo_ds = get_dataset(params["geo_layer"])
+    tabular = (ds, get_name_from_ds(ds), params["layer_pivot"])
+    geographic = (geo_ds, get_name_from_ds(geo_ds), params["geo_pivot"])
+    if params["reverse"]:
+        return JoinSides(*tabular, *geographic)
+    return JoinSides(*geographic, *tabular)
+
+
+def _join_dataset_ids(params: dict) -> list:
+    """Ids of every dataset a join reads or writes."""
+    ids = [params.get(key) for key in ("layer", "geo_layer", "source_layer")]
+    ids += [source["layer"] for source in params.get("sources", [])]
+    return [i for i in ids if i is not None and i >= 0]
+
+
+def _check_view_permission(user, params: dict) -> None:
+    """Raise PermissionDenied unless user can view every dataset of the join."""
+    datasets = Dataset.objects.filter(id__in=_join_dataset_ids(params))
+    for ds in datasets.select_related("resourcebase_ptr"):
+        if not user.has_perm("base.view_resourcebase", ds.resourcebase_ptr):
+            raise PermissionDenied(
+                f"You do not have permission to view dataset {ds.id}"
+            )
 
 
-def _run_join_sql(cur, target_name, source_name, target_pivot, source_pivot, columns, reverse):
+def _check_change_permission(user, target_ds: Dataset, params: dict) -> None:
     """
-    Execute ALTER TABLE + UPDATE SQL for a join operation.
-
-    reverse=True  → target is the tabular layer; may receive a geometry column
-    reverse=False → target is the geographic layer; only data columns are added
+    Raise PermissionDenied unless user can change target_ds, the dataset the
+    join writes, and view every dataset it reads.
     """
-    non_geom_cols = [c for c in columns if c != "geometry"]
-    if non_geom_cols:
-        # Read source column types so they are preserved in the target table
-        col_types = _get_source_col_types(cur, source_name, non_geom_cols)
-        for col in non_geom_cols:
-            pg_type = col_types.get(col, "TEXT")
-            cur.execute(
-                SQL("ALTER TABLE {target} ADD COLUMN {col} " + pg_type + ";").format(
-                    target=Identifier(target_name),
-                    col=Identifier(col),
-                )
+    if not user.has_perm("base.change_resourcebase", target_ds.resourcebase_ptr):
+        raise PermissionDenied(
+            f"You do not have permission to change dataset {target_ds.id}"
+        )
+    _check_view_permission(user, params)
+
+
+def _style_columns(target_ds: Dataset, columns: list, reverse: bool) -> list:
+    data_columns = [c for c in columns if c != "geometry"]
+    # For reverse joins (geo→tabular) only geometry is transferred, so
+    # generate styles for all pre-existing numeric/string attributes of
+    # the target dataset that are not ID-like columns.
+    if reverse and not data_columns:
+        data_columns = list(
+            target_ds.attributes
+            .exclude(attribute_type__icontains="gml")
+            .exclude(attribute__iregex=r"(^id$|_id$|^ogc_fid$|^fid$|^pk$|^entidad$|^mun$|^cve)")
+            .values_list("attribute", flat=True)
+        )
+    return data_columns
+
+
+def _run_join_sql(conn, sides: JoinSides, params: dict, progress) -> list:
+    """Run the attribute, spatial or multi join SQL; return the columns added."""
+    if params.get("operation") == JOIN_MULTI:
+        sources = [
+            (
+                get_name_from_ds(get_dataset(source["layer"])),
+                source["geo_pivot"],
+                source["layer_pivot"],
+                source["columns"],
             )
+            for source in params["sources"]
+        ]
+        return run_multi_join_sql(conn, sides.target_name, sources, progress=progress)
+
+    if params.get("operation") == JOIN_SPATIAL:
+        spec = SpatialJoinSpec(
+            sides.target_name,
+            sides.source_name,
+            params["predicate"],
+            params["columns"],
+            params["aggregate"],
+            params["count_column"],
+            params["max_distance"],
+        )
+        return run_spatial_join_sql(conn, spec, progress=progress)
+
+    return run_join_sql(
+        conn,
+        sides.target_name,
+        sides.source_name,
+        sides.target_pivot,
+        sides.source_pivot,
+        params["columns"],
+        params["reverse"],
+        progress=progress,
+    )
 
-    # When reverse=True and geometry is requested, read the real geom column name
-    source_geom_col = None
-    if reverse and "geometry" in columns:
-        cur.execute(
-            SQL(
-                "SELECT srid, f_geometry_column FROM geometry_columns"
-                " WHERE f_table_name=%s"
+
+def run_join(job_id: str, params: dict) -> None:
+    """
+    Body of the join_dataframes Celery task, for attribute, spatial and
+    multi-source joins.
+
+    Runs the join SQL (see join_sql.py and spatial_join.py) on a pooled
+    connection and updates the GeoNode attributes, reporting progress to
+    the job record, then queues sync_geoserver and generate_column_styles
+    for the same job. Raises on failure after leaving the target dataset in
+    STATE_INCOMPLETE.
+    """
+    sides = _resolve_join(params)
+    target_ds = sides.target_ds
+    reverse = params["reverse"]
+
+    def progress(phase, **fields):
+        set_phase(job_id, phase, **fields)
+
+    target_ds.state = enumerations.STATE_RUNNING
+    target_ds.save()
+    try:
+        with geodata.connection(statement_timeout=JOIN_STATEMENT_TIMEOUT_MS) as conn:
+            added = _run_join_sql(conn, sides, params, progress)
+            try:
+                update_attributes(target_ds, sides.source_ds, added, reverse)
+            except Exception as e:
+                drop_join_columns(conn, sides.target_name, added)
+                raise Exception(f"failed updating attributes: {e}") from e
+    except Exception:
+        target_ds.state = enumerations.STATE_INCOMPLETE
+        target_ds.save()
+        raise
+
+    target_ds.state = enumerations.STATE_WAITING
+    target_ds.save()
+
+    try:
+        celery_chain(
+            sync_geoserver.s(target_ds.id, job_id=job_id),
+            generate_column_styles.si(
+                target_ds.id,
+                _style_columns(target_ds, added, reverse),
+                job_id=job_id,
             ),
-            [source_name],
+        ).apply_async()
+    except Exception:
+        target_ds.state = enumerations.STATE_INCOMPLETE
+        target_ds.save()
+        raise
+
+
+def _queue_join(params: dict, user) -> Response:
+    """
+    Check user's permissions, take the target dataset's join lock and queue
+    join_dataframes.
+    """
+    target_ds = _resolve_join(params).target_ds
+    try:
+        _check_change_permission(user, target_ds, params)
+    except PermissionDenied as e:
+        return Response(
+            {"status": "forbidden", "msg": str(e.detail)},
+            status=status.HTTP_403_FORBIDDEN,
         )
-        row = cur.fetchone()
-        if row is None:
-            raise Exception(f"No geometry_columns entry found for {source_name}")
-        srid, source_geom_col = row[0], row[1]
-        cur.execute(
-            SQL(
-                'ALTER TABLE {target} ADD COLUMN "geometry" geometry(Geometry,%s);'
-            ).format(target=Identifier(target_name)),
-            [srid],
+
+    running = running_job_id(target_ds.id)
+    if running:
+        return Response(
+            {"status": "join already running", "job_id": running},
+            status=status.HTTP_409_CONFLICT,
         )
 
-    # Build UPDATE: for "geometry" entries use the actual source geom column name
-    def _col_assignment(col):
-        if col == "geometry" and source_geom_col:
-            # target."geometry" = source.<real_geom_col>
-            return SQL("{target_col} = {source}.{src_col}").format(
-                target_col=Identifier("geometry"),
-                source=Identifier(source_name),
-                src_col=Identifier(source_geom_col),
-            )
-        return SQL("{col} = {source}.{col}").format(
-            col=Identifier(col),
-            source=Identifier(source_name),
+    if target_ds.state not in [
+        enumerations.STATE_PROCESSED,
+        enumerations.STATE_INCOMPLETE,
+    ]:
+        return Response(
+            {"status": f"data not in valid state, currently {target_ds.state}"},
+            status=status.HTTP_400_BAD_REQUEST,
         )
 
-    cur.execute(
-        SQL(
-            """
-            UPDATE {target} SET {set_command}
-            FROM {source}
-            WHERE {target}.{target_pivot} = {source}.{source_pivot};
-            """
-        ).format(
-            target=Identifier(target_name),
-            source=Identifier(source_name),
-            target_pivot=Identifier(target_pivot),
-            source_pivot=Identifier(source_pivot),
-            set_command=SQL(", ").join([_col_assignment(col) for col in columns]),
+    job_id = create_job(target_ds.id, **params)
+    if job_id is None:  # lost the race for the lock
+        return Response(
+            {
+                "status": "join already running",
+                "job_id": running_job_id(target_ds.id),
+            },
+            status=status.HTTP_409_CONFLICT,
         )
+
+    try:
+        join_dataframes.apply_async((job_id, params))
+    except Exception as e:
+        fail_job(job_id, str(e))
+        return Response(
+            {"status": "failed queuing join", "msg": str(e)},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
+    return Response(
+        {
+            "status": "accepted",
+            "job_id": job_id,
+            "status_url": reverse_url("join-job", args=[job_id]),
+        },
+        status=status.HTTP_202_ACCEPTED,
     )
 
 
@@ -124,160 +356,149 @@ class JoinDataframes(APIView):
     permission_classes = [IsAuthenticated]
 
     def post(self, request: Request):
-        request_data: dict = request.data
-        ds = get_dataset(request_data.get("layer", -1))
-        geo_ds = get_dataset(request_data.get("geo_layer", -1))
-        layer_name: str = get_name_from_ds(ds)
-        geo_name: str = get_name_from_ds(geo_ds)
-        layer_pivot: str = request_data.get("layer_pivot", "")
-        geo_pivot: str = request_data.get("geo_pivot", "")
-        columns: list[str] = request_data.getlist("columns", [])
-        reverse: bool = request_data.get("reverse", "false").lower() == "true"
-
-        # Resolve target (dataset being modified) and source (dataset providing data)
-        if reverse:
-            target_ds, target_name = ds, layer_name
-            source_ds, source_name = geo_ds, geo_name
-            target_pivot, source_pivot = layer_pivot, geo_pivot
-        else:
-            target_ds, target_name = geo_ds, geo_name
-            source_ds, source_name = ds, layer_name
-            target_pivot, source_pivot = geo_pivot, layer_pivot
-
-        with connection.cursor() as cur:
-            if target_ds.state not in [
-                enumerations.STATE_PROCESSED,
-                enumerations.STATE_INCOMPLETE,
-            ]:
-                return Response(
-                    {
-                        "status": (
-                            f"data not in valid state, currently {target_ds.state}"
-                        )
-                    },
-                    status=status.HTTP_400_BAD_REQUEST,
-                )
-            target_ds.state = enumerations.STATE_RUNNING
-            target_ds.save()
-            try:
-                _run_join_sql(
-                    cur,
-                    target_name,
-                    source_name,
-                    target_pivot,
-                    source_pivot,
-                    columns,
-                    reverse,
-                )
-            except Exception as e:
-                connection.rollback()
-                target_ds.state = enumerations.STATE_INCOMPLETE
-                target_ds.save()
-                return Response(
-                    {
-                        "status": "failed running database changes",
-                        "error": str(e),
-                        "traceback": traceback.format_exc(),
-                    },
-                    status=status.HTTP_400_BAD_REQUEST,
-                )
+        """
+        Validate the join and queue it as a background job.
 
+        Returns 202 with the job id; progress is available at
+        /jobs/<job_id>/ and, for the target dataset, at /status/<layer>/.
+        Returns 403 unless the user can change the target dataset and view
+        the source, and 409 if the target already has a join running.
+        """
         try:
-            self.update_attributes(target_ds, source_ds, columns, reverse)
-        except Exception:
-            connection.rollback()
-            target_ds.state = enumerations.STATE_INCOMPLETE
-            target_ds.save()
+            params = _join_params(request.data)
+        except (TypeError, ValueError) as e:
             return Response(
-                {"status": "failed updating attributes"},
+                {"status": "invalid parameters", "msg": str(e)},
                 status=status.HTTP_400_BAD_REQUEST,
             )
+        return _queue_join(params, request.user)
 
-        data_columns = [c for c in columns if c != "geometry"]
-        # For reverse joins (geo→tabular) only geometry is transferred, so
-        # generate styles for all pre-existing numeric/string attributes of
-        # the target dataset that are not ID-like columns.
-        if reverse and not data_columns:
-            data_columns = list(
-                target_ds.attributes
-                .exclude(attribute_type__icontains="gml")
-                .exclude(attribute__iregex=r"(^id$|_id$|^ogc_fid$|^fid$|^pk$|^entidad$|^mun$|^cve)")
-                .values_list("attribute", flat=True)
-            )
+
+class SpatialJoin(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request: Request):
+        """
+        Queue a spatial join (intersects, contains or nearest) as a
+        background job; responses as for /join.
+        """
         try:
-            celery_chain(
-                sync_geoserver.s(target_ds.id),
-                generate_column_styles.si(target_ds.id, data_columns),
-            ).apply_async()
-        except Exception as e:
-            connection.rollback()
-            target_ds.state = enumerations.STATE_INCOMPLETE
-            target_ds.save()
+            params = _spatial_join_params(request.data)
+        except (TypeError, ValueError) as e:
             return Response(
-                {"status": "failed syncing geoserver", "msg": str(e)},
+                {"status": "invalid parameters", "msg": str(e)},
                 status=status.HTTP_400_BAD_REQUEST,
             )
+        return _queue_join(params, request.user)
 
-        connection.commit()
-        target_ds.state = enumerations.STATE_WAITING
-        target_ds.save()
-        return Response({"status": "success"})
 
-    def update_attributes(
-        self,
-        target_ds: Dataset,
-        source_ds: Dataset,
-        columns: list,
-        reverse: bool,
-    ):
+class MultiJoin(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request: Request):
         """
-        Update GeoNode Attribute records and geographic metadata.
-
-        reverse=True  (geo → tabular):
-            Creates Attribute records on target_ds and copies style/SRID/bbox
-            from source_ds (the geographic layer).
-        reverse=False (tabular → geo):
-            Creates Attribute records on target_ds (the geographic layer).
-            Does NOT touch style/SRID/bbox — the geo layer already has them.
+        Queue a join of several tabular sources into one geographic dataset,
+        written in a single pass and followed by a single GeoServer sync
+        and style generation; responses as for /join.
         """
-        # Find the source geometry attribute by type (column name varies per dataset)
-        source_geom_attr = (
-            source_ds.attributes.filter(
-                attribute_type__icontains="gml"
-            ).first()
-            if reverse
-            else None
-        )
+        try:
+            params = _multi_join_params(request.data)
+        except (TypeError, ValueError) as e:
+            return Response(
+                {"status": "invalid parameters", "msg": str(e)},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        return _queue_join(params, request.user)
+
+
+class JoinPreview(APIView):
+    permission_classes = [IsAuthenticated]
 
-        for col in columns:
-            if col == "geometry":
-                if not reverse:
-                    # Geometry already exists on the geo layer
-                    continue
-                attribute_type = (
-                    source_geom_attr.attribute_type if source_geom_attr else "gml:GeometryPropertyType"
+    def post(self, request: Request):
+        """
+        Dry run of /join with the same parameters: pivot match statistics,
+        type checks and a few joined rows. Nothing is modified.
+        """
+        try:
+            params = _join_params(request.data)
+            sides = _resolve_join(params)
+            _check_view_permission(request.user, params)
+            with geodata.connection() as conn:
+                result = preview_join(
+                    conn,
+                    sides.target_name,
+                    sides.source_name,
+                    sides.target_pivot,
+                    sides.source_pivot,
+                    params["columns"],
+                    params["reverse"],
                 )
-            else:
-                attribute_type = "xsd:string"
-
-            Attribute.objects.get_or_create(
-                dataset_id=target_ds.id,
-                attribute=col,
-                defaults={
-                    "attribute_type": attribute_type,
-                    "display_order": 100,
-                },
+        except PermissionDenied as e:
+            return Response(
+                {"status": "forbidden", "msg": str(e.detail)},
+                status=status.HTTP_403_FORBIDDEN,
             )
+        except Exception as e:
+            return Response(
+                {"status": "failed", "msg": str(e)}, status=status.HTTP_400_BAD_REQUEST
+            )
+        return Response(result)
+
 
-        if reverse:
-            if source_ds.default_style_id:
-                sty = Style.objects.get(id=source_ds.default_style_id)
-                sty.dataset_styles.set([*sty.dataset_styles.all(), target_ds])
-                target_ds.default_style_id = source_ds.default_style_id
-            target_ds.srid = source_ds.srid
-            target_ds.ll_bbox_polygon = source_ds.ll_bbox_polygon
-            target_ds.bbox_polygon = source_ds.bbox_polygon
-            target_ds.save()
+def update_attributes(
+    target_ds: Dataset,
+    source_ds: Dataset,
+    columns: list,
+    reverse: bool,
+):
+    """
+    Update GeoNode Attribute records and geographic metadata.
+
+    reverse=True  (geo → tabular):
+        Creates Attribute records on target_ds and copies style/SRID/bbox
+        from source_ds (the geographic layer).
+    reverse=False (tabular → geo):
+        Creates Attribute records on target_ds (the geographic layer).
+        Does NOT touch style/SRID/bbox — the geo layer already has them.
+    """
+    # Find the source geometry attribute by type (column name varies per dataset)
+    source_geom_attr = (
+        source_ds.attributes.filter(
+            attribute_type__icontains="gml"
+        ).first()
+        if reverse
+        else None
+    )
+
+    for col in columns:
+        if col == "geometry":
+            if not reverse:
+                # Geometry already exists on the geo layer
+                continue
+            attribute_type = (
+                source_geom_attr.attribute_type if source_geom_attr else "gml:GeometryPropertyType"
+            )
+        else:
+            attribute_type = "xsd:string"
+
+        Attribute.objects.get_or_create(
+            dataset_id=target_ds.id,
+            attribute=col,
+            defaults={
+                "attribute_type": attribute_type,
+                "display_order": 100,
+            },
+        )
+
+    if reverse:
+        if source_ds.default_style_id:
+            sty = Style.objects.get(id=source_ds.default_style_id)
+            sty.dataset_styles.set([*sty.dataset_styles.all(), target_ds])
+            target_ds.default_style_id = source_ds.default_style_id
+        target_ds.srid = source_ds.srid
+        target_ds.ll_bbox_polygon = source_ds.ll_bbox_polygon
+        target_ds.bbox_polygon = source_ds.bbox_polygon
+        target_ds.save()
 
 
 class Status(APIView):
@@ -285,7 +506,26 @@ class Status(APIView):
 
     def get(self, _request, layer: int):
         ds = get_dataset(layer)
-        return Response({"status": str(ds.state)})
+        return Response({"status": str(ds.state), "job": latest_job(ds.id)})
+
+
+class JoinJob(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, job_id: str):
+        job = get_job(job_id)
+        if job is None:
+            return Response(
+                {"status": "job not found"}, status=status.HTTP_404_NOT_FOUND
+            )
+        try:
+            _check_view_permission(request.user, job["params"])
+        except PermissionDenied as e:
+            return Response(
+                {"status": "forbidden", "msg": str(e.detail)},
+                status=status.HTTP_403_FORBIDDEN,
+            )
+        return Response(job)
 
 
 class Reset(APIView):
@@ -0,0 +1,503 @@
+import io
+from importlib.util import find_spec
+from unittest import mock, skipUnless
+
+from django.test import SimpleTestCase
+from lxml import etree
+from PIL import Image
+from psycopg2 import sql
+
+from sigic_geonode.sigic_georeference import join_sql, spatial_join
+from sigic_geonode.sigic_georeference.jobs import PHASE_UPDATING_ROWS
+from sigic_geonode.sigic_georeference.legend import (
+    FALLBACK_COLOR,
+    legend_entries,
+    render_png,
+    render_svg,
+)
+from sigic_geonode.utils.geodata_conn import GeodataPool
+
+SVG_NS = "{http://www.w3.org/2000/svg}"
+
+
+def _sld(*rules) -> str:
+    return (
+        '<StyledLayerDescriptor version="1.0.0"'
+        ' xmlns="http://www.opengis.net/sld">'
+        "<NamedLayer><Name>l</Name><UserStyle><FeatureTypeStyle>"
+        + "".join(rules)
+        + "</FeatureTypeStyle></UserStyle></NamedLayer></StyledLayerDescriptor>"
+    )
+
+
+def _polygon_rule(title: str, fill: str) -> str:
+    return (
+        f"<Rule><Title>{title}</Title><PolygonSymbolizer><Fill>"
+        f'<CssParameter name="fill">{fill}</CssParameter>'
+        "</Fill></PolygonSymbolizer></Rule>"
+    )
+
+
+def _point_rule(fill: str) -> str:
+    return (
+        "<Rule><Title>p</Title><PointSymbolizer><Graphic><Mark>"
+        f'<WellKnownName>circle</WellKnownName><Fill><CssParameter name="fill">'
+        f"{fill}</CssParameter></Fill></Mark></Graphic></PointSymbolizer></Rule>"
+    )
+
+
+INJECTED_FILL = "#fff&quot;/&gt;&lt;script&gt;alert(1)&lt;/script&gt;"
+
+
+class LegendColorTests(SimpleTestCase):
+    def test_hex_colors_are_kept(self):
+        entries = legend_entries(
+            _sld(_polygon_rule("a", "#1a2B3c"), _point_rule("#abc"))
+        )
+        self.assertEqual([e.color for e in entries], ["#1a2B3c", "#abc"])
+
+    def test_non_hex_colors_use_fallback(self):
+        for fill in (INJECTED_FILL, "red", "#12345", "rgb(0,0,0)"):
+            with self.subTest(fill=fill):
+                entries = legend_entries(_sld(_polygon_rule("a", fill)))
+                self.assertEqual(entries[0].color, FALLBACK_COLOR)
+
+    def test_svg_has_no_injected_markup(self):
+        entries = legend_entries(
+            _sld(
+                _polygon_rule("a", INJECTED_FILL),
+                _point_rule(INJECTED_FILL),
+                _polygon_rule("&lt;script&gt;x&lt;/script&gt; &quot;b&quot;", "#000"),
+            )
+        )
+        svg = render_svg(entries)
+
+        root = etree.fromstring(svg)
+        self.assertEqual(root.findall(f".//{SVG_NS}script"), [])
+        self.assertNotIn(b"<script", svg)
+        fills = [el.get("fill") for el in root if el.get("fill")]
+        self.assertEqual(fills, [FALLBACK_COLOR, FALLBACK_COLOR, "#000"])
+        labels = [el.text for el in root.iter(f"{SVG_NS}text")]
+        self.assertEqual(labels[2], '<script>x</script> "b"')
+
+    def test_png_renders_with_injected_color(self):
+        entries = legend_entries(
+            _sld(_polygon_rule("a", INJECTED_FILL), _point_rule(INJECTED_FILL))
+        )
+        png = render_png(entries)
+        image = Image.open(io.BytesIO(png))
+        self.assertEqual(image.format, "PNG")
+        # Swatch of the first row painted with the fallback color
+        self.assertEqual(image.convert("RGB").getpixel((10, 10)), (128, 128, 128))
+
+
+class GeodataStatementTimeoutTests(SimpleTestCase):
+    def setUp(self):
+        self.pool = GeodataPool()
+        self.conn = mock.MagicMock(closed=0)
+        self.cursor = self.conn.cursor.return_value.__enter__.return_value
+        patcher = mock.patch.multiple(
+            self.pool,
+            _checkout=mock.Mock(return_value=self.conn),
+            _checkin=mock.Mock(),
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def statements(self) -> list:
+        return [c.args[0] for c in self.cursor.execute.call_args_list]
+
+    def test_timeout_survives_intermediate_commits(self):
+        with self.pool.connection(statement_timeout=0) as conn:
+            conn.commit()
+            conn.commit()
+
+        self.assertEqual(
+            self.statements(),
+            ["SET statement_timeout = %s", "RESET statement_timeout"],
+        )
+        self.pool._checkin.assert_called_once_with(self.conn)
+
+    def test_timeout_is_reset_after_failure(self):
+        with self.assertRaises(RuntimeError):
+            with self.pool.connection(statement_timeout=1000):
+                raise RuntimeError("boom")
+
+        self.assertEqual(self.statements()[-1], "RESET statement_timeout")
+        self.conn.rollback.assert_called_once()
+
+    def test_no_session_change_without_timeout(self):
+        with self.pool.connection():
+            pass
+        self.assertEqual(self.statements(), [])
+
+
+def _compose(query) -> str:
+    if isinstance(query, sql.Composed):
+        return "".join(_compose(part) for part in query.seq)
+    if isinstance(query, sql.SQL):
+        return query.string
+    if isinstance(query, sql.Identifier):
+        return ".".join(f'"{s}"' for s in query.strings)
+    return str(query)
+
+
+def _render(query) -> str:
+    """psycopg2.sql composition as one line of text, without a connection."""
+    return " ".join(_compose(query).split())
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+        self.rows = []
+        self.rowcount = -1
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, query, params=None):
+        statement = _render(query)
+        self.conn.log.append(statement)
+        for pattern, result in self.conn.responses:
+            if pattern in statement:
+                if isinstance(result, Exception):
+                    raise result
+                result = result(params) if callable(result) else result
+                self.rows, self.rowcount = result
+                return
+        self.rows, self.rowcount = [], 0
+
+    def fetchone(self):
+        return self.rows[0] if self.rows else None
+
+    def fetchall(self):
+        return list(self.rows)
+
+
+class FakeConnection:
+    """
+    Records every statement (and "COMMIT"/"ROLLBACK"). responses are
+    (substring, (rows, rowcount) | callable(params) | exception) pairs;
+    the first substring found in the statement wins.
+    """
+
+    def __init__(self, responses=()):
+        self.responses = list(responses)
+        self.log = []
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def commit(self):
+        self.log.append("COMMIT")
+
+    def rollback(self):
+        self.log.append("ROLLBACK")
+
+    def statements(self, contains: str) -> list:
+        return [s for s in self.log if contains in s]
+
+
+def _keyset(total: int, batch_size: int):
+    """Answers the batch bounds query over keys 1..total."""
+
+    def respond(params):
+        last = params["last"] or 0
+        upper = min(last + batch_size, total)
+        return [(upper if upper > last else None, upper - last)], 1
+
+    return respond
+
+
+def _join_conn(rows: int = 25, key="fid", batch_size: int = 10, **responses):
+    return FakeConnection(
+        [
+            *responses.items(),
+            ("information_schema.columns", ([("valor", "integer")], 1)),
+            ("reltuples", ([(rows,)], 1)),
+            ("indisprimary", ([(key,)] if key else [], 1)),
+            ("pg_am", ([], 0)),
+            ("SELECT max(k), count(*)", _keyset(rows, batch_size)),
+            ("UPDATE", ([], 7)),
+        ]
+    )
+
+
+def _run_update_join(conn, batch_size: int = 10):
+    progress = mock.Mock()
+    added = join_sql.run_join_sql(
+        conn,
+        "municipios",
+        "censo",
+        "cvegeo",
+        "cvegeo",
+        ["valor"],
+        False,
+        progress=progress,
+        batch_size=batch_size,
+    )
+    return added, progress
+
+
+class JoinStrategyTests(SimpleTestCase):
+    spec = join_sql.JoinSpec("municipios", "censo", "cvegeo", "cvegeo", ["v"], False)
+    new_cols = [join_sql.NewColumn("v", "INTEGER", "v")]
+
+    def test_small_join_updates_in_place(self):
+        conn = FakeConnection()
+        strategy = join_sql.choose_strategy(conn.cursor(), self.spec, 10, self.new_cols)
+
+        self.assertEqual(strategy, join_sql.STRATEGY_UPDATE)
+        self.assertEqual(conn.log, [])
+
+    def test_large_table_is_rewritten(self):
+        conn = FakeConnection([("pg_roles", ([(False,) * 6], 1))])
+        rows = join_sql.JOIN_REWRITE_MIN_ROWS
+        strategy = join_sql.choose_strategy(
+            conn.cursor(), self.spec, rows, self.new_cols
+        )
+        self.assertEqual(strategy, join_sql.STRATEGY_REWRITE)
+
+    def test_blocked_rewrite_falls_back_to_update(self):
+        blockers = (False, False, True, False, False, False)  # triggers
+        conn = FakeConnection([("pg_roles", ([blockers], 1))])
+        rows = join_sql.JOIN_REWRITE_MIN_ROWS
+        strategy = join_sql.choose_strategy(
+            conn.cursor(), self.spec, rows, self.new_cols
+        )
+        self.assertEqual(strategy, join_sql.STRATEGY_UPDATE)
+
+    def test_existing_column_forces_update(self):
+        spec = self.spec._replace(columns=["v", "geometry"])
+        strategy = join_sql.choose_strategy(
+            FakeConnection().cursor(), spec, 10**9, self.new_cols
+        )
+        self.assertEqual(strategy, join_sql.STRATEGY_UPDATE)
+
+
+class UpdateJoinTests(SimpleTestCase):
+    def test_batches_commit_and_report_progress(self):
+        conn = _join_conn(rows=25)
+        added, progress = _run_update_join(conn)
+
+        self.assertEqual(added, ["valor"])
+        self.assertEqual(len(conn.statements("ADD COLUMN")), 1)
+        updates = conn.statements("UPDATE")
+        self.assertEqual(len(updates), 3)
+        self.assertTrue(all('"municipios"."fid" <= %(upper)s' in u for u in updates))
+        # Every batch is committed before the next one starts
+        for update in updates:
+            self.assertEqual(conn.log[conn.log.index(update) + 1], "COMMIT")
+
+        done = [
+            c.kwargs["rows_done"]
+            for c in progress.call_args_list
+            if c.args == (PHASE_UPDATING_ROWS,)
+        ]
+        self.assertEqual(done, [0, 10, 20, 25])
+        self.assertEqual(len(conn.statements('ANALYZE "municipios"')), 1)
+
+    def test_source_pivot_index_is_created_and_dropped(self):
+        conn = _join_conn()
+        _run_update_join(conn)
+
+        name = join_sql._index_name("censo", "cvegeo")
+        self.assertEqual(
+            conn.statements("CREATE INDEX"),
+            [f'CREATE INDEX IF NOT EXISTS "{name}" ON "censo" USING btree ("cvegeo")'],
+        )
+        self.assertEqual(
+            conn.statements("DROP INDEX"), [f'DROP INDEX IF EXISTS "{name}"']
+        )
+
+    def test_columns_are_committed_before_indexes_are_built(self):
+        conn = _join_conn(key=None)
+        _run_update_join(conn)
+
+        alter = conn.log.index(conn.statements("ADD COLUMN")[0])
+        first_index = conn.log.index(conn.statements("CREATE INDEX")[0])
+        self.assertIn("COMMIT", conn.log[alter:first_index])
+
+    def test_table_without_primary_key_uses_one_update(self):
+        conn = _join_conn(key=None)
+        _run_update_join(conn)
+
+        updates = conn.statements("UPDATE")
+        self.assertEqual(len(updates), 1)
+        self.assertTrue(updates[0].endswith("AND TRUE"))
+        # Both pivots are indexed, since the UPDATE cannot walk a key
+        self.assertEqual(len(conn.statements("CREATE INDEX")), 2)
+
+    def test_failed_update_drops_added_columns(self):
+        conn = _join_conn(UPDATE=RuntimeError("statement timeout"))
+        with self.assertRaises(RuntimeError):
+            _run_update_join(conn)
+
+        self.assertEqual(
+            conn.statements("DROP COLUMN"),
+            ['ALTER TABLE "municipios" DROP COLUMN IF EXISTS "valor"'],
+        )
+        self.assertEqual(len(conn.statements("DROP INDEX")), 1)
+
+
+class SpatialJoinTests(SimpleTestCase):
+    def test_columns_are_committed_before_gist_indexes(self):
+        conn = _join_conn(geometry_columns=([("geom", 4326)], 1))
+        spec = spatial_join.SpatialJoinSpec(
+            "municipios", "censo", spatial_join.PREDICATE_INTERSECTS, ["valor"]
+        )
+        added = spatial_join.run_spatial_join_sql(conn, spec, batch_size=10)
+
+        self.assertEqual(added, ["valor"])
+        indexes = conn.statements("USING gist")
+        self.assertEqual(len(indexes), 2)
+        alter = conn.log.index(conn.statements("ADD COLUMN")[0])
+        first_index = conn.log.index(indexes[0])
+        self.assertIn("COMMIT", conn.log[alter:first_index])
+
+
+class RewriteJoinTests(SimpleTestCase):
+    def test_rewrite_swaps_table_in_one_transaction(self):
+        conn = FakeConnection(
+            [
+                ("information_schema.columns", ([("valor", "integer")], 1)),
+                ("reltuples", ([(25,)], 1)),
+                ("pg_get_constraintdef", ([("m_pkey", "p", "PRIMARY KEY (fid)")], 1)),
+                ("CREATE TABLE", ([], 25)),
+            ]
+        )
+        join_sql.run_join_sql(
+            conn,
+            "municipios",
+            "censo",
+            "cvegeo",
+            "cvegeo",
+            ["valor"],
+            False,
+            strategy=join_sql.STRATEGY_REWRITE,
+        )
+
+        new_table = join_sql._rewrite_name("municipios")
+        pkey = join_sql._rewrite_name("m_pkey")
+        statements = [s for s in conn.log if not s.startswith("SELECT")]
+        self.assertEqual(statements[0], "COMMIT")  # after reading the plan
+        self.assertEqual(
+            [s.split(" (")[0] for s in statements[1:]],
+            [
+                "SET LOCAL statement_timeout = %s",
+                'LOCK TABLE "municipios" IN EXCLUSIVE MODE',
+                f'CREATE TABLE "{new_table}" AS SELECT "municipios".*,'
+                f' "s0"."valor"::INTEGER AS "valor" FROM "municipios" LEFT JOIN',
+                f'ALTER TABLE "{new_table}" ADD CONSTRAINT "{pkey}" PRIMARY KEY',
+                f'ANALYZE "{new_table}"',
+                'DROP TABLE "municipios"',
+                f'ALTER TABLE "{new_table}" RENAME TO "municipios"',
+                f'ALTER INDEX "{pkey}" RENAME TO "m_pkey"',
+                "COMMIT",
+            ],
+        )
+
+
+@skipUnless(find_spec("geonode"), "Necesita GeoNode instalado")
+class JoinPermissionTests(SimpleTestCase):
+    """Joins that write a dataset need change on it and view on the sources."""
+
+    def setUp(self):
+        from sigic_geonode.sigic_georeference import table_operations
+
+        self.ops = table_operations
+        self.datasets = {}
+        for i in (1, 2, 3):
+            ds = mock.Mock(id=i, state=table_operations.enumerations.STATE_PROCESSED)
+            ds.resourcebase_ptr = ds
+            self.datasets[i] = ds
+
+        def filter_datasets(id__in):
+            found = [self.datasets[i] for i in id__in]
+            return mock.Mock(select_related=lambda *_: found)
+
+        dataset_model = mock.Mock()
+        dataset_model.objects.filter.side_effect = filter_datasets
+        for name, value in (
+            ("Dataset", dataset_model),
+            ("get_dataset", mock.Mock(side_effect=self.datasets.__getitem__)),
+            ("get_name_from_ds", mock.Mock(side_effect=lambda ds: f"t{ds.id}")),
+            ("running_job_id", mock.Mock(return_value=None)),
+            ("create_job", mock.Mock(return_value="job")),
+            ("reverse_url", mock.Mock(return_value="/jobs/job/")),
+        ):
+            patcher = mock.patch.object(table_operations, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        queue = mock.patch.object(table_operations, "join_dataframes")
+        self.join_dataframes = queue.start()
+        self.addCleanup(queue.stop)
+
+    def _post(self, view, data, can_change=(), can_view=(1, 2, 3), fmt="multipart"):
+        from rest_framework.test import APIRequestFactory, force_authenticate
+
+        def has_perm(perm, obj):
+            allowed = can_change if perm == "base.change_resourcebase" else can_view
+            return obj.id in allowed
+
+        user = mock.Mock(is_authenticated=True)
+        user.has_perm.side_effect = has_perm
+        request = APIRequestFactory().post("/", data, format=fmt)
+        force_authenticate(request, user=user)
+        return view.as_view()(request)
+
+    def _spatial(self, **perms):
+        data = {"layer": 1, "source_layer": 2, "columns": ["valor"]}
+        return self._post(self.ops.SpatialJoin, data, **perms)
+
+    def test_spatial_join_needs_change_on_target(self):
+        response = self._spatial(can_change=(2,))
+
+        self.assertEqual(response.status_code, 403)
+        self.join_dataframes.apply_async.assert_not_called()
+
+    def test_spatial_join_needs_view_on_source(self):
+        response = self._spatial(can_change=(1,), can_view=(1,))
+
+        self.assertEqual(response.status_code, 403)
+        self.join_dataframes.apply_async.assert_not_called()
+
+    def test_spatial_join_is_queued_with_permissions(self):
+        response = self._spatial(can_change=(1,))
+
+        self.assertEqual(response.status_code, 202)
+        self.join_dataframes.apply_async.assert_called_once()
+
+    def _multi(self, **perms):
+        data = {
+            "geo_layer": 1,
+            "geo_pivot": "cvegeo",
+            "sources": [
+                {"layer": 2, "layer_pivot": "cvegeo", "columns": ["a"]},
+                {"layer": 3, "layer_pivot": "cvegeo", "columns": ["b"]},
+            ],
+        }
+        return self._post(self.ops.MultiJoin, data, fmt="json", **perms)
+
+    def test_multi_join_needs_change_on_target(self):
+        response = self._multi(can_change=(2, 3))
+
+        self.assertEqual(response.status_code, 403)
+        self.join_dataframes.apply_async.assert_not_called()
+
+    def test_multi_join_needs_view_on_every_source(self):
+        response = self._multi(can_change=(1,), can_view=(1, 2))
+
+        self.assertEqual(response.status_code, 403)
+        self.assertIn("dataset 3", response.data["msg"])
+        self.join_dataframes.apply_async.assert_not_called()
+
+    def test_multi_join_is_queued_with_permissions(self):
+        response = self._multi(can_change=(1,))
+
+        self.assertEqual(response.status_code, 202)
+        self.join_dataframes.apply_async.assert_called_once()
@@ -2,12 +2,20 @@ from django.urls import path
 
 from sigic_geonode.sigic_georeference.table_operations import (
     JoinDataframes,
+    JoinJob,
+    JoinPreview,
+    MultiJoin,
     Reset,
+    SpatialJoin,
     Status,
 )
 
 urlpatterns = [
     path("/join", JoinDataframes.as_view(), name="join-dataframes"),
+    path("/join/preview", JoinPreview.as_view(), name="join-preview"),
+    path("/join/spatial", SpatialJoin.as_view(), name="join-spatial"),
+    path("/join/multi", MultiJoin.as_view(), name="join-multi"),
     path("/reset", Reset.as_view(), name="reset"),
     path("/status/<int:layer>/", Status.as_view(), name="status"),
+    path("/jobs/<str:job_id>/", JoinJob.as_view(), name="join-job"),
 ]
@@ -0,0 +1,234 @@
+# ==============================================================================
+#  SIGIC – Sistema Integral de Gestión e Información Científica
+#
+#  Derechos patrimoniales: CentroGeo (2025)
+#
+#  Nota:
+#    Este código fue desarrollado para el proyecto SIGIC de
+#    CentroGeo. Se mantiene crédito de autoría, pero la titularidad del código
+#    pertenece a CentroGeo conforme a obra por encargo.
+#
+#  SPDX-License-Identifier: LicenseRef-SIGIC-CentroGeo
+# ==============================================================================
+
+"""
+Helpers de la carga masiva de estilos (`sldstyles/bulk/`).
+
+- `collect_uploads` arma la lista `(nombre, sld)` a partir de varios
+  archivos `sld_files` y/o un `sld_zip`, con límites de cantidad y tamaño.
+- `prepare_styles` normaliza y valida todos los SLD en paralelo.
+- `push_styles` crea cada estilo con su SLD (un POST con `raw=true`)
+  usando el pool de conexiones del cliente de GeoServer.
+- `remove_styles` borra los estilos creados si después falla la asociación
+  al layer (`pipeline.plan_attach_styles`).
+"""
+
+import os
+import re
+import zipfile
+from collections import Counter
+from pathlib import PurePosixPath
+
+import requests
+
+from sigic_geonode.utils.geoserver_client import geoserver
+from sigic_geonode.utils.sld_schema import SLDSchemaError, validate_sld_schema
+from sigic_geonode.utils.sld_utils import (
+    InvalidSLDError,
+    SLDNeedsNormalization,
+    normalize_sld,
+    validate_sld_before_post,
+)
+
+from .pipeline import ALREADY_EXISTS
+
+BULK_MAX_FILES = int(os.getenv("SIGIC_STYLES_BULK_MAX_FILES", "100"))
+BULK_MAX_BYTES = int(os.getenv("SIGIC_STYLES_BULK_MAX_BYTES", str(50 * 1024 * 1024)))
+
+SLD_EXTENSIONS = (".sld", ".xml")
+
+_STYLE_NAME = re.compile(r"[\w.-]+")
+
+
+class BulkUploadError(Exception):
+    """Error en la solicitud completa (límites, zip inválido, nombres)."""
+
+    pass
+
+
+def _style_name(filename: str) -> str:
+    name = PurePosixPath(filename.replace("\\", "/")).stem
+    if not _STYLE_NAME.fullmatch(name):
+        raise BulkUploadError(f"Nombre de estilo inválido: '{filename}'")
+    return name
+
+
+def _read_zip(uploaded) -> list:
+    try:
+        archive = zipfile.ZipFile(uploaded)
+    except zipfile.BadZipFile as e:
+        raise BulkUploadError(f"'sld_zip' no es un zip válido: {e}") from e
+
+    with archive:
+        members = [
+            info
+            for info in archive.infolist()
+            if not info.is_dir()
+            and not info.filename.startswith("__MACOSX/")
+            and info.filename.lower().endswith(SLD_EXTENSIONS)
+        ]
+
+        # Se revisa el tamaño declarado antes de descomprimir
+        if len(members) > BULK_MAX_FILES:
+            raise BulkUploadError(
+                f"El zip trae {len(members)} estilos; el máximo es {BULK_MAX_FILES}"
+            )
+        if sum(info.file_size for info in members) > BULK_MAX_BYTES:
+            raise BulkUploadError(f"El contenido del zip supera {BULK_MAX_BYTES} bytes")
+
+        return [(_style_name(info.filename), archive.read(info)) for info in members]
+
+
+def collect_uploads(files: list, archive=None) -> list:
+    """
+    Regresa `[(nombre, sld_bytes), ...]`. El nombre del estilo es el nombre
+    del archivo sin extensión.
+
+    Raises:
+        BulkUploadError: Sin estilos, nombres repetidos o inválidos, o
+            límites `SIGIC_STYLES_BULK_MAX_FILES` / `_MAX_BYTES` excedidos
+    """
+    items = []
+    total = 0
+    for f in files:
+        total += f.size
+        items.append((_style_name(f.name), f.read()))
+
+    if archive is not None:
+        items.extend(_read_zip(archive))
+        total = sum(len(sld) for _, sld in items)
+
+    if not items:
+        raise BulkUploadError(
+            "Debes enviar 'sld_files' y/o 'sld_zip' con al menos un SLD."
+        )
+    if len(items) > BULK_MAX_FILES:
+        raise BulkUploadError(
+            f"Se enviaron {len(items)} estilos; el máximo es {BULK_MAX_FILES}"
+        )
+    if total > BULK_MAX_BYTES:
+        raise BulkUploadError(f"Los SLD enviados superan {BULK_MAX_BYTES} bytes")
+
+    counts = Counter(name for name, _ in items)
+    duplicated = sorted(name for name, n in counts.items() if n > 1)
+    if duplicated:
+        raise BulkUploadError(f"Nombres de estilo repetidos: {', '.join(duplicated)}")
+
+    return items
+
+
+def _prepare(sld: bytes):
+    """Normaliza y valida un SLD. Regresa `(body, None)` o `(None, error)`."""
+    try:
+        normalized = normalize_sld(sld)
+        validate_sld_before_post(normalized.root)
+        validate_sld_schema(normalized.root)
+    except (InvalidSLDError, SLDNeedsNormalization) as e:
+        error = {"error": str(e)}
+        if isinstance(e, SLDSchemaError):
+            error["schema_errors"] = e.errors
+        return None, error
+    return normalized.body, None
+
+
+def prepare_styles(items: list):
+    """
+    Normaliza y valida todos los SLD en el pool de hilos del cliente de
+    GeoServer. Regresa `(preparados, errores)`, con `errores` como
+    `{nombre: detalle}`.
+    """
+    results = geoserver.gather(*(lambda sld=sld: _prepare(sld) for _, sld in items))
+
+    prepared, errors = [], {}
+    for (name, _), (body, error) in zip(items, results):
+        if error:
+            errors[name] = error
+        else:
+            prepared.append((name, body))
+    return prepared, errors
+
+
+def _push(workspace: str, name: str, body: bytes, overwrite: bool) -> dict:
+    """
+    Crea (o con `overwrite` reemplaza) un estilo. Regresa `{"style",
+    "created"}`, con `created` False si ya existía, o una entrada con
+    `error`; un error de red de un estilo no interrumpe a los demás.
+    """
+    created = True
+    try:
+        r = geoserver.create_style_with_body(workspace, name, body)
+        if overwrite and r.status_code in ALREADY_EXISTS:
+            created = False
+            r = geoserver.upload_style(workspace, name, body, raw=True)
+    except requests.RequestException as e:
+        return {
+            "style": name,
+            "error": "No se pudo contactar a GeoServer",
+            "detail": str(e),
+        }
+
+    if r.status_code not in (200, 201):
+        return {
+            "style": name,
+            "error": "GeoServer rechazó el estilo",
+            "gs_status": r.status_code,
+            "gs_response": r.text,
+        }
+
+    return {"style": name, "created": created}
+
+
+def push_styles(workspace: str, prepared: list, overwrite: bool = False):
+    """
+    Crea cada estilo con su SLD de forma concurrente; con `overwrite`
+    reemplaza el SLD de los que ya existen.
+    Regresa `(subidos, fallidos, creados)`; `creados` son los subidos que no
+    existían antes (los que se pueden borrar si algo falla después).
+    """
+    results = geoserver.gather(
+        *(
+            lambda name=name, body=body: _push(workspace, name, body, overwrite)
+            for name, body in prepared
+        )
+    )
+    pushed = [r["style"] for r in results if "error" not in r]
+    failed = [r for r in results if "error" in r]
+    created = [r["style"] for r in results if r.get("created")]
+    return pushed, failed, created
+
+
+def _remove(workspace: str, name: str):
+    try:
+        r = geoserver.delete_style(workspace, name, purge=True)
+    except requests.RequestException as e:
+        return {"style": name, "error": str(e)}
+    if r.status_code not in (200, 404):
+        return {
+            "style": name,
+            "error": f"status {r.status_code}",
+            "gs_response": r.text,
+        }
+    return None
+
+
+def remove_styles(workspace: str, names: list):
+    """
+    Borra (con purge) los estilos `names` de forma concurrente.
+    Regresa `(borrados, no_borrados)`; los no borrados traen su error.
+    """
+    results = geoserver.gather(
+        *(lambda name=name: _remove(workspace, name) for name in names)
+    )
+    removed = [name for name, error in zip(names, results) if error is None]
+    not_removed = [error for error in results if error is not None]
+    return removed, not_removed
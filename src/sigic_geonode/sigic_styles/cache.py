@@ -0,0 +1,318 @@
+# ==============================================================================
+#  SIGIC – Sistema Integral de Gestión e Información Científica
+#
+#  Derechos patrimoniales: CentroGeo (2025)
+#
+#  Nota:
+#    Este código fue desarrollado para el proyecto SIGIC de
+#    CentroGeo. Se mantiene crédito de autoría, pero la titularidad del código
+#    pertenece a CentroGeo conforme a obra por encargo.
+#
+#  SPDX-License-Identifier: LicenseRef-SIGIC-CentroGeo
+# ==============================================================================
+
+"""
+Cache de metadatos de estilos por layer de GeoServer.
+
+`list` y `retrieve` necesitan los estilos asociados
+(`/rest/layers/<layer>/styles.json`) y el estilo por defecto
+(`/rest/layers/<layer>.json`). Esa información solo cambia por nuestras
+propias escrituras, así que se guarda en el Django cache por `alternate`
+durante `SIGIC_STYLES_METADATA_CACHE_TTL` segundos.
+
+Toda escritura contra GeoServer (vistas de estilos, generador de estilos de
+georeference) debe llamar `invalidate_layer_metadata`; para cambios hechos
+fuera de SIGIC existe el endpoint `purge-cache`.
+
+Cuerpos SLD:
+- En el Django cache se guarda, por estilo, un registro pequeño con el ETag
+  (hash del contenido) y dónde vive el SLD (workspace o global). Con eso un
+  `If-None-Match` se responde 304 sin tocar GeoServer, y no se repite la
+  consulta al workspace que termina en 404.
+- El cuerpo va en un LRU en proceso indexado por ETag y acotado por
+  `SIGIC_STYLES_SLD_CACHE_MAX_BYTES`. Al estar indexado por contenido nunca
+  queda obsoleto: basta invalidar el registro compartido.
+"""
+
+import hashlib
+import logging
+import os
+import threading
+from collections import OrderedDict
+
+import requests
+from django.core.cache import cache
+
+from sigic_geonode.utils.geoserver_client import geoserver
+
+logger = logging.getLogger(__name__)
+
+METADATA_CACHE_TTL = int(os.getenv("SIGIC_STYLES_METADATA_CACHE_TTL", "300"))
+METADATA_KEY_PREFIX = "sigic_styles_layer_"
+
+SLD_CACHE_TTL = int(os.getenv("SIGIC_STYLES_SLD_CACHE_TTL", "3600"))
+SLD_CACHE_MAX_BYTES = int(
+    os.getenv("SIGIC_STYLES_SLD_CACHE_MAX_BYTES", str(64 * 1024 * 1024))
+)
+SLD_KEY_PREFIX = "sigic_styles_sld_"
+SLD_LOCATION_KEY_PREFIX = "sigic_styles_sld_location_"
+
+LOCATION_WORKSPACE = "workspace"
+LOCATION_GLOBAL = "global"
+
+
+def _metadata_key(alternate: str) -> str:
+    return f"{METADATA_KEY_PREFIX}{alternate}"
+
+
+def _style_names(styles_json: dict) -> list:
+    styles = styles_json.get("styles", {})
+    if not isinstance(styles, dict):
+        return []
+
+    style_items = styles.get("style", [])
+    if isinstance(style_items, dict):
+        style_items = [style_items]  # cuando viene un solo elemento
+    elif not isinstance(style_items, list):
+        return []
+
+    return [s.get("name") for s in style_items if isinstance(s, dict) and s.get("name")]
+
+
+def fetch_layer_metadata(alternate: str) -> dict:
+    """
+    Consulta GeoServer (styles.json y layer.json en paralelo) y regresa
+    `{"styles": [...], "default_style": ...}` con los nombres tal como los
+    reporta GeoServer (`workspace:estilo`).
+    Lanza `requests.HTTPError` si GeoServer no responde 200.
+    """
+    r_styles, r_layer = geoserver.gather(
+        lambda: geoserver.get_layer_styles(alternate),
+        lambda: geoserver.get_layer(alternate),
+    )
+    r_styles.raise_for_status()
+    r_layer.raise_for_status()
+
+    return {
+        "styles": _style_names(r_styles.json()),
+        "default_style": r_layer.json()
+        .get("layer", {})
+        .get("defaultStyle", {})
+        .get("name"),
+    }
+
+
+def get_layer_metadata(alternate: str) -> dict:
+    """Metadatos del layer desde cache; si no hay entrada, desde GeoServer."""
+    key = _metadata_key(alternate)
+    try:
+        metadata = cache.get(key)
+    except Exception as e:
+        logger.debug(f"[sigic_styles] cache no disponible: {e}")
+        metadata = None
+
+    if metadata is not None:
+        return metadata
+
+    metadata = fetch_layer_metadata(alternate)
+    try:
+        cache.set(key, metadata, timeout=METADATA_CACHE_TTL)
+    except Exception as e:
+        logger.debug(f"[sigic_styles] cache no disponible: {e}")
+    return metadata
+
+
+def _fetch_or_error(alternate: str):
+    try:
+        return fetch_layer_metadata(alternate)
+    except requests.RequestException as e:
+        return e
+
+
+def get_layers_metadata(alternates: list) -> dict:
+    """
+    Metadatos de varios layers: una lectura `get_many` del cache y, para
+    los que faltan, consultas a GeoServer en paralelo.
+
+    Regresa `{alternate: metadata}`; si GeoServer falla para un layer, su
+    valor es la excepción (`requests.RequestException`) en lugar de lanzarla.
+    """
+    keys = {_metadata_key(alternate): alternate for alternate in alternates}
+    try:
+        cached = cache.get_many(list(keys))
+    except Exception as e:
+        logger.debug(f"[sigic_styles] cache no disponible: {e}")
+        cached = {}
+
+    result = {keys[key]: metadata for key, metadata in cached.items()}
+    missing = [alternate for alternate in alternates if alternate not in result]
+
+    fetched = geoserver.gather(
+        *(
+            lambda alternate=alternate: _fetch_or_error(alternate)
+            for alternate in missing
+        )
+    )
+    result.update(zip(missing, fetched))
+
+    to_cache = {
+        _metadata_key(alternate): metadata
+        for alternate, metadata in zip(missing, fetched)
+        if not isinstance(metadata, Exception)
+    }
+    if to_cache:
+        try:
+            cache.set_many(to_cache, timeout=METADATA_CACHE_TTL)
+        except Exception as e:
+            logger.debug(f"[sigic_styles] cache no disponible: {e}")
+    return result
+
+
+def invalidate_layer_metadata(alternate: str) -> None:
+    try:
+        cache.delete(_metadata_key(alternate))
+    except Exception as e:
+        logger.warning(f"[sigic_styles] no se pudo invalidar cache de {alternate}: {e}")
+
+
+# -----------------------------
+# Cuerpos SLD
+# -----------------------------
+class SLDBodyCache:
+    """LRU `etag -> sld` acotado por el total de bytes."""
+
+    def __init__(self, max_bytes: int = SLD_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._bodies = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, etag: str):
+        with self._lock:
+            entry = self._bodies.get(etag)
+            if entry is None:
+                return None
+            self._bodies.move_to_end(etag)
+            return entry[0]
+
+    def set(self, etag: str, sld: str, nbytes: int):
+        if nbytes > self.max_bytes:
+            return
+        with self._lock:
+            if etag in self._bodies:
+                self._bodies.move_to_end(etag)
+                return
+            self._bodies[etag] = (sld, nbytes)
+            self.size += nbytes
+            while self.size > self.max_bytes:
+                _, (_, evicted) = self._bodies.popitem(last=False)
+                self.size -= evicted
+
+
+sld_bodies = SLDBodyCache()
+
+
+def sld_etag(sld_bytes: bytes) -> str:
+    return '"' + hashlib.sha256(sld_bytes).hexdigest()[:32] + '"'
+
+
+def _sld_key(workspace: str, name: str) -> str:
+    return f"{SLD_KEY_PREFIX}{workspace}:{name}"
+
+
+def _location_key(workspace: str, name: str) -> str:
+    return f"{SLD_LOCATION_KEY_PREFIX}{workspace}:{name}"
+
+
+def _cache_get(key: str):
+    try:
+        return cache.get(key)
+    except Exception as e:
+        logger.debug(f"[sigic_styles] cache no disponible: {e}")
+        return None
+
+
+def _cache_set(key: str, value, timeout):
+    try:
+        cache.set(key, value, timeout=timeout)
+    except Exception as e:
+        logger.debug(f"[sigic_styles] cache no disponible: {e}")
+
+
+def cached_sld_etag(workspace: str, name: str):
+    """ETag conocido del estilo, o None si no hay registro vigente."""
+    record = _cache_get(_sld_key(workspace, name))
+    return record["etag"] if record else None
+
+
+def _fetch_sld(workspace: str, name: str):
+    """
+    Descarga el SLD y regresa `(response, location)`.
+
+    Con ubicación recordada se consulta solo esa (y la otra si ya no
+    existe ahí). Sin ubicación se consultan workspace y global en paralelo,
+    con prioridad para workspace.
+    """
+    location = _cache_get(_location_key(workspace, name))
+
+    if location in (LOCATION_WORKSPACE, LOCATION_GLOBAL):
+        ws = workspace if location == LOCATION_WORKSPACE else None
+        r = geoserver.get_style(ws, name, fmt="sld")
+        if r.status_code != 404:
+            return r, location
+        if location == LOCATION_WORKSPACE:
+            r = geoserver.get_style(None, name, fmt="sld")
+            return r, LOCATION_GLOBAL if r.status_code != 404 else None
+        r = geoserver.get_style(workspace, name, fmt="sld")
+        return r, LOCATION_WORKSPACE if r.status_code != 404 else None
+
+    r_ws, r_global = geoserver.gather(
+        lambda: geoserver.get_style(workspace, name, fmt="sld"),
+        lambda: geoserver.get_style(None, name, fmt="sld"),
+    )
+    if r_ws.status_code != 404:
+        return r_ws, LOCATION_WORKSPACE
+    return r_global, LOCATION_GLOBAL if r_global.status_code != 404 else None
+
+
+def get_style_sld(workspace: str, name: str) -> tuple:
+    """
+    Regresa `(status, sld, etag)`. `status` es 200 si hubo contenido (desde
+    cache o GeoServer); en otro caso es el status de GeoServer y `sld`/`etag`
+    son None.
+    """
+    key = _sld_key(workspace, name)
+    record = _cache_get(key)
+    if record:
+        sld = sld_bodies.get(record["etag"])
+        if sld is not None:
+            return 200, sld, record["etag"]
+
+    r, location = _fetch_sld(workspace, name)
+    if r.status_code != 200:
+        return r.status_code, None, None
+
+    sld = r.text
+    sld_bytes = sld.encode("utf-8")
+    etag = sld_etag(sld_bytes)
+
+    sld_bodies.set(etag, sld, len(sld_bytes))
+    _cache_set(key, {"etag": etag}, SLD_CACHE_TTL)
+    _cache_set(_location_key(workspace, name), location, None)
+    return 200, sld, etag
+
+
+def invalidate_sld(workspace: str, name: str, forget_location: bool = False) -> None:
+    """
+    Descarta el ETag del estilo. `forget_location=True` al eliminar el
+    estilo, para que uno nuevo con el mismo nombre se vuelva a ubicar.
+    """
+    keys = [_sld_key(workspace, name)]
+    if forget_location:
+        keys.append(_location_key(workspace, name))
+    try:
+        cache.delete_many(keys)
+    except Exception as e:
+        logger.warning(
+            f"[sigic_styles] no se pudo invalidar SLD {workspace}:{name}: {e}"
+        )
@@ -0,0 +1,345 @@
+# ==============================================================================
+#  SIGIC – Sistema Integral de Gestión e Información Científica
+#
+#  Derechos patrimoniales: CentroGeo (2025)
+#
+#  Nota:
+#    Este código fue desarrollado para el proyecto SIGIC de
+#    CentroGeo. Se mantiene crédito de autoría, pero la titularidad del código
+#    pertenece a CentroGeo conforme a obra por encargo.
+#
+#  SPDX-License-Identifier: LicenseRef-SIGIC-CentroGeo
+# ==============================================================================
+
+"""
+Pipeline de escritura de estilos contra GeoServer.
+
+Cada operación se planea como la lista mínima de llamadas REST y se
+ejecuta en orden. Cada paso puede registrar su compensación; si un paso
+falla, las compensaciones de los pasos ya aplicados se ejecutan en orden
+inverso (una sola bitácora por operación).
+
+Llamadas por operación:
+- crear:        POST del estilo con el SLD en el cuerpo (`raw=true`) +
+                POST de la asociación al layer, o un PUT del layer si
+                además queda como default
+- actualizar:   un PUT del SLD (`raw=true`)
+- default:      un PUT parcial en JSON del layer
+- eliminar:     un PUT del layer + DELETE del estilo
+- carga masiva: un PUT del layer con todos los estilos nuevos
+
+Los PUT del layer mandan la lista completa de estilos, así que cada uno
+lee el layer directo de GeoServer (`cache.fetch_layer_metadata`, sin cache)
+justo antes de escribir: con metadatos en cache se perderían los estilos
+asociados por otros (GeoNode, la consola de GeoServer) en los últimos
+minutos. Esa misma lectura es la que se restaura si hay que compensar. El
+cache de metadatos queda solo para las lecturas.
+"""
+
+import logging
+from typing import Callable, NamedTuple, Optional
+
+import requests
+
+from sigic_geonode.utils.geoserver_client import geoserver
+
+from .cache import fetch_layer_metadata, invalidate_layer_metadata, invalidate_sld
+
+logger = logging.getLogger(__name__)
+
+OK = (200, 201)
+
+# GeoServer responde 403 o 409 (según versión) si el estilo ya existe
+ALREADY_EXISTS = (403, 409)
+
+STEP_CREATE = "create_style"
+STEP_UPLOAD = "upload_style"
+STEP_LAYER = "update_layer"
+STEP_DELETE = "delete_style"
+
+
+class PipelineStep(NamedTuple):
+    name: str
+    call: Callable[[], requests.Response]
+    ok: tuple = OK
+    compensate: Optional[Callable[[], requests.Response]] = None
+
+
+class PipelineError(Exception):
+    """
+    Un paso falló. `response` es la respuesta de GeoServer (None si fue
+    error de conexión) y `compensation_errors` los pasos que no se pudieron
+    revertir.
+    """
+
+    def __init__(
+        self, step: str, response=None, detail: str = "", compensation_errors=()
+    ):
+        self.step = step
+        self.response = response
+        self.compensation_errors = list(compensation_errors)
+        status = response.status_code if response is not None else None
+        self.status_code = status
+        super().__init__(f"Falló el paso '{step}' (status {status}) {detail}".strip())
+
+    def as_dict(self) -> dict:
+        return {
+            "step": self.step,
+            "gs_status": self.status_code,
+            "gs_response": (
+                self.response.text if self.response is not None else str(self)
+            ),
+            "compensation_errors": self.compensation_errors,
+        }
+
+
+class StyleWritePipeline:
+    def __init__(self):
+        self.steps = []
+        self._after = []
+
+    def add(self, name, call, ok=OK, compensate=None) -> "StyleWritePipeline":
+        self.steps.append(PipelineStep(name, call, ok, compensate))
+        return self
+
+    def after(self, callback) -> "StyleWritePipeline":
+        """Callback que corre siempre al terminar (p.ej. invalidar cache)."""
+        self._after.append(callback)
+        return self
+
+    def _compensate(self, applied: list) -> list:
+        errors = []
+        for step in reversed(applied):
+            try:
+                r = step.compensate()
+                if r.status_code not in OK:
+                    errors.append(f"{step.name}: status {r.status_code}")
+            except requests.RequestException as e:
+                errors.append(f"{step.name}: {e}")
+        if errors:
+            logger.error(f"[sigic_styles] compensación incompleta: {errors}")
+        return errors
+
+    def run(self) -> list:
+        """Ejecuta los pasos; regresa sus respuestas o lanza PipelineError."""
+        applied = []
+        responses = []
+        try:
+            for step in self.steps:
+                try:
+                    r = step.call()
+                except requests.RequestException as e:
+                    raise PipelineError(
+                        step.name,
+                        detail=str(e),
+                        compensation_errors=self._compensate(applied),
+                    ) from e
+
+                if r.status_code not in step.ok:
+                    raise PipelineError(
+                        step.name, r, compensation_errors=self._compensate(applied)
+                    )
+
+                responses.append(r)
+                if step.compensate is not None:
+                    applied.append(step)
+            return responses
+        finally:
+            for callback in self._after:
+                callback()
+
+
+# -----------------------------
+# Cuerpo JSON del layer
+# -----------------------------
+def _style_ref(full_name: str) -> dict:
+    if ":" in full_name:
+        workspace, name = full_name.split(":", 1)
+        return {"name": name, "workspace": workspace}
+    return {"name": full_name}
+
+
+def layer_styles_body(styles: list, default_style: str = None) -> dict:
+    """Cuerpo del PUT JSON del layer con la lista completa de estilos."""
+    layer = {"styles": {"style": [_style_ref(s) for s in styles]}}
+    if default_style:
+        layer["defaultStyle"] = _style_ref(default_style)
+    return {"layer": layer}
+
+
+class _LayerUpdate:
+    """
+    Paso de lectura-modificación-escritura del layer: `call` lee el layer
+    sin cache, arma el cuerpo con `make_styles(metadata)` y hace el PUT;
+    `compensate` vuelve a poner la lista leída.
+    """
+
+    def __init__(self, layer_name: str, make_styles: Callable[[dict], tuple]):
+        self.layer_name = layer_name
+        self.make_styles = make_styles
+        self.snapshot = None
+
+    def call(self) -> requests.Response:
+        # HTTPError es RequestException: el pipeline lo reporta como fallo
+        self.snapshot = fetch_layer_metadata(self.layer_name)
+        styles, default_style = self.make_styles(self.snapshot)
+        return geoserver.put_layer(
+            self.layer_name, layer_styles_body(styles, default_style), fmt="json"
+        )
+
+    def compensate(self) -> requests.Response:
+        body = layer_styles_body(
+            self.snapshot["styles"], self.snapshot["default_style"]
+        )
+        return geoserver.put_layer(self.layer_name, body, fmt="json")
+
+
+def _with_default(metadata: dict, styles: list, new_default: str):
+    """Mueve el default actual a la lista y quita de ella el nuevo default."""
+    current = metadata["default_style"]
+    styles = [s for s in styles if s != new_default]
+    if current and current != new_default and current not in styles:
+        styles.append(current)
+    return styles
+
+
+# -----------------------------
+# Planes
+# -----------------------------
+def plan_create(
+    workspace: str,
+    layer_name: str,
+    name: str,
+    sld_body: bytes,
+    make_default: bool = False,
+    overwrite: bool = False,
+) -> StyleWritePipeline:
+    """
+    POST con el SLD inline y una sola llamada para asociarlo al layer: el
+    POST de la asociación o, con `make_default`, un PUT del layer con la
+    lista de estilos y el default. Con `overwrite`, si el estilo ya existe
+    se reemplaza su SLD en lugar de fallar.
+    """
+    full_name = f"{workspace}:{name}"
+    state = {"created": False}
+
+    def create():
+        r = geoserver.create_style_with_body(workspace, name, sld_body)
+        if r.status_code in OK:
+            state["created"] = True
+        elif overwrite and r.status_code in ALREADY_EXISTS:
+            r = geoserver.upload_style(workspace, name, sld_body, raw=True)
+        return r
+
+    def undo_create():
+        # Un estilo que ya existía (overwrite) no se borra
+        if not state["created"]:
+            return _noop_response()
+        return geoserver.delete_style(workspace, name, purge=True)
+
+    pipeline = StyleWritePipeline().add(STEP_CREATE, create, compensate=undo_create)
+
+    if make_default:
+        update = _LayerUpdate(
+            layer_name,
+            lambda metadata: (
+                _with_default(metadata, list(metadata["styles"]), full_name),
+                full_name,
+            ),
+        )
+        pipeline.add(STEP_LAYER, update.call, compensate=update.compensate)
+    else:
+        pipeline.add(STEP_LAYER, lambda: geoserver.add_layer_style(layer_name, name))
+
+    return pipeline.after(lambda: invalidate_sld(workspace, name)).after(
+        lambda: invalidate_layer_metadata(layer_name)
+    )
+
+
+def plan_update(workspace: str, name: str, sld_body: bytes) -> StyleWritePipeline:
+    """Un solo PUT del SLD; un 404 indica que el estilo no existe."""
+    return (
+        StyleWritePipeline()
+        .add(
+            STEP_UPLOAD,
+            lambda: geoserver.upload_style(workspace, name, sld_body, raw=True),
+        )
+        .after(lambda: invalidate_sld(workspace, name))
+    )
+
+
+def plan_set_default(workspace: str, layer_name: str, name: str) -> StyleWritePipeline:
+    """Un PUT JSON del layer con el nuevo default y la lista ajustada."""
+    full_name = f"{workspace}:{name}"
+    update = _LayerUpdate(
+        layer_name,
+        lambda metadata: (
+            _with_default(metadata, list(metadata["styles"]), full_name),
+            full_name,
+        ),
+    )
+
+    return (
+        StyleWritePipeline()
+        .add(STEP_LAYER, update.call)
+        .after(lambda: invalidate_layer_metadata(layer_name))
+    )
+
+
+def plan_attach_styles(
+    workspace: str, layer_name: str, names: list
+) -> StyleWritePipeline:
+    """
+    Un PUT del layer que agrega `names` a su lista de estilos (carga
+    masiva). Los que ya están asociados o son el default se omiten.
+    """
+
+    def attach(metadata: dict) -> tuple:
+        styles = list(metadata["styles"])
+        associated = set(styles) | {metadata["default_style"]}
+        styles += [
+            f"{workspace}:{name}"
+            for name in names
+            if f"{workspace}:{name}" not in associated
+        ]
+        return styles, metadata["default_style"]
+
+    update = _LayerUpdate(layer_name, attach)
+    return (
+        StyleWritePipeline()
+        .add(STEP_LAYER, update.call)
+        .after(lambda: invalidate_layer_metadata(layer_name))
+    )
+
+
+def plan_delete(workspace: str, layer_name: str, name: str) -> StyleWritePipeline:
+    """
+    Un PUT del layer sin el estilo y el DELETE con purge. Si el DELETE
+    falla se vuelve a asociar el estilo.
+    """
+    full_name = f"{workspace}:{name}"
+    update = _LayerUpdate(
+        layer_name,
+        lambda metadata: (
+            [s for s in metadata["styles"] if s != full_name],
+            metadata["default_style"],
+        ),
+    )
+
+    return (
+        StyleWritePipeline()
+        .add(STEP_LAYER, update.call, compensate=update.compensate)
+        .add(
+            STEP_DELETE,
+            lambda: geoserver.delete_style(workspace, name, purge=True),
+            ok=(200,),
+        )
+        .after(lambda: invalidate_sld(workspace, name, forget_location=True))
+        .after(lambda: invalidate_layer_metadata(layer_name))
+    )
+
+
+def _noop_response() -> requests.Response:
+    r = requests.Response()
+    r.status_code = 200
+    return r
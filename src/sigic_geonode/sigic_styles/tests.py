@@ -1,3 +1,594 @@
-# from django.test import TestCase
+import io
+import json
+import tempfile
+from contextlib import ExitStack, redirect_stdout
+from importlib.util import find_spec
+from pathlib import Path
+from unittest import mock, skipUnless
 
-# Create your tests here.
+import requests
+from django.core.cache import cache
+from django.core.files.storage import InMemoryStorage
+from django.test import SimpleTestCase
+from lxml import etree
+
+from sigic_geonode.sigic_georeference import legend
+from sigic_geonode.sigic_styles.bulk import push_styles, remove_styles
+from sigic_geonode.sigic_styles.cache import get_layer_metadata
+from sigic_geonode.sigic_styles.pipeline import (
+    STEP_CREATE,
+    STEP_DELETE,
+    STEP_LAYER,
+    PipelineError,
+    plan_attach_styles,
+    plan_create,
+    plan_delete,
+    plan_set_default,
+)
+from sigic_geonode.utils import sld_benchmark, sld_schema
+from sigic_geonode.utils.fake_geoserver import EMPTY_SLD, FakeGeoServer
+from sigic_geonode.utils.geoserver_client import geoserver
+from sigic_geonode.utils.sld_utils import (
+    OGC_NS_URI,
+    SE_NS_URI,
+    SLD_NS_URI,
+    normalize_sld,
+    validate_sld_before_post,
+)
+
+LAYER = "geonode:capa"
+
+# Etiquetas de municipios como las guarda GeoServer (SLD 1.0.0)
+GEOSERVER_LABELS_SLD = b"""<?xml version="1.0" encoding="UTF-8"?>
+<StyledLayerDescriptor version="1.0.0"
+    xsi:schemaLocation="http://www.opengis.net/sld StyledLayerDescriptor.xsd"
+    xmlns="http://www.opengis.net/sld" xmlns:ogc="http://www.opengis.net/ogc"
+    xmlns:xlink="http://www.w3.org/1999/xlink"
+    xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance">
+  <NamedLayer>
+    <Name>municipios</Name>
+    <UserStyle>
+      <Title>Municipios con etiquetas</Title>
+      <FeatureTypeStyle>
+        <Rule>
+          <PolygonSymbolizer>
+            <Fill><CssParameter name="fill">#E6E6E6</CssParameter></Fill>
+            <Stroke>
+              <CssParameter name="stroke">#333333</CssParameter>
+              <CssParameter name="stroke-width">0.5</CssParameter>
+            </Stroke>
+          </PolygonSymbolizer>
+          <TextSymbolizer>
+            <Label><ogc:PropertyName>nomgeo</ogc:PropertyName></Label>
+            <Font>
+              <CssParameter name="font-family">Arial</CssParameter>
+              <CssParameter name="font-size">10</CssParameter>
+            </Font>
+            <LabelPlacement>
+              <PointPlacement>
+                <AnchorPoint>
+                  <AnchorPointX>0.5</AnchorPointX>
+                  <AnchorPointY>0.5</AnchorPointY>
+                </AnchorPoint>
+              </PointPlacement>
+            </LabelPlacement>
+            <Halo>
+              <Radius>1</Radius>
+              <Fill><CssParameter name="fill">#FFFFFF</CssParameter></Fill>
+            </Halo>
+            <Fill><CssParameter name="fill">#000000</CssParameter></Fill>
+            <VendorOption name="autoWrap">60</VendorOption>
+            <VendorOption name="maxDisplacement">150</VendorOption>
+            <VendorOption name="group">yes</VendorOption>
+          </TextSymbolizer>
+        </Rule>
+      </FeatureTypeStyle>
+    </UserStyle>
+  </NamedLayer>
+</StyledLayerDescriptor>
+"""
+
+# Exportación de QGIS 3 (SLD 1.1.0 / SE 1.1.0) con etiquetas
+QGIS_LABELS_SLD = b"""<?xml version="1.0" encoding="UTF-8"?>
+<StyledLayerDescriptor xmlns="http://www.opengis.net/sld"
+    xmlns:ogc="http://www.opengis.net/ogc" xmlns:xlink="http://www.w3.org/1999/xlink"
+    xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance"
+    xsi:schemaLocation="http://www.opengis.net/sld
+      http://schemas.opengis.net/sld/1.1.0/StyledLayerDescriptor.xsd"
+    version="1.1.0" xmlns:se="http://www.opengis.net/se">
+  <NamedLayer>
+    <se:Name>municipios</se:Name>
+    <UserStyle>
+      <se:Name>municipios</se:Name>
+      <se:FeatureTypeStyle>
+        <se:Rule>
+          <se:Name>Single symbol</se:Name>
+          <se:PolygonSymbolizer>
+            <se:Fill><se:SvgParameter name="fill">#e6e6e6</se:SvgParameter></se:Fill>
+            <se:Stroke>
+              <se:SvgParameter name="stroke">#232323</se:SvgParameter>
+              <se:SvgParameter name="stroke-width">1</se:SvgParameter>
+              <se:SvgParameter name="stroke-linejoin">bevel</se:SvgParameter>
+            </se:Stroke>
+          </se:PolygonSymbolizer>
+          <se:TextSymbolizer>
+            <se:Label><ogc:PropertyName>NOMGEO</ogc:PropertyName></se:Label>
+            <se:Font>
+              <se:SvgParameter name="font-family">Open Sans</se:SvgParameter>
+              <se:SvgParameter name="font-size">13</se:SvgParameter>
+            </se:Font>
+            <se:LabelPlacement>
+              <se:PointPlacement>
+                <se:AnchorPoint>
+                  <se:AnchorPointX>0</se:AnchorPointX>
+                  <se:AnchorPointY>0.5</se:AnchorPointY>
+                </se:AnchorPoint>
+              </se:PointPlacement>
+            </se:LabelPlacement>
+            <se:Fill><se:SvgParameter name="fill">#323232</se:SvgParameter></se:Fill>
+            <se:VendorOption name="maxDisplacement">1</se:VendorOption>
+          </se:TextSymbolizer>
+        </se:Rule>
+      </se:FeatureTypeStyle>
+    </UserStyle>
+  </NamedLayer>
+</StyledLayerDescriptor>
+"""
+
+# QGIS que además declara xmlns:sld en la raíz; el fix_sld de regex generaba
+# "Attribute xmlns:sld redefined" al convertir xmlns:se en xmlns:sld
+QGIS_SLD_PREFIX_DECLARED = QGIS_LABELS_SLD.replace(
+    b'xmlns:se="http://www.opengis.net/se">',
+    b'xmlns:se="http://www.opengis.net/se"\n    xmlns:sld="http://www.opengis.net/sld">',
+)
+
+# ArcGIS (ArcMap2SLD): SLD 1.0.0 con prefijo sld: y campos en MAYÚSCULAS
+ARCGIS_SLD = b"""<?xml version="1.0" encoding="UTF-8"?>
+<sld:StyledLayerDescriptor version="1.0.0" xmlns:sld="http://www.opengis.net/sld"
+    xmlns:ogc="http://www.opengis.net/ogc" xmlns:gml="http://www.opengis.net/gml">
+  <sld:NamedLayer>
+    <sld:Name>carreteras</sld:Name>
+    <sld:UserStyle>
+      <sld:Name>Style1</sld:Name>
+      <sld:FeatureTypeStyle>
+        <sld:FeatureTypeName/>
+        <sld:Rule>
+          <sld:Name>Federal</sld:Name>
+          <ogc:Filter>
+            <ogc:PropertyIsEqualTo>
+              <ogc:PropertyName>TIPO_VIAL</ogc:PropertyName>
+              <ogc:Literal>Federal</ogc:Literal>
+            </ogc:PropertyIsEqualTo>
+          </ogc:Filter>
+          <sld:LineSymbolizer>
+            <sld:Stroke>
+              <sld:CssParameter name="stroke">#E60000</sld:CssParameter>
+              <sld:CssParameter name="stroke-width">2</sld:CssParameter>
+            </sld:Stroke>
+          </sld:LineSymbolizer>
+        </sld:Rule>
+        <sld:Rule>
+          <sld:Name></sld:Name>
+          <sld:ElseFilter xmlns:sld="http://www.opengis.net/sld"/>
+          <sld:LineSymbolizer>
+            <sld:Stroke>
+              <sld:CssParameter name="stroke">#828282</sld:CssParameter>
+            </sld:Stroke>
+          </sld:LineSymbolizer>
+        </sld:Rule>
+      </sld:FeatureTypeStyle>
+    </sld:UserStyle>
+  </sld:NamedLayer>
+</sld:StyledLayerDescriptor>
+"""
+
+
+def _shape(xml) -> list:
+    """(nombre local, atributos, texto) de cada elemento, sin schemaLocation."""
+    root = etree.fromstring(xml) if isinstance(xml, bytes) else xml
+    return [
+        (
+            etree.QName(el).localname,
+            {k: v for k, v in el.attrib.items() if not k.endswith("schemaLocation")},
+            (el.text or "").strip(),
+        )
+        for el in root.iter()
+        if isinstance(el.tag, str)
+    ]
+
+
+def _legacy_shape(xml: bytes) -> list:
+    """
+    Lo que producía el fix_sld de regex: versión 1.0.0, SvgParameter →
+    CssParameter, PropertyName en minúsculas y sin <Name> vacíos.
+    """
+    shape = []
+    for name, attrib, text in _shape(xml):
+        if name == "Name" and not text:
+            continue
+        if name == "SvgParameter":
+            name = "CssParameter"
+        if name == "PropertyName":
+            text = text.lower()
+        if attrib.get("version") == "1.1.0":
+            attrib["version"] = "1.0.0"
+        shape.append((name, attrib, text))
+    return shape
+
+
+class FakeGeoServerTestCase(SimpleTestCase):
+    """Tests against an in-process FakeGeoServer with the shared client."""
+
+    def setUp(self):
+        cache.clear()
+        stack = ExitStack()
+        self.addCleanup(stack.close)
+        self.gs = stack.enter_context(FakeGeoServer())
+        stack.enter_context(self.gs.patch_client())
+        self.gs.add_layer(LAYER, styles=["geonode:a", "geonode:b"])
+
+    def layer(self) -> dict:
+        return self.gs.state.layers[LAYER]
+
+    def attach_out_of_band(self, full_name: str = "geonode:oob") -> None:
+        """A style associated by another writer, after our metadata was cached."""
+        get_layer_metadata(LAYER)
+        workspace, name = full_name.split(":")
+        self.gs.add_style(workspace, name, EMPTY_SLD.format(name=name))
+        self.layer()["styles"].append(full_name)
+
+
+class PipelineTests(FakeGeoServerTestCase):
+    def sld(self, name: str) -> bytes:
+        return EMPTY_SLD.format(name=name).encode()
+
+    def test_create_attaches_style(self):
+        plan_create("geonode", LAYER, "nuevo", self.sld("nuevo")).run()
+
+        self.assertIn(("geonode", "nuevo"), self.gs.state.styles)
+        self.assertEqual(self.layer()["default_style"], "geonode:capa")
+        self.assertIn("geonode:nuevo", self.layer()["styles"])
+
+    def test_create_default_keeps_previous_default_attached(self):
+        plan_create(
+            "geonode", LAYER, "nuevo", self.sld("nuevo"), make_default=True
+        ).run()
+
+        self.assertEqual(self.layer()["default_style"], "geonode:nuevo")
+        self.assertEqual(
+            self.layer()["styles"], ["geonode:a", "geonode:b", "geonode:capa"]
+        )
+
+    def test_create_is_rolled_back_when_layer_update_fails(self):
+        self.gs.fail("PUT", r"^layers/", status=500)
+
+        with self.assertRaises(PipelineError) as ctx:
+            plan_create(
+                "geonode", LAYER, "nuevo", self.sld("nuevo"), make_default=True
+            ).run()
+
+        self.assertEqual(ctx.exception.step, STEP_LAYER)
+        self.assertEqual(ctx.exception.compensation_errors, [])
+        self.assertNotIn(("geonode", "nuevo"), self.gs.state.styles)
+        self.assertEqual(self.layer()["default_style"], "geonode:capa")
+
+    def test_overwritten_style_survives_rollback(self):
+        self.gs.fail("POST", r"^layers/", status=500)
+
+        with self.assertRaises(PipelineError):
+            plan_create("geonode", LAYER, "a", self.sld("a"), overwrite=True).run()
+
+        self.assertIn(("geonode", "a"), self.gs.state.styles)
+        self.assertEqual(self.layer()["styles"], ["geonode:a", "geonode:b"])
+
+    def test_create_existing_without_overwrite_fails(self):
+        with self.assertRaises(PipelineError) as ctx:
+            plan_create("geonode", LAYER, "a", self.sld("a")).run()
+        self.assertEqual(ctx.exception.step, STEP_CREATE)
+
+    def test_set_default_swaps_default(self):
+        plan_set_default("geonode", LAYER, "b").run()
+
+        self.assertEqual(self.layer()["default_style"], "geonode:b")
+        self.assertEqual(self.layer()["styles"], ["geonode:a", "geonode:capa"])
+
+    def test_set_default_failure_leaves_layer_untouched(self):
+        self.gs.fail("PUT", r"^layers/", status=500)
+
+        with self.assertRaises(PipelineError):
+            plan_set_default("geonode", LAYER, "b").run()
+        self.assertEqual(self.layer()["default_style"], "geonode:capa")
+
+    def test_delete_detaches_and_purges_style(self):
+        plan_delete("geonode", LAYER, "a").run()
+
+        self.assertEqual(self.layer()["styles"], ["geonode:b"])
+        self.assertNotIn(("geonode", "a"), self.gs.state.styles)
+
+    def test_delete_failure_reattaches_style(self):
+        self.gs.fail("DELETE", r"styles/a", status=500)
+
+        with self.assertRaises(PipelineError) as ctx:
+            plan_delete("geonode", LAYER, "a").run()
+
+        self.assertEqual(ctx.exception.step, STEP_DELETE)
+        self.assertEqual(self.layer()["styles"], ["geonode:a", "geonode:b"])
+        self.assertIn(("geonode", "a"), self.gs.state.styles)
+
+
+class StaleMetadataTests(FakeGeoServerTestCase):
+    def test_set_default_keeps_styles_attached_elsewhere(self):
+        self.attach_out_of_band()
+        plan_set_default("geonode", LAYER, "a").run()
+
+        self.assertEqual(self.layer()["default_style"], "geonode:a")
+        self.assertIn("geonode:oob", self.layer()["styles"])
+
+    def test_create_default_keeps_styles_attached_elsewhere(self):
+        self.attach_out_of_band()
+        plan_create(
+            "geonode", LAYER, "nuevo", EMPTY_SLD.format(name="nuevo"), make_default=True
+        ).run()
+
+        self.assertEqual(self.layer()["default_style"], "geonode:nuevo")
+        self.assertIn("geonode:oob", self.layer()["styles"])
+
+    def test_delete_keeps_styles_attached_elsewhere(self):
+        self.attach_out_of_band()
+        plan_delete("geonode", LAYER, "b").run()
+
+        self.assertEqual(self.layer()["styles"], ["geonode:a", "geonode:oob"])
+
+    def test_rollback_restores_fresh_snapshot(self):
+        self.attach_out_of_band()
+        self.gs.fail("DELETE", r"styles/b", status=500)
+
+        with self.assertRaises(PipelineError):
+            plan_delete("geonode", LAYER, "b").run()
+        self.assertEqual(
+            self.layer()["styles"], ["geonode:a", "geonode:b", "geonode:oob"]
+        )
+
+
+class BulkUploadTests(FakeGeoServerTestCase):
+    def sld(self, name: str) -> bytes:
+        return EMPTY_SLD.format(name=name).encode()
+
+    def test_network_error_is_reported_per_style(self):
+        create = geoserver.create_style_with_body
+
+        def flaky(workspace, name, body):
+            if name == "roto":
+                raise requests.ConnectionError("connection reset")
+            return create(workspace, name, body)
+
+        prepared = [(n, self.sld(n)) for n in ("uno", "roto", "dos")]
+        with mock.patch.object(geoserver, "create_style_with_body", flaky):
+            pushed, failed, created = push_styles("geonode", prepared)
+
+        self.assertEqual(pushed, ["uno", "dos"])
+        self.assertEqual(created, ["uno", "dos"])
+        self.assertEqual([f["style"] for f in failed], ["roto"])
+        self.assertIn("connection reset", failed[0]["detail"])
+
+    def test_overwritten_styles_are_not_reported_as_created(self):
+        prepared = [("a", self.sld("a")), ("nuevo", self.sld("nuevo"))]
+        pushed, failed, created = push_styles("geonode", prepared, overwrite=True)
+
+        self.assertEqual((pushed, failed, created), (["a", "nuevo"], [], ["nuevo"]))
+
+    def test_attach_keeps_styles_attached_elsewhere(self):
+        self.attach_out_of_band()
+        push_styles("geonode", [("nuevo", self.sld("nuevo"))])
+        plan_attach_styles("geonode", LAYER, ["a", "nuevo"]).run()
+
+        self.assertEqual(
+            self.layer()["styles"],
+            ["geonode:a", "geonode:b", "geonode:oob", "geonode:nuevo"],
+        )
+
+    def test_created_styles_are_removed_when_attach_fails(self):
+        pushed, _, created = push_styles("geonode", [("nuevo", self.sld("nuevo"))])
+        self.gs.fail("PUT", r"^layers/", status=500)
+
+        with self.assertRaises(PipelineError):
+            plan_attach_styles("geonode", LAYER, pushed).run()
+        removed, not_removed = remove_styles("geonode", created)
+
+        self.assertEqual((removed, not_removed), (["nuevo"], []))
+        self.assertNotIn(("geonode", "nuevo"), self.gs.state.styles)
+
+
+class SLDSchemaTests(SimpleTestCase):
+    def test_vendor_options_are_removed_from_a_copy(self):
+        root = etree.fromstring(GEOSERVER_LABELS_SLD)
+        stripped = sld_schema._without_vendor_options(root)
+
+        self.assertEqual(list(stripped.iter("{*}VendorOption")), [])
+        self.assertEqual(len(list(root.iter("{*}VendorOption"))), 3)
+
+    def test_strict_mode_logs_error_without_schemas(self):
+        with tempfile.TemporaryDirectory() as empty, mock.patch.multiple(
+            sld_schema, SCHEMAS_DIR=Path(empty), _schemas={}, _unavailable=set()
+        ):
+            with self.assertLogs(sld_schema.logger, "ERROR") as logs:
+                errors = sld_schema.validate_sld_schema(
+                    GEOSERVER_LABELS_SLD, mode=sld_schema.VALIDATION_STRICT
+                )
+
+        self.assertEqual(errors, [])
+        self.assertIn("SIN validar", logs.output[-1])
+
+    @skipUnless(
+        sld_schema.get_schema("1.0.0") is not None,
+        "Faltan los XSD (python -m sigic_geonode.utils.sld_schema fetch)",
+    )
+    def test_geoserver_and_qgis_vendor_options_pass_strict_validation(self):
+        for name, sld in (
+            ("geoserver", GEOSERVER_LABELS_SLD),
+            ("qgis", QGIS_LABELS_SLD),
+        ):
+            with self.subTest(name):
+                normalized = normalize_sld(sld)
+                validate_sld_before_post(normalized.root)
+                self.assertEqual(
+                    sld_schema.validate_sld_schema(
+                        normalized.root, mode=sld_schema.VALIDATION_STRICT
+                    ),
+                    [],
+                )
+
+
+class NormalizeSLDTests(SimpleTestCase):
+    def assertLegacyEquivalent(self, sld: bytes):
+        normalized = normalize_sld(sld)
+        root = etree.fromstring(normalized.body)
+
+        self.assertTrue(normalized.changed)
+        self.assertEqual(_shape(root), _legacy_shape(sld))
+        namespaces = {etree.QName(el).namespace for el in root.iter()}
+        self.assertLessEqual(namespaces, {SLD_NS_URI, OGC_NS_URI})
+        self.assertNotIn(SE_NS_URI.encode(), normalized.body)
+        self.assertEqual(_shape(normalized.root), _shape(root))
+        return normalized
+
+    def test_qgis_export_matches_legacy_output(self):
+        self.assertLegacyEquivalent(QGIS_LABELS_SLD)
+
+    def test_qgis_with_sld_prefix_declared_is_well_formed(self):
+        self.assertLegacyEquivalent(QGIS_SLD_PREFIX_DECLARED)
+
+    def test_qgis_single_quoted_namespace_uses_tree_path(self):
+        sld = QGIS_LABELS_SLD.replace(
+            b'xmlns:se="http://www.opengis.net/se"',
+            b"xmlns:se='http://www.opengis.net/se'",
+        )
+        self.assertLegacyEquivalent(sld)
+
+    def test_arcgis_export_matches_legacy_output(self):
+        normalized = self.assertLegacyEquivalent(ARCGIS_SLD)
+        else_filter = normalized.root.find(f".//{{{SLD_NS_URI}}}ElseFilter")
+        self.assertEqual(dict(else_filter.attrib), {})
+
+    def test_geoserver_sld_is_returned_unchanged(self):
+        normalized = normalize_sld(GEOSERVER_LABELS_SLD)
+        self.assertFalse(normalized.changed)
+        self.assertEqual(normalized.body, GEOSERVER_LABELS_SLD)
+
+    def test_normalized_output_is_stable(self):
+        for sld in (QGIS_LABELS_SLD, QGIS_SLD_PREFIX_DECLARED, ARCGIS_SLD):
+            with self.subTest(sld=sld[:60]):
+                self.assertFalse(normalize_sld(normalize_sld(sld).body).changed)
+
+
+class SLDBenchmarkGateTests(SimpleTestCase):
+    """`sld_benchmark --baseline` contra la línea base fija del repo."""
+
+    def test_no_regression_against_fixed_baseline(self):
+        argv = ["--rules", *map(str, sld_benchmark.GATE_RULES)]
+        argv += ["--repeat", "3", "--min-time", "0"]
+        argv += ["--baseline", str(sld_benchmark.BASELINE_PATH)]
+        argv += ["--threshold", str(sld_benchmark.GATE_THRESHOLD)]
+        argv += ["--memory-threshold", str(sld_benchmark.GATE_MEMORY_THRESHOLD)]
+        output = io.StringIO()
+        with redirect_stdout(output):
+            status = sld_benchmark.main(argv)
+
+        self.assertEqual(status, 0, output.getvalue())
+
+    def test_gate_reports_memory_regression(self):
+        baseline = json.loads(sld_benchmark.BASELINE_PATH.read_text())
+        current = json.loads(json.dumps(baseline))
+        result = current["results"]["se11-1000/normalize_sld"]
+        result["peak_bytes"] *= 2
+
+        regressions = sld_benchmark.compare(
+            current,
+            baseline,
+            sld_benchmark.GATE_THRESHOLD,
+            sld_benchmark.GATE_MEMORY_THRESHOLD,
+        )
+        self.assertEqual(len(regressions), 1)
+        self.assertIn("se11-1000/normalize_sld", regressions[0])
+
+
+def _colored_sld(name: str, fill: str) -> str:
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>'
+        '<StyledLayerDescriptor version="1.0.0" xmlns="http://www.opengis.net/sld">'
+        f"<NamedLayer><Name>{name}</Name><UserStyle><Name>{name}</Name>"
+        "<FeatureTypeStyle><Rule><Title>r</Title><PolygonSymbolizer><Fill>"
+        f'<CssParameter name="fill">{fill}</CssParameter></Fill>'
+        "</PolygonSymbolizer></Rule></FeatureTypeStyle></UserStyle>"
+        "</NamedLayer></StyledLayerDescriptor>"
+    )
+
+
+@skipUnless(find_spec("geonode"), "Necesita GeoNode instalado")
+class LegendAfterUpdateTests(FakeGeoServerTestCase):
+    """La leyenda local sigue al SLD subido con `update`."""
+
+    def setUp(self):
+        super().setUp()
+        from sigic_geonode.sigic_styles import views
+
+        self.views = views
+        self.gs.add_style("geonode", "leyenda", _colored_sld("leyenda", "#ff0000"))
+        self.style = mock.Mock(sld_body=_colored_sld("leyenda", "#ff0000"))
+        self.style.name = "leyenda"
+
+        def update(sld_body):
+            self.style.sld_body = sld_body
+            return 1
+
+        styles = mock.Mock()
+        styles.first.return_value = self.style
+        styles.update.side_effect = update
+        dataset = mock.Mock(alternate=LAYER, is_published=True, is_approved=True)
+        storage = InMemoryStorage()
+        viewset = views.SigicDatasetSLDStyleViewSet
+        for target, name, value in (
+            (views.Style, "objects", mock.Mock(**{"filter.return_value": styles})),
+            (viewset, "_get_dataset_or_404", mock.Mock(return_value=dataset)),
+            (viewset, "_check_edit_perm", mock.Mock()),
+            (viewset, "_check_view_perm", mock.Mock()),
+            (views, "default_storage", storage),
+            (legend, "default_storage", storage),
+        ):
+            patcher = mock.patch.object(target, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def _call(self, action, request):
+        from rest_framework.test import force_authenticate
+
+        force_authenticate(request, user=mock.Mock(is_authenticated=True))
+        method = request.method.lower()
+        view = self.views.SigicDatasetSLDStyleViewSet.as_view({method: action})
+        return view(request, dataset_pk=1, pk="leyenda")
+
+    def legend(self):
+        from rest_framework.test import APIRequestFactory
+
+        request = APIRequestFactory().get("/", {"legend_format": "svg"})
+        response = self._call("legend", request)
+        self.assertEqual(response.status_code, 200)
+        return response, b"".join(response.streaming_content)
+
+    def test_legend_follows_updated_sld(self):
+        from rest_framework.test import APIRequestFactory
+
+        before, old_svg = self.legend()
+        self.assertIn(b"#ff0000", old_svg)
+
+        request = APIRequestFactory().put(
+            "/", {"sld_body": _colored_sld("leyenda", "#0000ff")}, format="json"
+        )
+        self.assertEqual(self._call("update", request).status_code, 200)
+
+        after, new_svg = self.legend()
+        self.assertIn(b"#0000ff", new_svg)
+        self.assertNotEqual(after["ETag"], before["ETag"])
+        self.assertEqual(
+            after["X-Legend-Version"], legend.sld_hash(self.style.sld_body)
+        )
@@ -15,7 +15,7 @@
 
 from sigic_geonode.router import router
 
-from .views import SigicDatasetSLDStyleViewSet
+from .views import SigicDatasetSLDStyleViewSet, SigicSLDStyleBatchViewSet
 
 urlpatterns = []
 
@@ -24,3 +24,9 @@ router.register(
     SigicDatasetSLDStyleViewSet,
     basename="datasets-sldstyles",
 )
+
+router.register(
+    r"api/v2/sldstyles",
+    SigicSLDStyleBatchViewSet,
+    basename="sldstyles-batch",
+)
@@ -12,12 +12,21 @@
 #  SPDX-License-Identifier: LicenseRef-SIGIC-CentroGeo
 # ==============================================================================
 
-import re
-import xml.etree.ElementTree as ET
+import os
+from urllib.parse import urlencode
 
 import requests
 from django.conf import settings
-from django.http import HttpResponse
+from django.core.files.storage import default_storage
+from django.db.models import Q
+from django.http import (
+    FileResponse,
+    HttpResponse,
+    HttpResponseNotModified,
+    HttpResponseRedirect,
+)
+from django.utils.cache import patch_cache_control
+from django.utils.http import parse_etags
 from drf_spectacular.utils import (  # OpenApiExample,
     OpenApiParameter,
     OpenApiResponse,
@@ -25,16 +34,58 @@ from drf_spectacular.utils import (  # OpenApiExample,
     extend_schema_view,
     inline_serializer,
 )
-from geonode.layers.models import Dataset
-from lxml import etree
+from geonode.base.models import ResourceBase
+from geonode.layers.models import Dataset, Style
+from guardian.shortcuts import get_objects_for_user
 from rest_framework import serializers
 from rest_framework import status as drf_status
 from rest_framework.decorators import action
 from rest_framework.exceptions import NotFound, PermissionDenied
-from rest_framework.permissions import IsAuthenticatedOrReadOnly
+from rest_framework.permissions import AllowAny, IsAuthenticatedOrReadOnly
 from rest_framework.response import Response
 from rest_framework.viewsets import ViewSet
 
+from sigic_geonode.sigic_georeference.legend import (
+    LEGEND_FORMATS,
+    get_or_render_legend,
+    render_legends,
+)
+from sigic_geonode.utils.geoserver_client import geoserver
+from sigic_geonode.utils.sld_schema import SLDSchemaError, validate_sld_schema
+from sigic_geonode.utils.sld_utils import (
+    InvalidSLDError,
+    SLDNeedsNormalization,
+    normalize_sld,
+    validate_sld_before_post,
+)
+
+from .bulk import (
+    BulkUploadError,
+    collect_uploads,
+    prepare_styles,
+    push_styles,
+    remove_styles,
+)
+from .cache import (
+    cached_sld_etag,
+    fetch_layer_metadata,
+    get_layer_metadata,
+    get_layers_metadata,
+    get_style_sld,
+    invalidate_layer_metadata,
+    invalidate_sld,
+)
+from .pipeline import (
+    STEP_DELETE,
+    STEP_LAYER,
+    PipelineError,
+    plan_attach_styles,
+    plan_create,
+    plan_delete,
+    plan_set_default,
+    plan_update,
+)
+
 ListStylesResponse = inline_serializer(
     name="ListSLDStylesResponse",
     fields={
@@ -54,110 +105,148 @@ CreateUpdateStyleRequest = inline_serializer(
         "name": serializers.CharField(required=False),
         "sld_file": serializers.FileField(required=False),
         "sld_body": serializers.CharField(required=False),
+        "set_default": serializers.BooleanField(required=False),
     },
 )
 
+BulkStylesRequest = inline_serializer(
+    name="BulkSLDStylesRequest",
+    fields={
+        "sld_files": serializers.ListField(
+            child=serializers.FileField(), required=False
+        ),
+        "sld_zip": serializers.FileField(required=False),
+        "overwrite": serializers.BooleanField(required=False),
+    },
+)
 
-class InvalidSLDError(Exception):
-    pass
+BulkStylesResponse = inline_serializer(
+    name="BulkSLDStylesResponse",
+    fields={
+        "message": serializers.CharField(),
+        "layer": serializers.CharField(),
+        "created": serializers.ListField(child=serializers.CharField()),
+        "failed": serializers.ListField(child=serializers.DictField()),
+    },
+)
 
+BATCH_MAX_DATASETS = int(os.getenv("SIGIC_STYLES_BATCH_MAX_DATASETS", "200"))
 
-class SLDNeedsNormalization(Exception):
-    """Indica que el SLD necesita ser normalizado antes de enviarse a GeoServer."""
+LEGEND_MAX_AGE = int(os.getenv("SIGIC_LEGEND_MAX_AGE", "86400"))
+LEGEND_IMMUTABLE_MAX_AGE = 365 * 24 * 3600
 
-    pass
+BatchStylesRequest = inline_serializer(
+    name="BatchSLDStylesRequest",
+    fields={"ids": serializers.ListField(child=serializers.IntegerField())},
+)
 
+BatchStylesResponse = inline_serializer(
+    name="BatchSLDStylesResponse",
+    fields={
+        "results": serializers.ListField(child=serializers.DictField()),
+        "errors": serializers.ListField(child=serializers.DictField()),
+        "not_found": serializers.ListField(child=serializers.IntegerField()),
+    },
+)
 
-def validate_sld_before_post(xml: bytes) -> None:
-    """
-    Valida un SLD antes de enviarlo a GeoServer.
 
-    Detecta:
-    - SLD 1.0.0 con elementos SE inválidos (mezcla de namespaces)
-    - SLD 1.1.0 con elementos se: que necesitan normalización
+def _etag_matches(etag: str, if_none_match: str) -> bool:
+    """Comparación débil (RFC 9110) contra el header If-None-Match."""
+    if if_none_match.strip() == "*":
+        return True
+    candidates = {tag.removeprefix("W/") for tag in parse_etags(if_none_match)}
+    return etag.removeprefix("W/") in candidates
 
-    Raises:
-        InvalidSLDError: Si el SLD tiene errores que no se pueden corregir
-        SLDNeedsNormalization: Si el SLD necesita ser normalizado
-    """
-    root = etree.fromstring(xml)
 
-    version = root.attrib.get("version")
-    nsmap = root.nsmap
+def _not_modified(etag: str) -> HttpResponseNotModified:
+    resp = HttpResponseNotModified()
+    resp["ETag"] = etag
+    patch_cache_control(resp, private=True, no_cache=True)
+    return resp
 
-    # Detectar SLD 1.1.0 con elementos se:
-    is_sld_1_1 = version == "1.1.0"
-    has_se_elements = bool(
-        root.xpath(".//se:*", namespaces={"se": "http://www.opengis.net/se"})
-    )
 
-    if is_sld_1_1 and has_se_elements:
-        # SLD 1.1.0 necesita normalización para que GeoServer preserve los estilos
-        raise SLDNeedsNormalization(
-            "SLD 1.1.0 con elementos SE necesita normalización"
-        )
+def _invalid_sld_response(error: Exception) -> Response:
+    """400 con el detalle; los errores de XSD incluyen línea y columna."""
+    body = {"error": str(error)}
+    if isinstance(error, SLDSchemaError):
+        body["schema_errors"] = error.errors
+    return Response(body, status=drf_status.HTTP_400_BAD_REQUEST)
+
 
-    # Validar SLD 1.0.0
-    is_sld_1_0 = version == "1.0.0" and nsmap.get("sld") == "http://www.opengis.net/sld"
+def _pipeline_error_response(error: PipelineError, message: str, **extra) -> Response:
+    """502 con el paso de GeoServer que falló y el resultado de compensar."""
+    return Response(
+        {"error": message, **extra, **error.as_dict()},
+        status=drf_status.HTTP_502_BAD_GATEWAY,
+    )
 
-    if not is_sld_1_0:
-        return
 
-    illegal = root.xpath(
-        ".//se:*",
-        namespaces={"se": "http://www.opengis.net/se"},
+def _layer_unavailable_response(error: Exception) -> Response:
+    return Response(
+        {"error": "No se pudo obtener el layer de GeoServer", "detail": str(error)},
+        status=drf_status.HTTP_502_BAD_GATEWAY,
     )
 
-    if illegal:
-        tags = {el.tag for el in illegal}
-        raise InvalidSLDError(
-            "SLD 1.0.0 contiene elementos SE inválidos: " + ", ".join(sorted(tags))
-        )
 
+def _legend_graphic_url(alternate: str, style_name: str) -> str:
+    location = getattr(settings, "GEOSERVER_PUBLIC_LOCATION", None) or (
+        settings.OGC_SERVER["default"]["PUBLIC_LOCATION"]
+    )
+    query = urlencode(
+        {
+            "service": "WMS",
+            "version": "1.1.1",
+            "request": "GetLegendGraphic",
+            "format": "image/png",
+            "layer": alternate,
+            "style": style_name,
+        }
+    )
+    return f"{location.rstrip('/')}/ows?{query}"
 
-def normalize_mixed_sld(xml: bytes) -> bytes:
+
+def _refresh_geonode_style(dataset, style_name: str, sld_body: bytes) -> None:
     """
-    Convierte SLD 1.1.0 con elementos se: a SLD 1.0.0 válido.
-
-    Transformaciones:
-    - Cambia version="1.1.0" a version="1.0.0"
-    - Convierte elementos se:* a sld:*
-    - Convierte SvgParameter a CssParameter
-    - Agrega xmlns:sld si no existe
-    - Elimina namespaces innecesarios (se, xsi, schemaLocation)
-
-    GeoServer no convierte correctamente SvgParameter a CssParameter cuando
-    recibe SLD 1.1.0, lo que causa pérdida de estilos visuales (colores, etc.).
-    Esta función realiza la conversión antes de enviar a GeoServer.
+    Copia a `Style.sld_body` el SLD que se acaba de subir a GeoServer y
+    regenera sus leyendas: la leyenda local se dibuja y versiona con
+    `Style.sld_body`, así que sin esto seguiría saliendo la del SLD anterior.
     """
-    text = xml.decode("utf-8")
-
-    # Cambiar versión 1.1.0 → 1.0.0
-    text = re.sub(r'version="1\.1\.0"', 'version="1.0.0"', text)
+    body = sld_body.decode("utf-8")
+    styles = Style.objects.filter(name=style_name, dataset_styles=dataset)
+    if styles.update(sld_body=body):
+        render_legends(style_name, body)
 
-    # se:* → sld:*
-    text = re.sub(r"<(/?)se:", r"<\1sld:", text)
 
-    # SvgParameter → CssParameter
-    text = text.replace("SvgParameter", "CssParameter")
+def _parse_dataset_ids(raw) -> list:
+    """Acepta lista o "1,2,3"; conserva el orden y quita repetidos."""
+    if isinstance(raw, str):
+        raw = [part for part in raw.split(",") if part.strip()]
+    ids = [int(value) for value in raw or []]
+    return list(dict.fromkeys(ids))
 
-    # Eliminar xmlns:se
-    text = re.sub(r'\s+xmlns:se="[^"]+"', "", text)
 
-    # Eliminar xsi:schemaLocation y xmlns:xsi
-    text = re.sub(r'\s+xsi:schemaLocation="[^"]+"', "", text)
-    text = re.sub(r'\s+xmlns:xsi="[^"]+"', "", text)
+def _visible_datasets(ids: list, user) -> dict:
+    """
+    Datasets de `ids` que `user` puede ver, en una sola consulta. Mismas
+    reglas que `_check_view_perm`: publicados y aprobados, o con
+    `base.view_resourcebase` (incluye permisos por grupo).
+    """
+    datasets = Dataset.objects.filter(pk__in=ids).only(
+        "pk", "alternate", "is_published", "is_approved"
+    )
 
-    # Agregar xmlns:sld si no existe y hay elementos sld:
-    if "sld:" in text and 'xmlns:sld=' not in text:
-        # Buscar el elemento StyledLayerDescriptor y agregar el namespace
-        text = re.sub(
-            r'(<StyledLayerDescriptor\s)',
-            r'\1xmlns:sld="http://www.opengis.net/sld" ',
-            text,
-        )
+    if not (user and user.is_superuser):
+        visible = Q(is_published=True, is_approved=True)
+        if user and user.is_authenticated:
+            allowed = get_objects_for_user(
+                user,
+                "base.view_resourcebase",
+                klass=ResourceBase.objects.filter(pk__in=ids),
+            )
+            visible |= Q(resourcebase_ptr__in=allowed.values("pk"))
+        datasets = datasets.filter(visible)
 
-    return text.encode("utf-8")
+    return {dataset.pk: dataset for dataset in datasets}
 
 
 @extend_schema_view(
@@ -225,6 +314,9 @@ class SigicDatasetSLDStyleViewSet(ViewSet):
     - Actualizar el contenido XML de un estilo existente
     - Eliminar estilos asociados (con purga automática)
     - Cambiar el estilo por defecto del layer
+    - Crear y asociar varios estilos en una sola solicitud
+    - Servir la leyenda de los estilos generados sin pasar por GeoServer
+    - Purgar el cache de metadatos de estilos del layer
 
     Toda la gestión se realiza contra el endpoint REST nativo de GeoServer,
     manipulando tanto la configuración del estilo como la del layer
@@ -392,6 +484,7 @@ class SigicDatasetSLDStyleViewSet(ViewSet):
              → estilos adicionales asociados
            - `/rest/layers/<layer>.json`
              → estilo por defecto
+           Ambas respuestas se guardan en cache por layer (ver `sigic_styles.cache`).
         3. Normaliza los nombres removiendo el prefijo `<workspace>:` cuando existe.
         4. Retorna los datos en formato JSON.
 
@@ -430,38 +523,10 @@ class SigicDatasetSLDStyleViewSet(ViewSet):
 
         layer_name = dataset.alternate
 
-        gs_url = settings.OGC_SERVER["default"]["LOCATION"].rstrip("/")
-        auth = (
-            settings.OGC_SERVER["default"]["USER"],
-            settings.OGC_SERVER["default"]["PASSWORD"],
-        )
-
-        # --- 1. Estilos asociados (lista completa de estilos configurados en la capa) ---
-        url_styles = f"{gs_url}/rest/layers/{layer_name}/styles.json"
-        r_styles = requests.get(url_styles, auth=auth)
-        r_styles.raise_for_status()
-        styles_data = r_styles.json()
-
-        styles = styles_data.get("styles", {})
-        if not isinstance(styles, dict):
-            styles = {}
-
-        style_items = styles.get("style", [])
-        if isinstance(style_items, dict):
-            style_items = [style_items]  # cuando viene un solo elemento
-
-        elif not isinstance(style_items, list):
-            style_items = []
-
-        associated_styles = [s.get("name") for s in style_items if isinstance(s, dict)]
-
-        # --- 2. Estilo por defecto ---
-        url_layer = f"{gs_url}/rest/layers/{layer_name}.json"
-        r_layer = requests.get(url_layer, auth=auth)
-        r_layer.raise_for_status()
-        layer_data = r_layer.json()
-
-        default_style = layer_data.get("layer", {}).get("defaultStyle", {}).get("name")
+        # --- 1. Estilos asociados y estilo por defecto (cache por layer) ---
+        metadata = get_layer_metadata(layer_name)
+        associated_styles = list(metadata["styles"])
+        default_style = metadata["default_style"]
 
         # Normalizar workspace:name → name
         if default_style and ":" in default_style:
@@ -492,11 +557,14 @@ class SigicDatasetSLDStyleViewSet(ViewSet):
         3. Consulta GeoServer para obtener la lista real de estilos asociados al layer:
              - `/rest/layers/<layer>/styles.json`
              - Incluye estilos adicionales y también el `defaultStyle`.
+             - Se sirve desde el cache de metadatos del layer cuando existe.
         4. Verifica que el estilo solicitado esté realmente asociado al dataset.
-        5. Intenta obtener el SLD desde:
+        5. Intenta obtener el SLD (en paralelo con el paso 3) desde:
              a. `/rest/workspaces/<workspace>/styles/<name>.sld`
              b. `/rest/styles/<name>.sld` (fallback)
-        6. Retorna:
+        6. Si `If-None-Match` coincide con el ETag del SLD responde 304 sin cuerpo
+           (con el ETag ya conocido ni siquiera se consulta GeoServer).
+        7. Retorna:
              - XML directo (visualización)
              - O bien un archivo descargable (`Content-Disposition: attachment`) si se pidió descarga.
 
@@ -518,6 +586,10 @@ class SigicDatasetSLDStyleViewSet(ViewSet):
         HTTP 200
             - XML con el SLD (visualización)
             - Archivo `.sld` si se solicitó descarga
+            - Siempre con header `ETag` (hash del contenido)
+
+        HTTP 304
+            Si `If-None-Match` coincide con el ETag vigente.
 
         HTTP 404
             Si el estilo existe en GeoServer pero **no está asociado al dataset**.
@@ -545,10 +617,6 @@ class SigicDatasetSLDStyleViewSet(ViewSet):
         layer_name = dataset.alternate  # ej: geonode:immziszen_colonias
         workspace = layer_name.split(":")[0]  # ej: geonode
 
-        gs = settings.OGC_SERVER["default"]
-        gs_url = gs["LOCATION"].rstrip("/")
-        auth = (gs["USER"], gs["PASSWORD"])
-
         # -------------------------------------------
         # 1. Normalizar nombre solicitado
         # -------------------------------------------
@@ -561,40 +629,39 @@ class SigicDatasetSLDStyleViewSet(ViewSet):
         clean_name = requested[:-4] if is_download else requested  # "acatic3"
 
         # -------------------------------------------
-        # 2. Obtener estilos asociados del layer
+        # 2. ¿El cliente ya tiene la versión vigente? (ETag conocido)
         # -------------------------------------------
-        r_styles = requests.get(
-            f"{gs_url}/rest/layers/{layer_name}/styles.json", auth=auth
-        )
-        if r_styles.status_code != 200:
+        if_none_match = request.META.get("HTTP_IF_NONE_MATCH")
+        known_etag = cached_sld_etag(workspace, clean_name) if if_none_match else None
+        revalidated = bool(known_etag and _etag_matches(known_etag, if_none_match))
+
+        # -------------------------------------------
+        # 3. Estilos asociados del layer y, en paralelo, el SLD
+        #    (cache, o GeoServer en la ubicación recordada)
+        # -------------------------------------------
+        calls = [lambda: get_layer_metadata(layer_name)]
+        if not revalidated:
+            calls.append(lambda: get_style_sld(workspace, clean_name))
+
+        try:
+            metadata, *sld_result = geoserver.gather(*calls)
+        except requests.RequestException:
             return Response(
                 {"detail": "Error consultando estilos en GeoServer"}, status=500
             )
 
-        styles = r_styles.json().get("styles", {}).get("style", [])
         associated = set()
 
-        for s in styles:
-            name = s.get("name")  # ej: "geonode:acatic3"
-            if not name:
+        # Estilos asociados + defaultStyle
+        for name in metadata["styles"] + [metadata["default_style"]]:
+            if not name:  # ej: "geonode:acatic3"
                 continue
             associated.add(name)  # forma extendida
             if ":" in name:
                 associated.add(name.split(":", 1)[1])  # forma local "acatic3"
 
-        # También incluir defaultStyle
-        r_layer = requests.get(f"{gs_url}/rest/layers/{layer_name}.json", auth=auth)
-        if r_layer.status_code == 200:
-            default_name = (
-                r_layer.json().get("layer", {}).get("defaultStyle", {}).get("name")
-            )
-            if default_name:
-                associated.add(default_name)
-                if ":" in default_name:
-                    associated.add(default_name.split(":", 1)[1])
-
         # -------------------------------------------
-        # 3. Validar que el estilo esté asociado
+        # 4. Validar que el estilo esté asociado
         # -------------------------------------------
         if clean_name not in associated:
             return Response(
@@ -602,39 +669,40 @@ class SigicDatasetSLDStyleViewSet(ViewSet):
                 status=404,
             )
 
+        if revalidated:
+            return _not_modified(known_etag)
+
         # -------------------------------------------
-        # 4. Intentar obtener el SLD desde workspace (primero)
+        # 5. Resultado del SLD
         # -------------------------------------------
-        ws_url = f"{gs_url}/rest/workspaces/{workspace}/styles/{clean_name}.sld"
-        global_url = f"{gs_url}/rest/styles/{clean_name}.sld"
+        sld_status, sld, etag = sld_result[0]
 
-        r = requests.get(ws_url, auth=auth)
-        if r.status_code == 404:
-            r = requests.get(global_url, auth=auth)
-
-        if r.status_code == 404:
+        if sld_status == 404:
             return Response(
                 {"detail": f"El estilo '{clean_name}' no existe en GeoServer"},
                 status=404,
             )
 
-        if r.status_code != 200:
+        if sld_status != 200:
             return Response({"detail": "Error obteniendo SLD de GeoServer"}, status=500)
 
-        sld = r.text
+        if if_none_match and _etag_matches(etag, if_none_match):
+            return _not_modified(etag)
+
+        resp = HttpResponse(sld, content_type="application/xml")
+        resp["ETag"] = etag
+        patch_cache_control(resp, private=True, no_cache=True)
 
         # -------------------------------------------
-        # 5. Si pidió descarga (*.sld)
+        # 6. Si pidió descarga (*.sld)
         # -------------------------------------------
         if is_download:
-            resp = HttpResponse(sld, content_type="application/xml")
             resp["Content-Disposition"] = f'attachment; filename="{clean_name}.sld"'
-            return resp
 
         # -------------------------------------------
-        # 6. Visualización normal del SLD
+        # 7. Visualización normal del SLD
         # -------------------------------------------
-        return HttpResponse(sld, content_type="application/xml")
+        return resp
 
     # POST /api/v2/datasets/<id>/sldstyles/
     def create(self, request, dataset_pk=None):
@@ -655,12 +723,17 @@ class SigicDatasetSLDStyleViewSet(ViewSet):
         2. Valida que se haya enviado **solo uno** de:
              - `sld_file`
              - `sld_body`
-        3. Crea la entrada del estilo en GeoServer mediante:
-             POST /rest/workspaces/<workspace>/styles
-        4. Sube el contenido SLD con:
-             PUT /rest/workspaces/<workspace>/styles/<name>
-        5. Asocia el estilo a la capa:
+        3. Normaliza el SLD y lo valida localmente (namespaces y XSD de OGC),
+           antes de cualquier llamada a GeoServer.
+        4. Crea el estilo con el SLD en el mismo POST:
+             POST /rest/workspaces/<workspace>/styles?name=<name>&raw=true
+        5. Asocia el estilo a la capa con una sola llamada:
              POST /rest/layers/<layer>/styles
+           o, con `set_default`, un PUT del layer con la lista de estilos
+           (leída de GeoServer sin cache) y el nuevo default:
+             PUT /rest/layers/<layer>.json
+           Si la asociación falla, se elimina el estilo creado en el paso 4
+           (ver `sigic_styles.pipeline`).
         6. Retorna un 201 si todo fue exitoso.
 
         Parámetros
@@ -670,6 +743,7 @@ class SigicDatasetSLDStyleViewSet(ViewSet):
             - `name`: nombre del estilo (string, requerido)
             - `sld_file`: archivo SLD (opcional)
             - `sld_body`: contenido XML del SLD (opcional)
+            - `set_default`: "true" para dejarlo como estilo por defecto
 
         dataset_pk : int
             ID del dataset cuyo layer recibirá el estilo.
@@ -683,13 +757,18 @@ class SigicDatasetSLDStyleViewSet(ViewSet):
             - Falta `name`
             - No se envió `sld_file` ni `sld_body`
             - Se enviaron ambos al mismo tiempo (exclusión obligatoria)
+            - El SLD no es válido; si no cumple el XSD, `schema_errors` trae
+              línea, columna y mensaje de cada error
 
         HTTP 502
-            Si GeoServer rechaza la creación o asociación del estilo.
+            Si GeoServer rechaza la creación o asociación del estilo. El
+            cuerpo indica el paso que falló (`step`) y si alguna
+            compensación no se pudo aplicar (`compensation_errors`).
 
         Notas
         -----
-        - Este método no valida el contenido del SLD más allá de lo que GeoServer responde.
+        - La validación XSD se controla con `SIGIC_SLD_SCHEMA_VALIDATION`
+          (ver `sigic_geonode.utils.sld_schema`).
         - Los estilos se crean siempre dentro del workspace del dataset.
         - El nombre no debe llevar extensión `.sld`.
         """
@@ -702,6 +781,7 @@ class SigicDatasetSLDStyleViewSet(ViewSet):
         name = request.data.get("name")
         sld_file = request.FILES.get("sld_file")
         sld_body = request.data.get("sld_body")
+        make_default = str(request.data.get("set_default", "")).lower() == "true"
 
         # ---------------------------------------------
         # Validación: solo uno de los dos
@@ -724,105 +804,35 @@ class SigicDatasetSLDStyleViewSet(ViewSet):
                 status=drf_status.HTTP_400_BAD_REQUEST,
             )
 
-        gs_url = settings.OGC_SERVER["default"]["LOCATION"].rstrip("/")
-        auth = (
-            settings.OGC_SERVER["default"]["USER"],
-            settings.OGC_SERVER["default"]["PASSWORD"],
-        )
-
         # ---------------------------------------------
-        # 1) Crear entrada del estilo (POST)
-        # ---------------------------------------------
-        url_create = f"{gs_url}/rest/workspaces/{workspace}/styles"
-
-        wrapper = f"""
-        <style>
-            <name>{name}</name>
-            <filename>{name}.sld</filename>
-        </style>
-        """
-
-        r_post = requests.post(
-            url_create,
-            data=wrapper,
-            auth=auth,
-            headers={"Content-Type": "text/xml"},
-        )
-
-        if r_post.status_code not in (200, 201):
-            return Response(
-                {
-                    "error": "GeoServer rechazó la creación del estilo",
-                    "gs_status": r_post.status_code,
-                    "gs_response": r_post.text,
-                },
-                status=drf_status.HTTP_502_BAD_GATEWAY,
-            )
-
-        # ---------------------------------------------
-        # 2) Subir SLD (PUT)
+        # Validación local del SLD, antes de tocar GeoServer
         # ---------------------------------------------
         if sld_file:
             sld_body = sld_file.read()
         else:
             sld_body = sld_body.encode("utf-8")
 
-        from sigic_geonode.utils.sld_utils import fix_sld, needs_fix
-
-        sld_str = sld_body if isinstance(sld_body, str) else sld_body.decode("utf-8")
-        if needs_fix(sld_str):
-            sld_str = fix_sld(sld_str)
-        sld_body = sld_str.encode("utf-8")
-
         try:
-            validate_sld_before_post(sld_body)
+            normalized = normalize_sld(sld_body)
+            validate_sld_before_post(normalized.root)
+            validate_sld_schema(normalized.root)
         except (InvalidSLDError, SLDNeedsNormalization) as e:
-            return Response(
-                {"error": str(e)},
-                status=drf_status.HTTP_400_BAD_REQUEST,
-            )
-
-        url_upload = f"{gs_url}/rest/workspaces/{workspace}/styles/{name}"
-
-        r_put = requests.put(
-            url_upload,
-            data=sld_body,
-            auth=auth,
-            headers={"Content-Type": "application/vnd.ogc.sld+xml"},
-        )
-
-        if r_put.status_code not in (200, 201):
-            return Response(
-                {
-                    "error": "GeoServer rechazó el SLD",
-                    "gs_status": r_put.status_code,
-                    "gs_response": r_put.text,
-                },
-                status=drf_status.HTTP_502_BAD_GATEWAY,
-            )
+            return _invalid_sld_response(e)
+        sld_body = normalized.body
 
         # ---------------------------------------------
-        # 3) Asociar estilo a la capa (POST)
+        # POST con el SLD inline + asociación al layer
         # ---------------------------------------------
-        url_layer_styles = f"{gs_url}/rest/layers/{layer_name}/styles"
-
-        xml_body = f"<style><name>{name}</name></style>"
-
-        r_post_layer = requests.post(
-            url_layer_styles,
-            data=xml_body,
-            auth=auth,
-            headers={"Content-Type": "application/xml"},
-        )
-
-        if r_post_layer.status_code not in (200, 201):
-            return Response(
-                {
-                    "error": "No se pudo asociar el estilo a la capa",
-                    "gs_status": r_post_layer.status_code,
-                    "gs_response": r_post_layer.text,
-                },
-                status=drf_status.HTTP_502_BAD_GATEWAY,
+        try:
+            plan_create(
+                workspace, layer_name, name, sld_body, make_default=make_default
+            ).run()
+        except PipelineError as e:
+            return _pipeline_error_response(
+                e,
+                "No se pudo asociar el estilo a la capa"
+                if e.step == STEP_LAYER
+                else "GeoServer rechazó la creación del estilo",
             )
 
         # ---------------------------------------------
@@ -833,6 +843,7 @@ class SigicDatasetSLDStyleViewSet(ViewSet):
                 "message": "Estilo creado y asociado correctamente",
                 "style": name,
                 "layer": layer_name,
+                "default": make_default,
             },
             status=drf_status.HTTP_201_CREATED,
         )
@@ -861,11 +872,12 @@ class SigicDatasetSLDStyleViewSet(ViewSet):
              - `sld_file`
              - `sld_body`
 
-        3. Comprueba que el estilo exista en GeoServer:
-             GET /rest/workspaces/<workspace>/styles/<name>.xml
+        3. Sube el nuevo contenido del SLD con un solo PUT:
+             PUT /rest/workspaces/<workspace>/styles/<name>?raw=true
+           Si el estilo no existe GeoServer responde 404.
 
-        4. Si existe, sube el nuevo contenido del SLD con:
-             PUT /rest/workspaces/<workspace>/styles/<name>
+        4. Copia el SLD a `Style.sld_body` en GeoNode y regenera la leyenda
+           local (ver `legend`).
 
         5. Responde con éxito o con el error devuelto por GeoServer.
 
@@ -890,6 +902,7 @@ class SigicDatasetSLDStyleViewSet(ViewSet):
         HTTP 400
             - No se envió ningún contenido
             - Se enviaron ambos (`sld_file` y `sld_body`)
+            - El SLD no es válido (`schema_errors` si no cumple el XSD)
 
         HTTP 404
             El estilo no existe en GeoServer.
@@ -900,7 +913,7 @@ class SigicDatasetSLDStyleViewSet(ViewSet):
         Notas
         -----
         - No modifica la lista de estilos asociados ni el estilo por defecto.
-        - Solo reemplaza el archivo SLD.
+        - Solo reemplaza el SLD (en GeoServer y en `Style.sld_body`).
         - Debe usarse únicamente sobre estilos que ya existen.
         """
 
@@ -940,65 +953,38 @@ class SigicDatasetSLDStyleViewSet(ViewSet):
         # ---------------------------------------------
         # Validar y normalizar SLD si es necesario
         # ---------------------------------------------
-        from sigic_geonode.utils.sld_utils import fix_sld, needs_fix
-
-        sld_str = sld_body if isinstance(sld_body, str) else sld_body.decode("utf-8")
-        if needs_fix(sld_str):
-            sld_str = fix_sld(sld_str)
-        sld_body = sld_str.encode("utf-8")
-
         try:
-            validate_sld_before_post(sld_body)
+            normalized = normalize_sld(sld_body)
+            validate_sld_before_post(normalized.root)
+            validate_sld_schema(normalized.root)
         except (InvalidSLDError, SLDNeedsNormalization) as e:
-            return Response(
-                {"error": str(e)},
-                status=drf_status.HTTP_400_BAD_REQUEST,
-            )
-
-        gs_url = settings.OGC_SERVER["default"]["LOCATION"].rstrip("/")
-        auth = (
-            settings.OGC_SERVER["default"]["USER"],
-            settings.OGC_SERVER["default"]["PASSWORD"],
-        )
+            return _invalid_sld_response(e)
+        sld_body = normalized.body
 
         # ---------------------------------------------
-        # 1. Verificar que el estilo exista (opcional pero útil)
+        # PUT del SLD; un 404 indica que el estilo no existe
         # ---------------------------------------------
-        url_check = f"{gs_url}/rest/workspaces/{workspace}/styles/{name}.xml"
-        r_check = requests.get(url_check, auth=auth)
-
-        if r_check.status_code != 200:
-            return Response(
-                {
-                    "error": "El estilo no existe en GeoServer",
-                    "style": name,
-                    "gs_status": r_check.status_code,
-                    "gs_response": r_check.text,
-                },
-                status=drf_status.HTTP_404_NOT_FOUND,
+        try:
+            plan_update(workspace, name, sld_body).run()
+        except PipelineError as e:
+            if e.status_code == 404:
+                return Response(
+                    {
+                        "error": "El estilo no existe en GeoServer",
+                        "style": name,
+                        "gs_status": e.status_code,
+                        "gs_response": e.response.text,
+                    },
+                    status=drf_status.HTTP_404_NOT_FOUND,
+                )
+            return _pipeline_error_response(
+                e, "GeoServer rechazó la actualización del SLD"
             )
 
         # ---------------------------------------------
-        # 2. Actualizar el SLD (PUT) — DOCUMENTACIÓN OFICIAL
+        # Reflejar el SLD en GeoNode (y en su leyenda)
         # ---------------------------------------------
-        url_update = f"{gs_url}/rest/workspaces/{workspace}/styles/{name}"
-
-        r_put = requests.put(
-            url_update,
-            data=sld_body,
-            auth=auth,
-            headers={"Content-Type": "application/vnd.ogc.sld+xml"},
-        )
-
-        if r_put.status_code not in (200, 201):
-            return Response(
-                {
-                    "error": "GeoServer rechazó la actualización del SLD",
-                    "gs_status": r_put.status_code,
-                    "gs_response": r_put.text,
-                },
-                status=drf_status.HTTP_502_BAD_GATEWAY,
-            )
+        _refresh_geonode_style(dataset, name, sld_body)
 
         # ---------------------------------------------
         # Final exitoso
@@ -1031,16 +1017,16 @@ class SigicDatasetSLDStyleViewSet(ViewSet):
         Flujo interno
         -------------
         1. Verifica que el usuario tenga permisos mediante `_check_edit_perm`.
-        2. Obtiene el XML del layer:
-             GET /rest/layers/<layer>.xml
-        3. Determina si el estilo solicitado:
+        2. Con los metadatos del layer leídos de GeoServer (sin cache)
+           determina si el estilo:
              - Está asociado
              - Es estilo por defecto
-        4. Si está asociado y no es default:
-             - Se remueve del nodo `<styles>`
-             - PUT del layer actualizado
-        5. Finalmente elimina el estilo:
-             DELETE /rest/workspaces/<workspace>/styles/<name>?purge=true
+        3. Si está asociado y no es default:
+             - PUT del layer sin el estilo
+               PUT /rest/layers/<layer>.json
+             - DELETE /rest/workspaces/<workspace>/styles/<name>?purge=true
+           Si el DELETE falla, el estilo se vuelve a asociar al layer
+           (ver `sigic_styles.pipeline`).
 
         Parámetros
         ----------
@@ -1072,7 +1058,6 @@ class SigicDatasetSLDStyleViewSet(ViewSet):
         Notas
         -----
         - El método siempre elimina usando `purge=true`.
-        - Usa el formato extendido del layer, modificando explícitamente el XML.
         - Esta operación no afecta estilos globales de otros workspaces.
         """
 
@@ -1088,31 +1073,14 @@ class SigicDatasetSLDStyleViewSet(ViewSet):
         # Nombre REAL del estilo en GeoServer
         full_style_name = f"{workspace}:{name}"
 
-        gs_url = settings.OGC_SERVER["default"]["LOCATION"].rstrip("/")
-        auth = (
-            settings.OGC_SERVER["default"]["USER"],
-            settings.OGC_SERVER["default"]["PASSWORD"],
-        )
-
-        # 1. GET del layer
-        url_layer = f"{gs_url}/rest/layers/{layer_name}.xml"
-        r_get = requests.get(url_layer, auth=auth)
-
-        if r_get.status_code != 200:
-            return Response(
-                {
-                    "error": "No se pudo obtener el layer para actualizar estilos",
-                    "gs_status": r_get.status_code,
-                    "gs_response": r_get.text,
-                },
-                status=drf_status.HTTP_502_BAD_GATEWAY,
-            )
-
-        tree = ET.fromstring(r_get.text)
+        # Lectura sin cache: se valida contra el estado actual del layer
+        try:
+            metadata = fetch_layer_metadata(layer_name)
+        except requests.RequestException as e:
+            return _layer_unavailable_response(e)
 
-        # 2. Validar default
-        default_style = tree.find("./defaultStyle/name")
-        if default_style is not None and default_style.text == full_style_name:
+        # 1. Validar default
+        if metadata["default_style"] == full_style_name:
             return Response(
                 {
                     "error": "No se puede eliminar un estilo que es el estilo por defecto."
@@ -1120,64 +1088,23 @@ class SigicDatasetSLDStyleViewSet(ViewSet):
                 status=drf_status.HTTP_400_BAD_REQUEST,
             )
 
-        # 3. Extraer estilos existentes
-        styles_node = tree.find("./styles")
-        if styles_node is None:
-            return Response(
-                {"error": "El nodo <styles> no existe en el layer."},
-                status=drf_status.HTTP_400_BAD_REQUEST,
-            )
-
-        # 4. Quitar el estilo (extended mode)
-        removed = False
-        for style in list(styles_node.findall("style")):
-            name_node = style.find("name")
-            if name_node is not None and name_node.text == full_style_name:
-                styles_node.remove(style)
-                removed = True
-                break
-
-        if not removed:
+        # 2. Validar asociación
+        if full_style_name not in metadata["styles"]:
             return Response(
                 {"error": f"El estilo '{full_style_name}' no está asociado a la capa."},
                 status=drf_status.HTTP_400_BAD_REQUEST,
             )
 
-        # 5. PUT del layer actualizado
-        final_xml = ET.tostring(tree, encoding="utf-8")
-        r_put = requests.put(
-            url_layer,
-            data=final_xml,
-            auth=auth,
-            headers={"Content-Type": "application/xml"},
-        )
-
-        if r_put.status_code not in (200, 201):
-            return Response(
-                {
-                    "error": "No se pudo actualizar la lista de estilos en el layer",
-                    "gs_status": r_put.status_code,
-                    "gs_response": r_put.text,
-                },
-                status=drf_status.HTTP_502_BAD_GATEWAY,
-            )
-
-        # 6. DELETE del estilo del workspace usando su nombre completo
-        url_delete_style = (
-            f"{gs_url}/rest/workspaces/{workspace}/styles/{name}?purge=true"
-        )
-
-        r_del = requests.delete(url_delete_style, auth=auth)
-
-        if r_del.status_code not in (200, 201):
-            return Response(
-                {
-                    "error": "GeoServer no pudo eliminar el estilo",
-                    "style": full_style_name,
-                    "gs_status": r_del.status_code,
-                    "gs_response": r_del.text,
-                },
-                status=drf_status.HTTP_502_BAD_GATEWAY,
+        # 3. PUT del layer sin el estilo + DELETE con purge
+        try:
+            plan_delete(workspace, layer_name, name).run()
+        except PipelineError as e:
+            return _pipeline_error_response(
+                e,
+                "GeoServer no pudo eliminar el estilo"
+                if e.step == STEP_DELETE
+                else "No se pudo actualizar la lista de estilos en el layer",
+                style=full_style_name,
             )
 
         return Response(
@@ -1225,23 +1152,19 @@ class SigicDatasetSLDStyleViewSet(ViewSet):
 
         2. Si el estilo solicitado no está asociado, se responde con error 400.
 
-        3. El método ajusta correctamente el XML del layer:
-             - Mueve el default anterior a `<styles>` si no estaba ahí
-             - Remueve el nuevo default de `<styles>` si estaba ahí
-             - Actualiza el nodo `<defaultStyle>`
+        3. El método ajusta la lista de estilos del layer:
+             - Mueve el default anterior a `styles` si no estaba ahí
+             - Remueve el nuevo default de `styles` si estaba ahí
+             - Actualiza `defaultStyle`
 
         Flujo interno
         -------------
         1. Verifica permisos con `_check_edit_perm`.
-        2. Obtiene el XML del layer:
-             GET /rest/layers/<layer>.xml
-        3. Construye el nombre extendido: `<workspace>:<estilo>`
-        4. Verifica que el estilo exista dentro del conjunto de estilos asociados.
-        5. Actualiza:
-             - `<styles>`
-             - `<defaultStyle>`
-        6. Envía el update por:
-             PUT /rest/layers/<layer>.xml
+        2. Construye el nombre extendido: `<workspace>:<estilo>`
+        3. Verifica con los metadatos del layer leídos de GeoServer (sin
+           cache) que el estilo esté asociado.
+        4. Envía `styles` y `defaultStyle` en un solo PUT parcial:
+             PUT /rest/layers/<layer>.json
 
         Parámetros
         ----------
@@ -1263,14 +1186,13 @@ class SigicDatasetSLDStyleViewSet(ViewSet):
             - No se envió `style` en el body.
             - El estilo no está asociado al dataset.
 
-        HTTP 500
-            Error inesperado de GeoServer al actualizar el XML.
+        HTTP 502
+            GeoServer rechazó el update del layer.
 
         Notas
         -----
         - Esta operación **no crea ni elimina** estilos; solo cambia el default.
         - El estilo solicitado debe existir previamente y estar asociado.
-        - Mantiene la estructura correcta del modo extendido de GeoServer.
         """
 
         style_name = request.data.get("style")
@@ -1283,100 +1205,451 @@ class SigicDatasetSLDStyleViewSet(ViewSet):
 
         self._check_edit_perm(dataset, request.user)
 
-        gs = settings.OGC_SERVER["default"]
-        gs_url = gs["LOCATION"].rstrip("/")
-        auth = (gs["USER"], gs["PASSWORD"])
-
         # nombre extendido
         new_default_full = f"{workspace}:{style_name}"
 
-        # 1) Obtener XML completo del layer
-        url_layer = f"{gs_url}/rest/layers/{layer_name}.xml"
+        # Lectura sin cache: se valida contra el estado actual del layer
+        try:
+            metadata = fetch_layer_metadata(layer_name)
+        except requests.RequestException as e:
+            return _layer_unavailable_response(e)
 
-        r_get = requests.get(url_layer, auth=auth)
-        if r_get.status_code != 200:
-            return Response({"error": "GeoServer no devolvió el layer"}, status=500)
+        # incluir también default actual
+        associated = set(metadata["styles"])
+        if metadata["default_style"]:
+            associated.add(metadata["default_style"])
 
-        tree = ET.fromstring(r_get.text)
+        # validar que el estilo exista
+        if new_default_full not in associated:
+            return Response(
+                {"error": f"El estilo '{style_name}' no está asociado al dataset."},
+                status=400,
+            )
+
+        try:
+            plan_set_default(workspace, layer_name, style_name).run()
+        except PipelineError as e:
+            return _pipeline_error_response(e, "GeoServer rechazó el update")
 
-        # default actual
-        current_default = tree.find("./defaultStyle/name")
-        current_default_name = (
-            current_default.text if current_default is not None else None
+        return Response(
+            {
+                "message": "Estilo por defecto actualizado correctamente",
+                "default": style_name,
+            }
         )
 
-        # styles asociados
-        styles_node = tree.find("./styles")
-        associated = set()
+    # GET /api/v2/datasets/<id>/sldstyles/<style_name>/legend/
+    @extend_schema(
+        summary="Leyenda del estilo (PNG o SVG)",
+        parameters=[
+            OpenApiParameter(
+                name="legend_format",
+                description="'png' (defecto) o 'svg'",
+                required=False,
+                type=str,
+            ),
+            OpenApiParameter(
+                name="v",
+                description="Hash del SLD; si coincide la respuesta es inmutable",
+                required=False,
+                type=str,
+            ),
+        ],
+        responses={
+            200: OpenApiResponse(description="Imagen de la leyenda"),
+            302: OpenApiResponse(description="Redirección a GetLegendGraphic"),
+            304: OpenApiResponse(description="La leyenda no ha cambiado"),
+            404: OpenApiResponse(description="Estilo no encontrado"),
+        },
+        tags=["SLD Styles"],
+    )
+    @action(detail=True, methods=["get"], url_path="legend")
+    def legend(self, request, dataset_pk=None, pk=None):
+        """
+        Sirve la leyenda del estilo renderizada localmente.
 
-        for s in styles_node.findall("style"):
-            nm = s.find("name")
-            if nm is not None:
-                associated.add(nm.text)
+        Los estilos generados por `sigic_georeference.style_generator` se
+        dibujan sin GeoServer (`sigic_georeference.legend`) y la imagen se
+        guarda en `default_storage` con el hash del SLD en el nombre: solo se
+        vuelve a renderizar cuando cambia el SLD.
 
-        # incluir también default actual
-        if current_default_name:
-            associated.add(current_default_name)
+        Para cualquier otro estilo se redirige a `GetLegendGraphic` de
+        GeoServer.
 
-        # validar que el estilo exista
-        if new_default_full not in associated:
+        Cache
+        -----
+        - `ETag` por hash del SLD y formato; `If-None-Match` responde 304.
+        - `Cache-Control: max-age=SIGIC_LEGEND_MAX_AGE` (público si el
+          dataset es público).
+        - Con `?v=<hash>` vigente la respuesta es `immutable` por un año; el
+          hash viene en el header `X-Legend-Version`.
+        """
+
+        dataset = self._get_dataset_or_404(dataset_pk)
+        self._check_view_perm(dataset, request.user)
+
+        fmt = request.query_params.get("legend_format", "png").lower()
+        if fmt not in LEGEND_FORMATS:
             return Response(
-                {"error": f"El estilo '{style_name}' no está asociado al dataset."},
-                status=400,
+                {"error": "legend_format debe ser 'png' o 'svg'."},
+                status=drf_status.HTTP_400_BAD_REQUEST,
             )
 
-        # 2) mover default actual a <styles> si no está
-        if current_default_name and current_default_name != new_default_full:
-            found = False
-            for s in styles_node.findall("style"):
-                nm = s.find("name")
-                if nm is not None and nm.text == current_default_name:
-                    found = True
-                    break
-            if not found:
-                st = ET.Element("style")
-                nm = ET.SubElement(st, "name")
-                nm.text = current_default_name
-                ws_el = ET.SubElement(st, "workspace")
-                ws_el.text = workspace
-                styles_node.append(st)
-
-        # 3) quitar nuevo default de <styles> si está ahí
-        for s in list(styles_node.findall("style")):
-            nm = s.find("name")
-            if nm is not None and nm.text == new_default_full:
-                styles_node.remove(s)
-                break
-
-        # 4) actualizar defaultStyle
-        default_style_node = tree.find("./defaultStyle")
-        if default_style_node is None:
-            default_style_node = ET.SubElement(tree, "defaultStyle")
-
-        # limpiar contenido
-        for ch in list(default_style_node):
-            default_style_node.remove(ch)
-
-        nm = ET.SubElement(default_style_node, "name")
-        nm.text = new_default_full
-        ws_el = ET.SubElement(default_style_node, "workspace")
-        ws_el.text = workspace
-
-        # 5) PUT del XML actualizado
-        updated_xml = ET.tostring(tree, encoding="utf-8")
-        r_put = requests.put(
-            url_layer,
-            data=updated_xml,
-            auth=auth,
-            headers={"Content-Type": "application/xml"},
+        style = Style.objects.filter(name=pk, dataset_styles=dataset).first()
+        if style is None:
+            metadata = get_layer_metadata(dataset.alternate)
+            known = {s.split(":")[-1] for s in metadata["styles"]}
+            if metadata["default_style"]:
+                known.add(metadata["default_style"].split(":")[-1])
+            if pk not in known:
+                raise NotFound("Style not found")
+
+        stored = (
+            get_or_render_legend(style.name, style.sld_body, fmt)
+            if style is not None and style.sld_body
+            else None
         )
+        if stored is None:
+            return HttpResponseRedirect(_legend_graphic_url(dataset.alternate, pk))
+
+        path, digest = stored
+        etag = f'"{digest}-{fmt}"'
+        is_public = dataset.is_published and dataset.is_approved
 
-        if r_put.status_code not in (200, 201):
-            return Response({"error": "GeoServer rechazó el update"}, status=500)
+        if_none_match = request.headers.get("If-None-Match")
+        if if_none_match and _etag_matches(etag, if_none_match):
+            resp = HttpResponseNotModified()
+            resp["ETag"] = etag
+        else:
+            resp = FileResponse(
+                default_storage.open(path, "rb"), content_type=LEGEND_FORMATS[fmt]
+            )
+            resp["ETag"] = etag
+
+        resp["X-Legend-Version"] = digest
+        visibility = {"public": True} if is_public else {"private": True}
+        if request.query_params.get("v") == digest:
+            patch_cache_control(
+                resp, max_age=LEGEND_IMMUTABLE_MAX_AGE, immutable=True, **visibility
+            )
+        else:
+            patch_cache_control(resp, max_age=LEGEND_MAX_AGE, **visibility)
+        return resp
+
+    # POST /api/v2/datasets/<id>/sldstyles/purge-cache/
+    @extend_schema(
+        summary="Purga el cache de estilos del dataset",
+        request=None,
+        responses={
+            200: OpenApiResponse(
+                description="Cache purgado",
+                response=inline_serializer(
+                    name="PurgeSLDCacheResponse",
+                    fields={
+                        "message": serializers.CharField(),
+                        "layer": serializers.CharField(),
+                    },
+                ),
+            ),
+        },
+        tags=["SLD Styles"],
+    )
+    @action(detail=False, methods=["post"], url_path="purge-cache")
+    def purge_cache(self, request, dataset_pk=None):
+        """
+        Descarta los metadatos de estilos en cache del layer y los SLD
+        (ETag y ubicación) de sus estilos.
+
+        Los endpoints de este ViewSet invalidan el cache por sí mismos; este
+        endpoint es para cambios hechos directamente en GeoServer (UI de
+        administración, scripts REST, etc.) que de otro modo tardarían
+        hasta `SIGIC_STYLES_METADATA_CACHE_TTL` segundos en verse.
+
+        Requiere los mismos permisos que la edición de estilos.
+        """
+
+        dataset = self._get_dataset_or_404(dataset_pk)
+        self._check_edit_perm(dataset, request.user)
+
+        layer_name = dataset.alternate
+        workspace = layer_name.split(":")[0]
+
+        # Los SLD en cache de los estilos conocidos del layer también se descartan
+        try:
+            metadata = get_layer_metadata(layer_name)
+        except requests.RequestException:
+            metadata = {"styles": [], "default_style": None}
+
+        for style_name in metadata["styles"] + [metadata["default_style"]]:
+            if style_name:
+                invalidate_sld(
+                    workspace, style_name.split(":")[-1], forget_location=True
+                )
+
+        invalidate_layer_metadata(layer_name)
 
         return Response(
             {
-                "message": "Estilo por defecto actualizado correctamente",
-                "default": style_name,
+                "message": "Cache de estilos purgado",
+                "layer": layer_name,
             }
         )
+
+    # POST /api/v2/datasets/<id>/sldstyles/bulk/
+    @extend_schema(
+        summary="Crea varios estilos y los asocia al dataset",
+        request=BulkStylesRequest,
+        responses={
+            201: OpenApiResponse(
+                description="Todos los estilos fueron creados y asociados",
+                response=BulkStylesResponse,
+            ),
+            207: OpenApiResponse(
+                description="Algunos estilos no se pudieron crear",
+                response=BulkStylesResponse,
+            ),
+            400: OpenApiResponse(description="Solicitud o SLD inválidos"),
+            502: OpenApiResponse(description="GeoServer rechazó la operación"),
+        },
+        tags=["SLD Styles"],
+    )
+    @action(detail=False, methods=["post"], url_path="bulk")
+    def bulk_create(self, request, dataset_pk=None):
+        """
+        Crea varios estilos SLD en GeoServer y los asocia al dataset en una
+        sola solicitud.
+
+        Parámetros (multipart)
+        ----------------------
+        - `sld_files`: uno o más archivos SLD (el nombre del estilo es el
+          nombre del archivo sin extensión)
+        - `sld_zip`: zip con archivos `.sld` / `.xml`
+        - `overwrite`: si es "true", reemplaza el SLD de estilos existentes
+
+        Flujo interno
+        -------------
+        1. Verifica dataset y permisos de edición una sola vez.
+        2. Normaliza y valida todos los SLD en paralelo. Si alguno es
+           inválido responde 400 con el detalle por estilo y no toca GeoServer.
+        3. Crea cada estilo con su SLD en un solo POST (`raw=true`), de forma
+           concurrente sobre el pool de conexiones del cliente de GeoServer.
+        4. Asocia todos los estilos subidos con un solo PUT del layer, armado
+           con el layer leído de GeoServer (sin cache) justo antes. Si el PUT
+           falla, se borran los estilos recién creados.
+
+        Respuestas
+        ----------
+        HTTP 201
+            Todos los estilos se crearon y asociaron.
+
+        HTTP 207
+            Algunos estilos fallaron en GeoServer (`failed`); el resto sí
+            quedó creado y asociado.
+
+        HTTP 400
+            Falta de archivos, límites excedidos, nombres repetidos o SLD
+            inválidos (`errors` por estilo).
+
+        HTTP 502
+            Ningún estilo se pudo crear, o falló la actualización del layer.
+            En el segundo caso `removed` lista los estilos creados que se
+            borraron, `not_removed` los que no se pudieron borrar y
+            `overwritten` los existentes cuyo SLD ya se reemplazó.
+
+        Notas
+        -----
+        - Límites: `SIGIC_STYLES_BULK_MAX_FILES` y `SIGIC_STYLES_BULK_MAX_BYTES`.
+        """
+
+        dataset = self._get_dataset_or_404(dataset_pk)
+        layer_name = dataset.alternate
+        workspace = layer_name.split(":")[0]
+        self._check_edit_perm(dataset, request.user)
+
+        overwrite = str(request.data.get("overwrite", "")).lower() == "true"
+
+        # ---------------------------------------------
+        # 1) Leer, normalizar y validar
+        # ---------------------------------------------
+        try:
+            items = collect_uploads(
+                request.FILES.getlist("sld_files"), request.FILES.get("sld_zip")
+            )
+        except BulkUploadError as e:
+            return Response(
+                {"error": str(e)},
+                status=drf_status.HTTP_400_BAD_REQUEST,
+            )
+
+        prepared, errors = prepare_styles(items)
+        if errors:
+            return Response(
+                {"error": "Hay SLD inválidos; no se creó ningún estilo", "errors": errors},
+                status=drf_status.HTTP_400_BAD_REQUEST,
+            )
+
+        # ---------------------------------------------
+        # 2) Crear estilos con su SLD (concurrente)
+        # ---------------------------------------------
+        pushed, failed, created = push_styles(workspace, prepared, overwrite=overwrite)
+        for name in pushed:
+            invalidate_sld(workspace, name)
+
+        if not pushed:
+            return Response(
+                {"error": "GeoServer no aceptó ningún estilo", "failed": failed},
+                status=drf_status.HTTP_502_BAD_GATEWAY,
+            )
+
+        # ---------------------------------------------
+        # 3) Asociar todos al layer con un solo PUT (sobre el layer leído
+        #    sin cache); si falla se borran los estilos recién creados
+        # ---------------------------------------------
+        try:
+            plan_attach_styles(workspace, layer_name, pushed).run()
+        except PipelineError as e:
+            removed, not_removed = remove_styles(workspace, created)
+            for name in removed:
+                invalidate_sld(workspace, name, forget_location=True)
+            return _pipeline_error_response(
+                e,
+                "No se pudo asociar los estilos a la capa",
+                removed=removed,
+                not_removed=not_removed,
+                overwritten=[name for name in pushed if name not in created],
+                failed=failed,
+            )
+
+        return Response(
+            {
+                "message": "Estilos creados y asociados",
+                "layer": layer_name,
+                "created": pushed,
+                "failed": failed,
+            },
+            status=(
+                drf_status.HTTP_207_MULTI_STATUS
+                if failed
+                else drf_status.HTTP_201_CREATED
+            ),
+        )
+
+
+@extend_schema_view(
+    batch=extend_schema(
+        summary="Estilos de varios datasets en una sola llamada",
+        parameters=[
+            OpenApiParameter(
+                name="ids",
+                description="IDs de datasets separados por coma (GET)",
+                required=False,
+                type=str,
+            )
+        ],
+        request=BatchStylesRequest,
+        responses={
+            200: BatchStylesResponse,
+            400: OpenApiResponse(description="IDs inválidos o demasiados"),
+        },
+        tags=["SLD Styles"],
+    ),
+)
+class SigicSLDStyleBatchViewSet(ViewSet):
+    """
+    Consulta de estilos de muchos datasets a la vez, pensada para visores
+    que cargan varias capas: sustituye N llamadas a
+    `/datasets/<id>/sldstyles/` por una sola.
+    """
+
+    permission_classes = [AllowAny]
+
+    # GET  /api/v2/sldstyles/batch/?ids=1,2,3
+    # POST /api/v2/sldstyles/batch/  {"ids": [1, 2, 3]}
+    @action(detail=False, methods=["get", "post"], url_path="batch")
+    def batch(self, request):
+        """
+        Regresa el estilo por defecto y los estilos asociados de cada dataset.
+
+        Flujo interno
+        -------------
+        1. Filtra en una sola consulta los datasets que el usuario puede ver.
+        2. Lee los metadatos de todos los layers del cache (`get_many`) y
+           consulta GeoServer en paralelo solo para los que faltan.
+
+        Respuesta
+        ---------
+        HTTP 200
+            - ``results``: por dataset, en el orden pedido: ``dataset_id``,
+              ``layer``, ``default_style`` y ``styles`` (mismo formato que
+              `list`)
+            - ``errors``: datasets para los que GeoServer falló
+            - ``not_found``: IDs inexistentes o sin permiso de lectura
+
+        HTTP 400
+            IDs no numéricos o más de `SIGIC_STYLES_BATCH_MAX_DATASETS`.
+        """
+        raw = (
+            request.query_params.get("ids")
+            if request.method == "GET"
+            else request.data.get("ids")
+        )
+        try:
+            ids = _parse_dataset_ids(raw)
+        except (TypeError, ValueError):
+            return Response(
+                {"error": "'ids' debe ser una lista de enteros."},
+                status=drf_status.HTTP_400_BAD_REQUEST,
+            )
+
+        if not ids:
+            return Response(
+                {"error": "Debe incluir 'ids'."},
+                status=drf_status.HTTP_400_BAD_REQUEST,
+            )
+        if len(ids) > BATCH_MAX_DATASETS:
+            return Response(
+                {"error": f"Máximo {BATCH_MAX_DATASETS} datasets por solicitud."},
+                status=drf_status.HTTP_400_BAD_REQUEST,
+            )
+
+        datasets = _visible_datasets(ids, request.user)
+        metadata = get_layers_metadata(
+            list({dataset.alternate for dataset in datasets.values()})
+        )
+
+        results, errors, not_found = [], [], []
+        for dataset_id in ids:
+            dataset = datasets.get(dataset_id)
+            if dataset is None:
+                not_found.append(dataset_id)
+                continue
+
+            layer_metadata = metadata[dataset.alternate]
+            if isinstance(layer_metadata, Exception):
+                response = getattr(layer_metadata, "response", None)
+                errors.append(
+                    {
+                        "dataset_id": dataset_id,
+                        "layer": dataset.alternate,
+                        "error": "GeoServer no devolvió los estilos del layer",
+                        "gs_status": getattr(response, "status_code", None),
+                    }
+                )
+                continue
+
+            default_style = layer_metadata["default_style"]
+            if default_style and ":" in default_style:
+                default_style = default_style.split(":")[-1]
+
+            results.append(
+                {
+                    "dataset_id": dataset_id,
+                    "layer": dataset.alternate,
+                    "default_style": default_style,
+                    "styles": list(layer_metadata["styles"]),
+                }
+            )
+
+        return Response(
+            {"results": results, "errors": errors, "not_found": not_found}
+        )
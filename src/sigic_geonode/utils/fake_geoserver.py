@@ -0,0 +1,841 @@
+# ==============================================================================
+#  SIGIC – Sistema Integral de Gestión e Información Científica
+#
+#  Derechos patrimoniales: CentroGeo (2025)
+#
+#  Nota:
+#    Este código fue desarrollado para el proyecto SIGIC de
+#    CentroGeo. Se mantiene crédito de autoría, pero la titularidad del código
+#    pertenece a CentroGeo conforme a obra por encargo.
+#
+#  SPDX-License-Identifier: LicenseRef-SIGIC-CentroGeo
+# ==============================================================================
+
+"""
+GeoServer REST falso, en proceso, para pruebas y benchmarks sin GeoServer.
+
+Implementa en memoria el subconjunto de `/rest` que usa
+`utils.geoserver_client` (layers, estilos, workspaces y featuretypes), con
+respuestas JSON/XML con la misma forma que las de GeoServer 2.2x, incluidas
+sus rarezas (`{"styles": ""}` si no hay estilos, 403 al crear un estilo que
+ya existe o al borrar uno en uso).
+
+Para medir fan-out, cache y pooling de forma reproducible:
+- `latency` / `jitter`: segundos de espera por solicitud
+- `error_rate` / `error_status`: errores aleatorios (semilla fija, `seed`)
+- `fail(method, pattern, status, times)`: errores dirigidos por ruta
+- `calls()` / `reset_calls()`: bitácora de solicitudes recibidas
+
+Desde el test runner de Django:
+
+    with FakeGeoServer() as gs, gs.patch_client():
+        gs.add_layer("geonode:capa", styles=["geonode:capa_a"])
+        response = self.client.get("/api/v2/datasets/1/sldstyles/")
+        self.assertEqual(gs.count("GET", "/styles.json"), 1)
+
+`patch_client` apunta el cliente compartido (`geoserver_client.geoserver`)
+al servidor falso mientras dura el bloque. Desde un script de carga:
+
+    python -m sigic_geonode.utils.fake_geoserver --port 8089 \\
+        --layers 200 --styles-per-layer 5 --latency 0.02 --error-rate 0.01
+
+y `GEOSERVER_LOCATION=http://127.0.0.1:8089/geoserver/` en el entorno.
+"""
+
+import argparse
+import base64
+import json
+import random
+import re
+import threading
+import time
+import xml.etree.ElementTree as ET
+from collections import Counter
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+SLD_CONTENT_TYPE = "application/vnd.ogc.sld+xml"
+DEFAULT_DATASTORE = "sigic_geonode_data"
+
+EMPTY_SLD = (
+    '<?xml version="1.0" encoding="UTF-8"?>'
+    '<StyledLayerDescriptor version="1.0.0" '
+    'xmlns="http://www.opengis.net/sld" xmlns:ogc="http://www.opengis.net/ogc">'
+    "<NamedLayer><Name>{name}</Name><UserStyle><Name>{name}</Name>"
+    "<FeatureTypeStyle><Rule><PolygonSymbolizer><Fill>"
+    '<CssParameter name="fill">#888888</CssParameter>'
+    "</Fill></PolygonSymbolizer></Rule></FeatureTypeStyle>"
+    "</UserStyle></NamedLayer></StyledLayerDescriptor>"
+)
+
+
+class FakeResponse:
+    """Respuesta armada por las rutas: status, cuerpo y content type."""
+
+    def __init__(self, status: int = 200, body=b"", content_type: str = "text/plain"):
+        if isinstance(body, (dict, list)):
+            body = json.dumps(body)
+            content_type = "application/json"
+        if isinstance(body, str):
+            body = body.encode("utf-8")
+        self.status = status
+        self.body = body
+        self.content_type = content_type
+
+
+def _xml(element: ET.Element) -> FakeResponse:
+    return FakeResponse(200, ET.tostring(element, encoding="utf-8"), "application/xml")
+
+
+def _qualify(name: str, workspace: str = None) -> str:
+    if workspace and ":" not in name:
+        return f"{workspace}:{name}"
+    return name
+
+
+def _split(full_name: str):
+    if ":" in full_name:
+        return tuple(full_name.split(":", 1))
+    return None, full_name
+
+
+# -----------------------------
+# Estado en memoria
+# -----------------------------
+class GeoServerState:
+    """Catálogo en memoria. Todos los accesos pasan por `lock`."""
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.workspaces = {"geonode"}
+        self.styles = {}  # (workspace|None, nombre) -> sld bytes | None
+        self.layers = {}  # alternate -> {"default_style": str, "styles": [str]}
+        self.featuretypes = {}  # (workspace, datastore, nombre) -> dict
+
+    def add_style(self, workspace, name: str, sld=None) -> None:
+        if isinstance(sld, str):
+            sld = sld.encode("utf-8")
+        with self.lock:
+            if workspace:
+                self.workspaces.add(workspace)
+            self.styles[(workspace, name)] = sld
+
+    def add_layer(
+        self,
+        alternate: str,
+        styles=(),
+        default_style: str = None,
+        datastore: str = DEFAULT_DATASTORE,
+        attributes=("fid", "nombre", "valor"),
+    ) -> None:
+        """
+        Registra un layer con su featuretype. Los estilos que no existan se
+        crean con un SLD mínimo; sin `default_style` se usa `<alternate>`.
+        """
+        workspace, name = _split(alternate)
+        default_style = default_style or alternate
+        with self.lock:
+            self.workspaces.add(workspace)
+            for full_name in (default_style, *styles):
+                key = _split(full_name)
+                if key not in self.styles:
+                    self.add_style(*key, EMPTY_SLD.format(name=key[1]))
+
+            self.layers[alternate] = {
+                "default_style": default_style,
+                "styles": [s for s in styles if s != default_style],
+            }
+            self.featuretypes[(workspace, datastore, name)] = _featuretype(
+                workspace, datastore, name, attributes
+            )
+
+    def layers_using(self, full_name: str) -> list:
+        return [
+            alternate
+            for alternate, layer in self.layers.items()
+            if layer["default_style"] == full_name or full_name in layer["styles"]
+        ]
+
+
+def _featuretype(workspace: str, datastore: str, name: str, attributes) -> dict:
+    bbox = {"minx": -118.4, "maxx": -86.7, "miny": 14.5, "maxy": 32.7}
+    return {
+        "featureType": {
+            "name": name,
+            "nativeName": name,
+            "namespace": {"name": workspace},
+            "title": name,
+            "srs": "EPSG:4326",
+            "nativeBoundingBox": {**bbox, "crs": "EPSG:4326"},
+            "latLonBoundingBox": {**bbox, "crs": "EPSG:4326"},
+            "projectionPolicy": "FORCE_DECLARED",
+            "enabled": True,
+            "store": {
+                "@class": "dataStore",
+                "name": f"{workspace}:{datastore}",
+            },
+            "attributes": {
+                "attribute": [
+                    {
+                        "name": attribute,
+                        "minOccurs": 0,
+                        "maxOccurs": 1,
+                        "nillable": True,
+                        "binding": "java.lang.String",
+                    }
+                    for attribute in (*attributes, "the_geom")
+                ]
+            },
+        }
+    }
+
+
+# -----------------------------
+# Rutas
+# -----------------------------
+class Routes:
+    """Implementación de cada endpoint sobre un `GeoServerState`."""
+
+    def __init__(self, state: GeoServerState, base_url: str):
+        self.state = state
+        self.base_url = base_url
+        self.table = [
+            ("GET", r"workspaces\.(json|xml)", self.list_workspaces),
+            ("POST", r"workspaces", self.create_workspace),
+            ("GET", r"layers/(?P<alt>[^/]+)/styles\.(json|xml)", self.get_layer_styles),
+            ("POST", r"layers/(?P<alt>[^/]+)/styles", self.add_layer_style),
+            ("GET", r"layers/(?P<alt>[^/]+)\.(?P<fmt>json|xml)", self.get_layer),
+            ("PUT", r"layers/(?P<alt>[^/]+?)(\.(?P<fmt>json|xml))?", self.put_layer),
+            (
+                "GET",
+                r"(workspaces/(?P<ws>[^/]+)/)?styles/(?P<name>[^/]+)\."
+                r"(?P<fmt>json|xml|sld)",
+                self.get_style,
+            ),
+            ("POST", r"(workspaces/(?P<ws>[^/]+)/)?styles", self.create_style),
+            (
+                "PUT",
+                r"(workspaces/(?P<ws>[^/]+)/)?styles/(?P<name>[^/.]+)",
+                self.put_style,
+            ),
+            (
+                "DELETE",
+                r"(workspaces/(?P<ws>[^/]+)/)?styles/(?P<name>[^/.]+)",
+                self.delete_style,
+            ),
+            (
+                "GET",
+                r"workspaces/(?P<ws>[^/]+)/datastores/(?P<ds>[^/]+)"
+                r"/featuretypes/(?P<name>[^/]+)\.json",
+                self.get_featuretype,
+            ),
+            (
+                "PUT",
+                r"workspaces/(?P<ws>[^/]+)/datastores/(?P<ds>[^/]+)"
+                r"/featuretypes/(?P<name>[^/]+)\.json",
+                self.put_featuretype,
+            ),
+        ]
+        self.table = [
+            (method, re.compile(pattern), handler)
+            for method, pattern, handler in self.table
+        ]
+
+    def dispatch(self, method: str, path: str, query: dict, body: bytes, ctype: str):
+        for route_method, pattern, handler in self.table:
+            if route_method != method:
+                continue
+            match = pattern.fullmatch(path)
+            if match:
+                params = {k: v for k, v in match.groupdict().items() if v is not None}
+                return handler(query=query, body=body, ctype=ctype, **params)
+        return FakeResponse(404, f"No such resource: {method} /rest/{path}")
+
+    def _href(self, path: str) -> str:
+        return f"{self.base_url}/rest/{path}"
+
+    # -- workspaces --
+    def list_workspaces(self, **_):
+        with self.state.lock:
+            names = sorted(self.state.workspaces)
+        return FakeResponse(
+            200,
+            {
+                "workspaces": {
+                    "workspace": [
+                        {"name": n, "href": self._href(f"workspaces/{n}.json")}
+                        for n in names
+                    ]
+                }
+            },
+        )
+
+    def create_workspace(self, body, ctype, **_):
+        if "json" in ctype:
+            name = json.loads(body or b"{}").get("workspace", {}).get("name")
+        else:
+            name = ET.fromstring(body).findtext("name")
+        if not name:
+            return FakeResponse(400, "Workspace name required")
+        with self.state.lock:
+            if name in self.state.workspaces:
+                return FakeResponse(409, f"Workspace '{name}' already exists")
+            self.state.workspaces.add(name)
+        return FakeResponse(201, name)
+
+    # -- layers --
+    def _layer(self, alt: str):
+        return self.state.layers.get(alt)
+
+    def _style_ref(self, full_name: str) -> dict:
+        workspace, name = _split(full_name)
+        ref = {"name": full_name}
+        if workspace:
+            ref["workspace"] = workspace
+            ref["href"] = self._href(f"workspaces/{workspace}/styles/{name}.json")
+        else:
+            ref["href"] = self._href(f"styles/{name}.json")
+        return ref
+
+    def get_layer(self, alt, fmt, **_):
+        with self.state.lock:
+            layer = self._layer(alt)
+            if layer is None:
+                return FakeResponse(404, f"No such layer: {alt}")
+            default_style, styles = layer["default_style"], list(layer["styles"])
+
+        workspace, name = _split(alt)
+        resource_href = self._href(
+            f"workspaces/{workspace}/datastores/{DEFAULT_DATASTORE}"
+            f"/featuretypes/{name}.json"
+        )
+        if fmt == "json":
+            data = {
+                "name": name,
+                "type": "VECTOR",
+                "defaultStyle": self._style_ref(default_style),
+                "resource": {
+                    "@class": "featureType",
+                    "name": alt,
+                    "href": resource_href,
+                },
+                "attribution": {"logoWidth": 0, "logoHeight": 0},
+                "dateCreated": "2025-01-01 00:00:00.0 UTC",
+            }
+            if styles:
+                data["styles"] = {
+                    "@class": "linked-hash-set",
+                    "style": [self._style_ref(s) for s in styles],
+                }
+            return FakeResponse(200, {"layer": data})
+
+        root = ET.Element("layer")
+        ET.SubElement(root, "name").text = name
+        ET.SubElement(root, "type").text = "VECTOR"
+        root.append(self._style_element("defaultStyle", default_style))
+        if styles:
+            styles_node = ET.SubElement(root, "styles", {"class": "linked-hash-set"})
+            for style in styles:
+                styles_node.append(self._style_element("style", style))
+        resource = ET.SubElement(root, "resource", {"class": "featureType"})
+        ET.SubElement(resource, "name").text = alt
+        ET.SubElement(root, "enabled").text = "true"
+        return _xml(root)
+
+    def _style_element(self, tag: str, full_name: str) -> ET.Element:
+        element = ET.Element(tag)
+        ET.SubElement(element, "name").text = full_name
+        workspace, _ = _split(full_name)
+        if workspace:
+            ET.SubElement(element, "workspace").text = workspace
+        return element
+
+    def get_layer_styles(self, alt, **_):
+        with self.state.lock:
+            layer = self._layer(alt)
+            if layer is None:
+                return FakeResponse(404, f"No such layer: {alt}")
+            styles = list(layer["styles"])
+        if not styles:
+            return FakeResponse(200, {"styles": ""})
+        return FakeResponse(
+            200, {"styles": {"style": [self._style_ref(s) for s in styles]}}
+        )
+
+    def _parse_layer_update(self, body: bytes, ctype: str, fmt: str):
+        """Regresa `(default_style | None, styles | None)` del cuerpo del PUT."""
+        if fmt == "json" or (fmt is None and "json" in ctype):
+            data = json.loads(body or b"{}").get("layer", {})
+            default = data.get("defaultStyle")
+            default = (
+                _qualify(default["name"], default.get("workspace")) if default else None
+            )
+            styles = None
+            if "styles" in data:
+                items = (data["styles"] or {}).get("style", [])
+                if isinstance(items, dict):
+                    items = [items]
+                styles = [_qualify(s["name"], s.get("workspace")) for s in items]
+            return default, styles
+
+        root = ET.fromstring(body)
+        default_node = root.find("defaultStyle")
+        default = None
+        if default_node is not None and default_node.findtext("name"):
+            default = _qualify(
+                default_node.findtext("name"), default_node.findtext("workspace")
+            )
+        styles_node = root.find("styles")
+        styles = None
+        if styles_node is not None:
+            styles = [
+                _qualify(s.findtext("name"), s.findtext("workspace"))
+                for s in styles_node.findall("style")
+            ]
+        return default, styles
+
+    def _missing_styles(self, names) -> list:
+        return [n for n in names if _split(n) not in self.state.styles]
+
+    def put_layer(self, alt, body, ctype, fmt=None, **_):
+        try:
+            default, styles = self._parse_layer_update(body, ctype, fmt)
+        except (ValueError, ET.ParseError, KeyError, TypeError) as e:
+            return FakeResponse(400, f"Could not parse layer: {e}")
+
+        with self.state.lock:
+            layer = self._layer(alt)
+            if layer is None:
+                return FakeResponse(404, f"No such layer: {alt}")
+            missing = self._missing_styles([n for n in [default, *(styles or [])] if n])
+            if missing:
+                return FakeResponse(400, f"No such style: {missing[0]}")
+            if default:
+                layer["default_style"] = default
+            if styles is not None:
+                layer["styles"] = list(dict.fromkeys(styles))
+        return FakeResponse(200)
+
+    def add_layer_style(self, alt, body, **_):
+        try:
+            full_name = ET.fromstring(body).findtext("name")
+        except ET.ParseError as e:
+            return FakeResponse(400, f"Could not parse style: {e}")
+
+        with self.state.lock:
+            layer = self._layer(alt)
+            if layer is None:
+                return FakeResponse(404, f"No such layer: {alt}")
+            # GeoServer resuelve nombres sin workspace contra el del layer
+            workspace, _ = _split(alt)
+            candidates = [_qualify(full_name, workspace), full_name]
+            found = [c for c in candidates if _split(c) in self.state.styles]
+            if not found:
+                return FakeResponse(404, f"No such style: {full_name}")
+            if found[0] not in layer["styles"]:
+                layer["styles"].append(found[0])
+        return FakeResponse(201, full_name)
+
+    # -- estilos --
+    def get_style(self, name, fmt, ws=None, **_):
+        with self.state.lock:
+            if (ws, name) not in self.state.styles:
+                return FakeResponse(404, f"No such style: {name}")
+            sld = self.state.styles[(ws, name)]
+
+        if fmt == "sld":
+            if sld is None:
+                return FakeResponse(404, f"No SLD for style: {name}")
+            return FakeResponse(200, sld, SLD_CONTENT_TYPE)
+
+        info = {
+            "name": name,
+            "format": "sld",
+            "languageVersion": {"version": "1.0.0"},
+            "filename": f"{name}.sld",
+        }
+        if ws:
+            info["workspace"] = {"name": ws}
+        if fmt == "json":
+            return FakeResponse(200, {"style": info})
+
+        root = ET.Element("style")
+        ET.SubElement(root, "name").text = name
+        if ws:
+            ET.SubElement(ET.SubElement(root, "workspace"), "name").text = ws
+        ET.SubElement(root, "format").text = "sld"
+        ET.SubElement(ET.SubElement(root, "languageVersion"), "version").text = "1.0.0"
+        ET.SubElement(root, "filename").text = f"{name}.sld"
+        return _xml(root)
+
+    def create_style(self, query, body, ctype, ws=None, **_):
+        if ws and ws not in self.state.workspaces:
+            return FakeResponse(404, f"No such workspace: {ws}")
+
+        if "sld" in ctype:
+            # POST con el SLD en el cuerpo: ?name=<nombre>[&raw=true]
+            name = query.get("name")
+            sld = body
+            if not name:
+                return FakeResponse(400, "Style name required (?name=)")
+            if query.get("raw") != "true":
+                try:
+                    ET.fromstring(body)
+                except ET.ParseError as e:
+                    return FakeResponse(400, f"Invalid SLD: {e}")
+        else:
+            try:
+                name = ET.fromstring(body).findtext("name")
+            except ET.ParseError as e:
+                return FakeResponse(400, f"Could not parse style: {e}")
+            sld = None
+
+        with self.state.lock:
+            if (ws, name) in self.state.styles:
+                return FakeResponse(403, f"Style {name} already exists.")
+            self.state.styles[(ws, name)] = sld
+        return FakeResponse(201, name)
+
+    def put_style(self, query, body, ctype, name, ws=None, **_):
+        if "sld" not in ctype:
+            return FakeResponse(415, f"Unsupported content type: {ctype}")
+        if query.get("raw") != "true":
+            try:
+                ET.fromstring(body)
+            except ET.ParseError as e:
+                return FakeResponse(400, f"Invalid SLD: {e}")
+
+        with self.state.lock:
+            if (ws, name) not in self.state.styles:
+                return FakeResponse(404, f"No such style: {name}")
+            self.state.styles[(ws, name)] = body
+        return FakeResponse(200)
+
+    def delete_style(self, query, name, ws=None, **_):
+        with self.state.lock:
+            if (ws, name) not in self.state.styles:
+                return FakeResponse(404, f"No such style: {name}")
+            in_use = self.state.layers_using(_qualify(name, ws))
+            if in_use and query.get("recurse") != "true":
+                return FakeResponse(
+                    403, f"Can't delete style referenced by existing layers: {in_use}"
+                )
+            for alternate in in_use:
+                layer = self.state.layers[alternate]
+                layer["styles"] = [
+                    s for s in layer["styles"] if s != _qualify(name, ws)
+                ]
+            del self.state.styles[(ws, name)]
+        return FakeResponse(200)
+
+    # -- featuretypes --
+    def get_featuretype(self, ws, ds, name, **_):
+        with self.state.lock:
+            featuretype = self.state.featuretypes.get((ws, ds, name))
+            if featuretype is None:
+                return FakeResponse(404, f"No such feature type: {ws},{ds},{name}")
+            return FakeResponse(200, featuretype)
+
+    def put_featuretype(self, query, body, ws, ds, name, **_):
+        try:
+            update = json.loads(body or b"{}").get("featureType", {})
+        except ValueError as e:
+            return FakeResponse(400, f"Could not parse feature type: {e}")
+
+        with self.state.lock:
+            featuretype = self.state.featuretypes.get((ws, ds, name))
+            if featuretype is None:
+                return FakeResponse(404, f"No such feature type: {ws},{ds},{name}")
+            featuretype["featureType"].update(update)
+            if query.get("recalculate"):
+                featuretype["featureType"]["recalculated"] = query["recalculate"]
+        return FakeResponse(200)
+
+
+# -----------------------------
+# Servidor HTTP
+# -----------------------------
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, como GeoServer detrás de Tomcat
+    server_version = "FakeGeoServer"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _handle(self):
+        fake = self.server.fake
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+
+        # Autenticación básica, como el /rest de GeoServer
+        if not fake.authorized(self.headers.get("Authorization", "")):
+            self.send_response(401)
+            self.send_header("WWW-Authenticate", 'Basic realm="GeoServer Realm"')
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        response = fake.handle(
+            self.command, self.path, body, self.headers.get("Content-Type", "")
+        )
+
+        self.send_response(response.status)
+        self.send_header("Content-Type", response.content_type)
+        self.send_header("Content-Length", str(len(response.body)))
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(response.body)
+
+    do_GET = do_POST = do_PUT = do_DELETE = do_HEAD = _handle
+
+
+class FakeGeoServer:
+    """
+    Servidor REST falso en un hilo propio, en un puerto libre de localhost
+    (o `port`). Se usa como context manager o con `start()` / `stop()`.
+    """
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        error_rate: float = 0.0,
+        error_status: int = 503,
+        seed: int = 0,
+        user: str = "admin",
+        password: str = "geoserver",
+    ):
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.user = user
+        self.password = password
+
+        self.state = GeoServerState()
+        self._random = random.Random(seed)
+        self._random_lock = threading.Lock()
+        self._failures = []  # [method, regex, status, restantes | None]
+        self._calls = []
+        self._calls_lock = threading.Lock()
+        self._server = None
+        self._thread = None
+        self.routes = None
+
+    # -- ciclo de vida --
+    @property
+    def url(self) -> str:
+        """LOCATION del servidor falso, con `/` final como en OGC_SERVER."""
+        return f"http://{self.host}:{self.port}/geoserver/"
+
+    def start(self) -> "FakeGeoServer":
+        self._server = ThreadingHTTPServer((self.host, self.port), _Handler)
+        self._server.daemon_threads = True
+        self._server.fake = self
+        self.port = self._server.server_address[1]
+        self.routes = Routes(self.state, self.url.rstrip("/"))
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, name="fake-geoserver", daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._thread.join()
+            self._server = None
+
+    def __enter__(self) -> "FakeGeoServer":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    def serve_forever(self) -> None:
+        if self._server is None:
+            self.start()
+        try:
+            self._thread.join()
+        except KeyboardInterrupt:
+            self.stop()
+
+    @contextmanager
+    def patch_client(self, client=None):
+        """
+        Apunta un `GeoServerClient` (por defecto el compartido) a este
+        servidor, sin reintentos, y lo restaura al salir.
+        """
+        if client is None:
+            from sigic_geonode.utils.geoserver_client import geoserver as client
+
+        saved = (client._location, client._user, client._password, client.max_retries)
+        client.close()
+        client._location, client._user, client._password = (
+            self.url,
+            self.user,
+            self.password,
+        )
+        client.max_retries = 0
+        try:
+            yield client
+        finally:
+            client.close()
+            (
+                client._location,
+                client._user,
+                client._password,
+                client.max_retries,
+            ) = saved
+
+    # -- datos --
+    def add_layer(self, alternate: str, **kwargs) -> None:
+        self.state.add_layer(alternate, **kwargs)
+
+    def add_style(self, workspace, name: str, sld=None) -> None:
+        self.state.add_style(workspace, name, sld)
+
+    def seed(self, layers: int, styles_per_layer: int = 3, workspace: str = "geonode"):
+        """Crea `layers` capas `capa_NNNN` con `styles_per_layer` estilos cada una."""
+        for i in range(layers):
+            alternate = f"{workspace}:capa_{i:04d}"
+            styles = [f"{alternate}__estilo_{j}" for j in range(styles_per_layer)]
+            self.add_layer(alternate, styles=styles)
+
+    # -- inyección de fallas --
+    def fail(self, method: str, pattern: str, status: int = 500, times: int = None):
+        """
+        Responde `status` a las solicitudes `method` cuya ruta (relativa a
+        `/rest/`) contenga `pattern` (regex). `times=None` es permanente.
+        """
+        self._failures.append([method.upper(), re.compile(pattern), status, times])
+
+    def clear_failures(self) -> None:
+        self._failures.clear()
+
+    def _injected_failure(self, method: str, path: str):
+        for failure in self._failures:
+            route_method, pattern, status, remaining = failure
+            if route_method != method or not pattern.search(path):
+                continue
+            if remaining is not None:
+                if remaining <= 0:
+                    continue
+                failure[3] = remaining - 1
+            return FakeResponse(status, f"Injected failure: {method} {path}")
+
+        if self.error_rate:
+            with self._random_lock:
+                hit = self._random.random() < self.error_rate
+            if hit:
+                return FakeResponse(self.error_status, "Injected random failure")
+        return None
+
+    # -- bitácora --
+    def calls(self, method: str = None, contains: str = None) -> list:
+        """Solicitudes recibidas como `(método, ruta)`, en orden de llegada."""
+        with self._calls_lock:
+            calls = list(self._calls)
+        return [
+            (m, p)
+            for m, p in calls
+            if (method is None or m == method) and (contains is None or contains in p)
+        ]
+
+    def count(self, method: str = None, contains: str = None) -> int:
+        return len(self.calls(method, contains))
+
+    def summary(self) -> Counter:
+        """Conteo por método y ruta sin nombres concretos (útil en benchmarks)."""
+        return Counter(
+            (m, re.sub(r"[^/]+:[^/.]+", "<alternate>", p)) for m, p in self.calls()
+        )
+
+    def reset_calls(self) -> None:
+        with self._calls_lock:
+            self._calls.clear()
+
+    # -- despacho --
+    def authorized(self, header: str) -> bool:
+        expected = base64.b64encode(f"{self.user}:{self.password}".encode()).decode()
+        return header == f"Basic {expected}"
+
+    def handle(
+        self, method: str, raw_path: str, body: bytes, ctype: str
+    ) -> FakeResponse:
+        url = urlsplit(raw_path)
+        query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        path = url.path
+
+        with self._calls_lock:
+            self._calls.append((method, path))
+
+        if self.latency or self.jitter:
+            with self._random_lock:
+                extra = self._random.uniform(0, self.jitter) if self.jitter else 0.0
+            time.sleep(self.latency + extra)
+
+        prefix = "/geoserver/rest/"
+        if not path.startswith(prefix):
+            return FakeResponse(404, f"Not found: {path}")
+        path = path.removeprefix(prefix)
+
+        injected = self._injected_failure(method, path)
+        if injected is not None:
+            return injected
+
+        try:
+            return self.routes.dispatch(
+                "GET" if method == "HEAD" else method, path, query, body, ctype
+            )
+        except Exception as e:  # como GeoServer: 500 con el mensaje
+            return FakeResponse(500, f"{type(e).__name__}: {e}")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(
+        description="GeoServer REST falso para pruebas de carga sin GeoServer."
+    )
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--layers", type=int, default=50, help="capas a crear")
+    parser.add_argument("--styles-per-layer", type=int, default=3)
+    parser.add_argument("--latency", type=float, default=0.0, help="segundos")
+    parser.add_argument("--jitter", type=float, default=0.0, help="segundos extra máx.")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="0.0 a 1.0")
+    parser.add_argument("--error-status", type=int, default=503)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--user", default="admin")
+    parser.add_argument("--password", default="geoserver")
+    args = parser.parse_args(argv)
+
+    fake = FakeGeoServer(
+        host=args.host,
+        port=args.port,
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+        seed=args.seed,
+        user=args.user,
+        password=args.password,
+    )
+    fake.seed(args.layers, args.styles_per_layer)
+    fake.start()
+    print(
+        f"GeoServer falso en {fake.url} ({args.layers} capas, "
+        f"{args.styles_per_layer} estilos c/u). Ctrl+C para terminar.",
+        flush=True,
+    )
+    fake.serve_forever()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
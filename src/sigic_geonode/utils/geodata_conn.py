@@ -1,11 +1,223 @@
+"""
+Pool de conexiones a la base de datos geográfica (`geonode_data`).
+
+Cada proceso (worker de gunicorn o de Celery) crea su propio
+`ThreadedConnectionPool` al primer uso y lo vuelve a crear tras un fork, de
+modo que las conexiones nunca se comparten entre procesos ni entre hilos:
+cada bloque toma una conexión del pool y la devuelve al terminar.
+
+    from sigic_geonode.utils.geodata_conn import geodata
+
+    with geodata.cursor() as cur:
+        cur.execute("SELECT ...")
+
+    with geodata.connection(statement_timeout=600_000) as conn:
+        with conn.cursor() as cur:
+            ...
+
+Al salir del bloque se hace `commit`; si hubo excepción, `rollback`.
+
+- Tamaño por proceso: `GEODATA_POOL_MIN` / `GEODATA_POOL_MAX`. El máximo
+  total contra PostgreSQL es `workers × GEODATA_POOL_MAX`.
+- `GEODATA_POOL_TIMEOUT`: segundos de espera por una conexión libre antes
+  de lanzar `PoolError`.
+- Credenciales: `settings.DATABASES["geonode_data"]` si existe; si no, las
+  variables `GEONODE_GEODATABASE*` y `DATABASE_HOST`/`DATABASE_PORT`.
+- `GEODATA_STATEMENT_TIMEOUT_MS`: `statement_timeout` de cada conexión
+  (0 = sin límite). `connection(statement_timeout=...)` lo fija a nivel de
+  sesión, de modo que sigue vigente tras los `commit` intermedios de un
+  bloque, y se restablece al devolver la conexión al pool.
+- Las conexiones que estuvieron inactivas más de
+  `GEODATA_HEALTHCHECK_INTERVAL` segundos se prueban con `SELECT 1` antes de
+  entregarse; las rotas se descartan y se abre otra.
+"""
+
+import logging
 import os
+import threading
+import time
+from contextlib import contextmanager
+
+import psycopg2
+from django.conf import settings
+from psycopg2.pool import PoolError, ThreadedConnectionPool
+
+logger = logging.getLogger(__name__)
+
+GEODATA_POOL_MIN = int(os.getenv("GEODATA_POOL_MIN", "1"))
+GEODATA_POOL_MAX = int(os.getenv("GEODATA_POOL_MAX", "5"))
+GEODATA_POOL_TIMEOUT = float(os.getenv("GEODATA_POOL_TIMEOUT", "30"))
+GEODATA_CONNECT_TIMEOUT = int(os.getenv("GEODATA_CONNECT_TIMEOUT", "10"))
+GEODATA_STATEMENT_TIMEOUT_MS = int(os.getenv("GEODATA_STATEMENT_TIMEOUT_MS", "300000"))
+GEODATA_HEALTHCHECK_INTERVAL = float(os.getenv("GEODATA_HEALTHCHECK_INTERVAL", "30"))
+
+
+def _connect_kwargs() -> dict:
+    db = getattr(settings, "DATABASES", {}).get("geonode_data")
+    if db:
+        credentials = {
+            "database": db.get("NAME", ""),
+            "user": db.get("USER", ""),
+            "password": db.get("PASSWORD", ""),
+            "host": db.get("HOST", ""),
+            "port": db.get("PORT", ""),
+        }
+    else:
+        credentials = {
+            "database": os.getenv("GEONODE_GEODATABASE", ""),
+            "user": os.getenv("GEONODE_GEODATABASE_USER", ""),
+            "password": os.getenv("GEONODE_GEODATABASE_PASSWORD", ""),
+            "host": os.getenv("DATABASE_HOST", ""),
+            "port": os.getenv("DATABASE_PORT", ""),
+        }
+    return {
+        **credentials,
+        "connect_timeout": GEODATA_CONNECT_TIMEOUT,
+        "application_name": "sigic_geonode",
+        "options": f"-c statement_timeout={GEODATA_STATEMENT_TIMEOUT_MS}",
+    }
+
+
+class GeodataPool:
+    def __init__(
+        self,
+        minconn: int = GEODATA_POOL_MIN,
+        maxconn: int = GEODATA_POOL_MAX,
+        timeout: float = GEODATA_POOL_TIMEOUT,
+        healthcheck_interval: float = GEODATA_HEALTHCHECK_INTERVAL,
+    ):
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.healthcheck_interval = healthcheck_interval
+
+        self._lock = threading.Lock()
+        self._pool = None
+        self._pid = None
+        self._slots = None
+        self._last_used = {}
+
+    @property
+    def pool(self) -> ThreadedConnectionPool:
+        """Pool del proceso actual; se recrea tras un fork."""
+        pid = os.getpid()
+        if self._pool is not None and self._pid == pid:
+            return self._pool
+
+        with self._lock:
+            if self._pool is None or self._pid != pid:
+                # Tras un fork no se cierran las conexiones heredadas: son
+                # del proceso padre
+                self._pool = ThreadedConnectionPool(
+                    self.minconn, self.maxconn, **_connect_kwargs()
+                )
+                self._slots = threading.BoundedSemaphore(self.maxconn)
+                self._last_used = {}
+                self._pid = pid
+            return self._pool
+
+    def close(self) -> None:
+        with self._lock:
+            if self._pool is not None and self._pid == os.getpid():
+                self._pool.closeall()
+            self._pool = None
+            self._pid = None
+
+    def _healthy(self, conn) -> bool:
+        if conn.closed:
+            return False
+        last_used = self._last_used.get(id(conn), 0)
+        if time.monotonic() - last_used < self.healthcheck_interval:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error as e:
+            logger.warning(f"[geodata] conexión descartada: {e}")
+            return False
+
+    def _checkout(self):
+        pool = self.pool
+        # ThreadedConnectionPool no espera: falla en cuanto se agota
+        if not self._slots.acquire(timeout=self.timeout):
+            raise PoolError(
+                f"Sin conexiones libres a geodata tras {self.timeout}s "
+                f"(GEODATA_POOL_MAX={self.maxconn})"
+            )
+        try:
+            for _ in range(self.maxconn + 1):
+                conn = pool.getconn()
+                if self._healthy(conn):
+                    return conn
+                self._last_used.pop(id(conn), None)
+                pool.putconn(conn, close=True)
+            raise PoolError("No se pudo obtener una conexión sana a geodata")
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def _checkin(self, conn) -> None:
+        try:
+            if conn.closed:
+                self._last_used.pop(id(conn), None)
+            else:
+                self._last_used[id(conn)] = time.monotonic()
+            self.pool.putconn(conn, close=bool(conn.closed))
+        finally:
+            self._slots.release()
+
+    @contextmanager
+    def connection(self, statement_timeout: int = None):
+        """
+        Conexión del pool dentro de una transacción: `commit` al salir,
+        `rollback` si hubo excepción. `statement_timeout` (ms) aplica a todo
+        el bloque, incluidas las transacciones posteriores a un `commit`
+        intermedio.
+        """
+        conn = self._checkout()
+        try:
+            if statement_timeout is not None:
+                # SET de sesión (no LOCAL): SET LOCAL se pierde en el primer
+                # commit y los joins por lotes hacen uno por lote
+                with conn.cursor() as cur:
+                    cur.execute("SET statement_timeout = %s", [statement_timeout])
+                conn.commit()
+            yield conn
+            conn.commit()
+        except BaseException:
+            if not conn.closed:
+                try:
+                    conn.rollback()
+                except psycopg2.Error:
+                    pass
+            raise
+        finally:
+            if statement_timeout is not None:
+                self._reset_session(conn)
+            self._checkin(conn)
+
+    @staticmethod
+    def _reset_session(conn) -> None:
+        """Vuelve al `statement_timeout` con el que se abrió la conexión."""
+        if conn.closed:
+            return
+        try:
+            with conn.cursor() as cur:
+                cur.execute("RESET statement_timeout")
+            conn.commit()
+        except psycopg2.Error as e:
+            # Una conexión con el timeout de otro bloque no vuelve al pool
+            logger.warning(f"[geodata] no se pudo restablecer la sesión: {e}")
+            conn.close()
+
+    @contextmanager
+    def cursor(self, statement_timeout: int = None):
+        """Atajo: cursor sobre una conexión de `connection()`."""
+        with self.connection(statement_timeout) as conn:
+            with conn.cursor() as cur:
+                yield cur
 
-from psycopg2 import connect
 
-connection = connect(
-    database=os.getenv("GEONODE_GEODATABASE", ""),
-    user=os.getenv("GEONODE_GEODATABASE_USER", ""),
-    password=os.getenv("GEONODE_GEODATABASE_PASSWORD", ""),
-    host=os.getenv("DATABASE_HOST", ""),
-    port=os.getenv("DATABASE_PORT", ""),
-)
+geodata = GeodataPool()
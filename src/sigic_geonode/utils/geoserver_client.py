@@ -0,0 +1,362 @@
+# ==============================================================================
+#  SIGIC – Sistema Integral de Gestión e Información Científica
+#
+#  Derechos patrimoniales: CentroGeo (2025)
+#
+#  Nota:
+#    Este código fue desarrollado para el proyecto SIGIC de
+#    CentroGeo. Se mantiene crédito de autoría, pero la titularidad del código
+#    pertenece a CentroGeo conforme a obra por encargo.
+#
+#  SPDX-License-Identifier: LicenseRef-SIGIC-CentroGeo
+# ==============================================================================
+
+"""
+Cliente REST de GeoServer compartido por los módulos SIGIC.
+
+Cada proceso (worker de gunicorn o de Celery) mantiene una sola
+`requests.Session` con pool de conexiones keep-alive y la autenticación
+básica ya configurada, en lugar de abrir una conexión nueva por llamada.
+
+- Timeouts por defecto: `GEOSERVER_CONNECT_TIMEOUT` / `GEOSERVER_READ_TIMEOUT`.
+- Pool: `GEOSERVER_POOL_SIZE` conexiones por host.
+- Reintentos acotados (`GEOSERVER_MAX_RETRIES`, backoff exponencial
+  `GEOSERVER_RETRY_BACKOFF`) solo para métodos idempotentes
+  (GET/HEAD/PUT) ante errores de conexión o 502/503/504.
+
+Los helpers regresan el `requests.Response` tal cual: cada vista decide
+qué status acepta y cómo reportar el error, igual que antes.
+
+`gather` ejecuta llamadas independientes en un pool de hilos acotado
+(`GEOSERVER_FANOUT_WORKERS`), de modo que la latencia es la de la llamada
+más lenta y no la suma.
+"""
+
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+GEOSERVER_CONNECT_TIMEOUT = float(os.getenv("GEOSERVER_CONNECT_TIMEOUT", "5"))
+GEOSERVER_READ_TIMEOUT = float(os.getenv("GEOSERVER_READ_TIMEOUT", "30"))
+GEOSERVER_POOL_SIZE = int(os.getenv("GEOSERVER_POOL_SIZE", "10"))
+GEOSERVER_MAX_RETRIES = int(os.getenv("GEOSERVER_MAX_RETRIES", "3"))
+GEOSERVER_RETRY_BACKOFF = float(os.getenv("GEOSERVER_RETRY_BACKOFF", "0.3"))
+GEOSERVER_FANOUT_WORKERS = int(os.getenv("GEOSERVER_FANOUT_WORKERS", "8"))
+
+# DELETE ?purge=true no se reintenta: si el primer intento sí llegó,
+# el reintento responde 404 y reportaríamos un error falso.
+RETRY_METHODS = frozenset(["GET", "HEAD", "PUT"])
+RETRY_STATUS = (502, 503, 504)
+
+SLD_CONTENT_TYPE = "application/vnd.ogc.sld+xml"
+
+
+class GeoServerClient:
+    def __init__(
+        self,
+        location: str = None,
+        user: str = None,
+        password: str = None,
+        timeout=(GEOSERVER_CONNECT_TIMEOUT, GEOSERVER_READ_TIMEOUT),
+        pool_size: int = GEOSERVER_POOL_SIZE,
+        max_retries: int = GEOSERVER_MAX_RETRIES,
+        backoff: float = GEOSERVER_RETRY_BACKOFF,
+        fanout_workers: int = GEOSERVER_FANOUT_WORKERS,
+    ):
+        # Sin argumentos se toma settings.OGC_SERVER["default"] al primer uso
+        self._location = location
+        self._user = user
+        self._password = password
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.fanout_workers = fanout_workers
+
+        self._lock = threading.Lock()
+        self._session = None
+        self._pid = None
+        self._executor = None
+        self._executor_pid = None
+        self._local = threading.local()
+
+    # -----------------------------
+    # Configuración y sesión
+    # -----------------------------
+    def _ogc_server(self) -> dict:
+        from django.conf import settings
+
+        return settings.OGC_SERVER["default"]
+
+    @property
+    def base_url(self) -> str:
+        location = self._location or self._ogc_server()["LOCATION"]
+        return location.rstrip("/")
+
+    @property
+    def session(self) -> requests.Session:
+        """
+        Sesión del proceso actual. Se recrea tras un fork (prefork de
+        Celery, `--preload` de gunicorn) para no compartir sockets.
+        """
+        pid = os.getpid()
+        if self._session is not None and self._pid == pid:
+            return self._session
+
+        with self._lock:
+            if self._session is None or self._pid != pid:
+                self._session = self._build_session()
+                self._pid = pid
+            return self._session
+
+    def _build_session(self) -> requests.Session:
+        if self._user is not None:
+            auth = (self._user, self._password)
+        else:
+            gs = self._ogc_server()
+            auth = (gs["USER"], gs["PASSWORD"])
+
+        retry = Retry(
+            total=self.max_retries,
+            connect=self.max_retries,
+            read=self.max_retries,
+            status=self.max_retries,
+            backoff_factor=self.backoff,
+            status_forcelist=RETRY_STATUS,
+            allowed_methods=RETRY_METHODS,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(
+            pool_connections=self.pool_size,
+            pool_maxsize=self.pool_size,
+            max_retries=retry,
+        )
+
+        session = requests.Session()
+        session.auth = auth
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
+
+    def close(self):
+        with self._lock:
+            if self._session is not None:
+                self._session.close()
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+            self._session = None
+            self._pid = None
+            self._executor = None
+            self._executor_pid = None
+
+    # -----------------------------
+    # Fan-out concurrente
+    # -----------------------------
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        pid = os.getpid()
+        if self._executor is not None and self._executor_pid == pid:
+            return self._executor
+
+        with self._lock:
+            if self._executor is None or self._executor_pid != pid:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.fanout_workers,
+                    thread_name_prefix="geoserver-fanout",
+                )
+                self._executor_pid = pid
+            return self._executor
+
+    def _in_pool(self, call):
+        self._local.in_pool = True
+        try:
+            return call()
+        finally:
+            self._local.in_pool = False
+
+    def gather(self, *calls) -> list:
+        """
+        Ejecuta callables independientes de forma concurrente y regresa sus
+        resultados en el mismo orden. Si alguno falla se relanza su excepción.
+
+        El primero corre en el hilo actual. Dentro de un hilo del pool las
+        llamadas se hacen en serie, para que un `gather` anidado no pueda
+        bloquear el pool esperando trabajo encolado detrás de sí mismo.
+        """
+        if len(calls) <= 1 or getattr(self._local, "in_pool", False):
+            return [call() for call in calls]
+
+        futures = [self.executor.submit(self._in_pool, call) for call in calls[1:]]
+        try:
+            first = calls[0]()
+        finally:
+            wait(futures)
+        return [first, *(f.result() for f in futures)]
+
+    def request(self, method: str, path: str, **kwargs) -> requests.Response:
+        """`path` es relativo a LOCATION, p.ej. `rest/layers/geonode:capa.json`."""
+        kwargs.setdefault("timeout", self.timeout)
+        url = f"{self.base_url}/{path.lstrip('/')}"
+        response = self.session.request(method, url, **kwargs)
+        logger.debug(
+            "[geoserver] %s %s -> %s (%.3fs)",
+            method,
+            url,
+            response.status_code,
+            response.elapsed.total_seconds(),
+        )
+        return response
+
+    def get(self, path: str, **kwargs) -> requests.Response:
+        return self.request("GET", path, **kwargs)
+
+    def post(self, path: str, **kwargs) -> requests.Response:
+        return self.request("POST", path, **kwargs)
+
+    def put(self, path: str, **kwargs) -> requests.Response:
+        return self.request("PUT", path, **kwargs)
+
+    def delete(self, path: str, **kwargs) -> requests.Response:
+        return self.request("DELETE", path, **kwargs)
+
+    # -----------------------------
+    # Layers
+    # -----------------------------
+    def get_layer(self, alternate: str, fmt: str = "json") -> requests.Response:
+        """GET /rest/layers/<alternate>.<fmt>"""
+        return self.get(f"rest/layers/{alternate}.{fmt}")
+
+    def put_layer(self, alternate: str, body, fmt: str = "xml") -> requests.Response:
+        """
+        PUT /rest/layers/<alternate>. `body` es XML (bytes/str) si fmt="xml"
+        o un dict si fmt="json".
+        """
+        if fmt == "json":
+            return self.put(f"rest/layers/{alternate}", json=body)
+        return self.put(
+            f"rest/layers/{alternate}.xml",
+            data=body,
+            headers={"Content-Type": "application/xml"},
+        )
+
+    def get_layer_styles(self, alternate: str) -> requests.Response:
+        """GET /rest/layers/<alternate>/styles.json"""
+        return self.get(f"rest/layers/{alternate}/styles.json")
+
+    def add_layer_style(self, alternate: str, style_name: str) -> requests.Response:
+        """POST /rest/layers/<alternate>/styles: asocia un estilo existente."""
+        return self.post(
+            f"rest/layers/{alternate}/styles",
+            data=f"<style><name>{style_name}</name></style>",
+            headers={"Content-Type": "application/xml"},
+        )
+
+    # -----------------------------
+    # Styles
+    # -----------------------------
+    def create_style(self, workspace: str, name: str) -> requests.Response:
+        """POST /rest/workspaces/<ws>/styles: crea la entrada (sin SLD)."""
+        wrapper = f"<style><name>{name}</name><filename>{name}.sld</filename></style>"
+        return self.post(
+            f"rest/workspaces/{workspace}/styles",
+            data=wrapper,
+            headers={"Content-Type": "text/xml"},
+        )
+
+    def create_style_with_body(
+        self, workspace: str, name: str, sld_body, raw: bool = True
+    ) -> requests.Response:
+        """
+        POST /rest/workspaces/<ws>/styles?name=<name> con el SLD en el
+        cuerpo: crea la entrada y sube el contenido en una sola llamada.
+        `raw=True` guarda el SLD tal cual, sin que GeoServer lo re-codifique.
+        """
+        if isinstance(sld_body, str):
+            sld_body = sld_body.encode("utf-8")
+        params = {"name": name}
+        if raw:
+            params["raw"] = "true"
+        return self.post(
+            f"rest/workspaces/{workspace}/styles",
+            data=sld_body,
+            params=params,
+            headers={"Content-Type": SLD_CONTENT_TYPE},
+        )
+
+    def upload_style(
+        self, workspace: str, name: str, sld_body, raw: bool = False
+    ) -> requests.Response:
+        """
+        PUT /rest/workspaces/<ws>/styles/<name>: sube o reemplaza el SLD.
+        `raw=True` lo guarda tal cual (ya validado localmente).
+        """
+        if isinstance(sld_body, str):
+            sld_body = sld_body.encode("utf-8")
+        return self.put(
+            f"rest/workspaces/{workspace}/styles/{name}",
+            data=sld_body,
+            params={"raw": "true"} if raw else None,
+            headers={"Content-Type": SLD_CONTENT_TYPE},
+        )
+
+    def get_style(
+        self, workspace: str, name: str, fmt: str = "xml"
+    ) -> requests.Response:
+        """
+        GET /rest/workspaces/<ws>/styles/<name>.<fmt>. Con `workspace=None`
+        consulta el estilo global (/rest/styles/<name>.<fmt>).
+        """
+        if workspace:
+            return self.get(f"rest/workspaces/{workspace}/styles/{name}.{fmt}")
+        return self.get(f"rest/styles/{name}.{fmt}")
+
+    def get_style_sld(self, workspace: str, name: str) -> requests.Response:
+        """SLD del estilo: primero en el workspace, luego global."""
+        r = self.get_style(workspace, name, fmt="sld")
+        if r.status_code == 404 and workspace:
+            r = self.get_style(None, name, fmt="sld")
+        return r
+
+    def delete_style(
+        self, workspace: str, name: str, purge: bool = True
+    ) -> requests.Response:
+        """DELETE /rest/workspaces/<ws>/styles/<name>[?purge=true]"""
+        params = {"purge": "true"} if purge else None
+        return self.delete(f"rest/workspaces/{workspace}/styles/{name}", params=params)
+
+    # -----------------------------
+    # Feature types
+    # -----------------------------
+    def get_featuretype(
+        self, workspace: str, datastore: str, name: str
+    ) -> requests.Response:
+        """GET /rest/workspaces/<ws>/datastores/<ds>/featuretypes/<name>.json"""
+        return self.get(
+            f"rest/workspaces/{workspace}/datastores/{datastore}"
+            f"/featuretypes/{name}.json"
+        )
+
+    def put_featuretype(
+        self, workspace: str, datastore: str, name: str, body: dict, recalculate=None
+    ) -> requests.Response:
+        """
+        PUT del featureType en JSON. `recalculate` acepta p.ej.
+        "nativebbox,latlonbbox".
+        """
+        params = {"recalculate": recalculate} if recalculate else None
+        return self.put(
+            f"rest/workspaces/{workspace}/datastores/{datastore}"
+            f"/featuretypes/{name}.json",
+            json=body,
+            params=params,
+        )
+
+
+geoserver = GeoServerClient()
@@ -0,0 +1,367 @@
+# ==============================================================================
+#  SIGIC – Sistema Integral de Gestión e Información Científica
+#
+#  Derechos patrimoniales: CentroGeo (2025)
+#
+#  Nota:
+#    Este código fue desarrollado para el proyecto SIGIC de
+#    CentroGeo. Se mantiene crédito de autoría, pero la titularidad del código
+#    pertenece a CentroGeo conforme a obra por encargo.
+#
+#  SPDX-License-Identifier: LicenseRef-SIGIC-CentroGeo
+# ==============================================================================
+
+"""
+Benchmark de validación y normalización de SLD (`sld_utils`).
+
+Corre sin GeoServer ni Django: genera SLD sintéticos y mide cada etapa
+(`validate_sld_before_post`, `needs_fix`, `fix_sld`, `normalize_mixed_sld`,
+`normalize_sld` y el flujo completo de las vistas) por escenario.
+
+Escenarios: número de reglas × sabor del documento
+- `sld10`: SLD 1.0.0 limpio (no requiere cambios)
+- `se11`: SLD 1.1.0 con elementos se:, como lo exporta QGIS
+- `mixed`: raíz SLD 1.0.0 con elementos se: mezclados
+
+Por etapa se reporta la mediana de tiempo, el throughput (MB/s) y el pico
+de memoria medido con `tracemalloc` en una corrida aparte. `tracemalloc`
+solo ve memoria de Python: lo que reserva libxml2 no aparece.
+
+Uso:
+
+    python -m sigic_geonode.utils.sld_benchmark
+    python -m sigic_geonode.utils.sld_benchmark --save-baseline base.json
+    python -m sigic_geonode.utils.sld_benchmark --baseline base.json --threshold 0.25
+
+Con `--baseline` el proceso termina con código 1 si alguna etapa es más
+lenta (o usa más memoria) que la línea base por encima del umbral. Los
+tiempos dependen de la máquina: compárese siempre en el mismo equipo. El
+pico de memoria no, así que `--memory-threshold` puede ser más estricto.
+
+`sld_benchmark_baseline.json` es la línea base fija que usa la prueba de
+`sigic_styles.tests` (escenarios de `GATE_RULES`): umbral de tiempo amplio,
+para detectar solo regresiones de orden (p. ej. cuadráticas), y umbral
+estricto de memoria. Se regenera con:
+
+    python -m sigic_geonode.utils.sld_benchmark --rules 100 1000 \
+        --save-baseline src/sigic_geonode/utils/sld_benchmark_baseline.json
+"""
+
+import argparse
+import json
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+import lxml
+
+from sigic_geonode.utils import sld_utils
+from sigic_geonode.utils.sld_utils import InvalidSLDError, SLDNeedsNormalization
+
+FLAVORS = ("sld10", "se11", "mixed")
+DEFAULT_RULES = (10, 100, 1000, 5000)
+
+# Diferencias de memoria menores a esto se consideran ruido
+MEMORY_NOISE_BYTES = 64 * 1024
+
+# Escenarios y umbrales de la prueba contra `sld_benchmark_baseline.json`
+BASELINE_PATH = Path(__file__).with_name("sld_benchmark_baseline.json")
+GATE_RULES = (100, 1000)
+GATE_THRESHOLD = 3.0
+GATE_MEMORY_THRESHOLD = 0.25
+
+
+# -----------------------------
+# Generadores de SLD sintéticos
+# -----------------------------
+def _rule(i: int, p: str, css: str, field: str, label: str) -> str:
+    """Una regla con filtro, símbolo de polígono y etiqueta."""
+    return (
+        f"<{p}Rule>"
+        f"<{p}Name>rango_{i}</{p}Name>"
+        f"<{p}Title>Rango {i}</{p}Title>"
+        "<ogc:Filter><ogc:And>"
+        "<ogc:PropertyIsGreaterThanOrEqualTo>"
+        f"<ogc:PropertyName>{field}</ogc:PropertyName><ogc:Literal>{i * 100}</ogc:Literal>"
+        "</ogc:PropertyIsGreaterThanOrEqualTo>"
+        "<ogc:PropertyIsLessThan>"
+        f"<ogc:PropertyName>{field}</ogc:PropertyName><ogc:Literal>{(i + 1) * 100}</ogc:Literal>"
+        "</ogc:PropertyIsLessThan>"
+        "</ogc:And></ogc:Filter>"
+        f"<{p}PolygonSymbolizer>"
+        f'<{p}Fill><{p}{css} name="fill">#{i * 2654435761 % 0xFFFFFF:06x}</{p}{css}></{p}Fill>'
+        f"<{p}Stroke>"
+        f'<{p}{css} name="stroke">#232323</{p}{css}>'
+        f'<{p}{css} name="stroke-width">0.26</{p}{css}>'
+        f"</{p}Stroke>"
+        f"</{p}PolygonSymbolizer>"
+        f"<{p}TextSymbolizer>"
+        f"<{p}Label><ogc:PropertyName>{label}</ogc:PropertyName></{p}Label>"
+        f'<{p}Font><{p}{css} name="font-size">10</{p}{css}></{p}Font>'
+        f"</{p}TextSymbolizer>"
+        f"</{p}Rule>"
+    )
+
+
+def generate_sld(rules: int, flavor: str = "se11") -> bytes:
+    """
+    SLD sintético con `rules` reglas. `flavor` es uno de `FLAVORS`.
+    El tamaño crece linealmente con `rules` (~900 bytes por regla).
+    """
+    if flavor not in FLAVORS:
+        raise ValueError(f"flavor debe ser uno de {FLAVORS}")
+
+    if flavor == "sld10":
+        # Ya normalizado: campos en minúsculas y sin <Name> vacíos
+        version, p, css = "1.0.0", "sld:", "CssParameter"
+        extra_ns = ""
+        field, label = "pob_total", "nomgeo"
+        else_rule = f"<{p}Rule><{p}ElseFilter/></{p}Rule>"
+    else:
+        # Como lo exporta QGIS
+        version = "1.1.0" if flavor == "se11" else "1.0.0"
+        p, css = "se:", "SvgParameter"
+        extra_ns = f' xmlns:se="{sld_utils.SE_NS_URI}"'
+        field, label = "POB_TOTAL", "NOMGEO"
+        else_rule = f"<{p}Rule><{p}Name></{p}Name><{p}ElseFilter/></{p}Rule>"
+
+    body = "".join(_rule(i, p, css, field, label) for i in range(rules))
+
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>'
+        f'<sld:StyledLayerDescriptor version="{version}"'
+        f' xmlns:sld="{sld_utils.SLD_NS_URI}"'
+        f' xmlns:ogc="{sld_utils.OGC_NS_URI}"'
+        f' xmlns:xlink="{sld_utils.XLINK_NS_URI}"{extra_ns}>'
+        "<sld:NamedLayer><sld:Name>benchmark</sld:Name>"
+        "<sld:UserStyle><sld:Name>benchmark</sld:Name>"
+        f"<{p}FeatureTypeStyle>{body}{else_rule}</{p}FeatureTypeStyle>"
+        "</sld:UserStyle></sld:NamedLayer>"
+        "</sld:StyledLayerDescriptor>"
+    ).encode("utf-8")
+
+
+# -----------------------------
+# Etapas
+# -----------------------------
+def _validate(sld: bytes):
+    # Las excepciones esperadas (se11 / mixed) son parte del costo medido
+    try:
+        sld_utils.validate_sld_before_post(sld)
+    except (InvalidSLDError, SLDNeedsNormalization):
+        pass
+
+
+def _pipeline(sld: bytes):
+    """Lo que hacen las vistas `create`/`update`: normalizar y validar el árbol."""
+    normalized = sld_utils.normalize_sld(sld)
+    try:
+        sld_utils.validate_sld_before_post(normalized.root)
+    except (InvalidSLDError, SLDNeedsNormalization):
+        pass
+    return normalized.body
+
+
+STAGES = {
+    "validate_sld_before_post": _validate,
+    "needs_fix": sld_utils.needs_fix,
+    "fix_sld": sld_utils.fix_sld,
+    "normalize_mixed_sld": sld_utils.normalize_mixed_sld,
+    "normalize_sld": sld_utils.normalize_sld,
+    "pipeline": _pipeline,
+}
+
+
+def _time_stage(func, sld: bytes, repeat: int, min_time: float) -> list:
+    """Tiempos por llamada; al menos `repeat` corridas y `min_time` segundos."""
+    func(sld)  # calentamiento
+    timings = []
+    started = time.perf_counter()
+    while len(timings) < repeat or time.perf_counter() - started < min_time:
+        t0 = time.perf_counter()
+        func(sld)
+        timings.append(time.perf_counter() - t0)
+    return timings
+
+
+def _peak_memory(func, sld: bytes) -> int:
+    tracemalloc.start()
+    try:
+        func(sld)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak
+
+
+def run(
+    rules=DEFAULT_RULES,
+    flavors=FLAVORS,
+    stages=None,
+    repeat: int = 5,
+    min_time: float = 0.2,
+) -> dict:
+    """Corre todos los escenarios y regresa los resultados como dict."""
+    stages = stages or list(STAGES)
+    results = {}
+
+    for flavor in flavors:
+        for n in rules:
+            sld = generate_sld(n, flavor)
+            scenario = f"{flavor}-{n}"
+            for stage in stages:
+                func = STAGES[stage]
+                timings = _time_stage(func, sld, repeat, min_time)
+                median = statistics.median(timings)
+                results[f"{scenario}/{stage}"] = {
+                    "flavor": flavor,
+                    "rules": n,
+                    "bytes": len(sld),
+                    "runs": len(timings),
+                    "median_ms": median * 1000,
+                    "min_ms": min(timings) * 1000,
+                    "mb_per_s": len(sld) / median / 1e6 if median else None,
+                    "peak_bytes": _peak_memory(func, sld),
+                }
+
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "lxml": lxml.__version__,
+            "machine": platform.machine(),
+            "repeat": repeat,
+            "min_time": min_time,
+        },
+        "results": results,
+    }
+
+
+def compare(
+    current: dict, baseline: dict, threshold: float, memory_threshold: float = None
+) -> list:
+    """
+    Regresa las regresiones: etapas cuya mediana de tiempo o pico de
+    memoria supera la línea base en más de `threshold` (0.25 = 25 %).
+    `memory_threshold`, si se da, sustituye a `threshold` para la memoria,
+    que no depende de la máquina y admite un umbral más estricto.
+    Los escenarios que no están en la línea base se ignoran.
+    """
+    if memory_threshold is None:
+        memory_threshold = threshold
+    regressions = []
+    base_results = baseline.get("results", {})
+
+    for key, result in current["results"].items():
+        base = base_results.get(key)
+        if not base:
+            continue
+
+        if result["median_ms"] > base["median_ms"] * (1 + threshold):
+            regressions.append(
+                f"{key}: {result['median_ms']:.2f} ms vs {base['median_ms']:.2f} ms"
+            )
+
+        peak, base_peak = result["peak_bytes"], base["peak_bytes"]
+        if (
+            peak > base_peak * (1 + memory_threshold)
+            and peak - base_peak > MEMORY_NOISE_BYTES
+        ):
+            regressions.append(
+                f"{key}: pico {peak / 1024:.0f} KiB vs {base_peak / 1024:.0f} KiB"
+            )
+
+    return regressions
+
+
+def format_table(report: dict) -> str:
+    lines = [
+        f"{'escenario':<14} {'etapa':<26} {'KiB':>8} {'mediana ms':>11} "
+        f"{'MB/s':>8} {'pico KiB':>9}"
+    ]
+    for key, r in report["results"].items():
+        scenario, stage = key.split("/", 1)
+        lines.append(
+            f"{scenario:<14} {stage:<26} {r['bytes'] / 1024:>8.1f} "
+            f"{r['median_ms']:>11.3f} {r['mb_per_s'] or 0:>8.1f} "
+            f"{r['peak_bytes'] / 1024:>9.0f}"
+        )
+    return "\n".join(lines)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m sigic_geonode.utils.sld_benchmark",
+        description="Benchmark de validación y normalización de SLD.",
+    )
+    parser.add_argument(
+        "--rules",
+        type=int,
+        nargs="+",
+        default=list(DEFAULT_RULES),
+        help="Número de reglas por escenario",
+    )
+    parser.add_argument("--flavors", nargs="+", choices=FLAVORS, default=list(FLAVORS))
+    parser.add_argument("--stages", nargs="+", choices=list(STAGES))
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument(
+        "--min-time",
+        type=float,
+        default=0.2,
+        help="Segundos mínimos de medición por etapa",
+    )
+    parser.add_argument("--json", metavar="PATH", help="Escribe el reporte en JSON")
+    parser.add_argument(
+        "--save-baseline", metavar="PATH", help="Guarda el reporte como línea base"
+    )
+    parser.add_argument(
+        "--baseline", metavar="PATH", help="Compara contra una línea base"
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.25,
+        help="Regresión tolerada sobre la línea base (0.25 = 25%%)",
+    )
+    parser.add_argument(
+        "--memory-threshold",
+        type=float,
+        help="Regresión tolerada en el pico de memoria (por omisión, --threshold)",
+    )
+    args = parser.parse_args(argv)
+
+    report = run(
+        rules=args.rules,
+        flavors=args.flavors,
+        stages=args.stages,
+        repeat=args.repeat,
+        min_time=args.min_time,
+    )
+    print(format_table(report))
+
+    for path in (args.json, args.save_baseline):
+        if path:
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(report, f, indent=2, sort_keys=True)
+
+    if not args.baseline:
+        return 0
+
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+
+    regressions = compare(report, baseline, args.threshold, args.memory_threshold)
+    if regressions:
+        print(f"\nRegresiones (umbral {args.threshold:.0%}):", file=sys.stderr)
+        for line in regressions:
+            print(f"  {line}", file=sys.stderr)
+        return 1
+
+    print(f"\nSin regresiones (umbral {args.threshold:.0%}).")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,321 @@
+# ==============================================================================
+#  SIGIC – Sistema Integral de Gestión e Información Científica
+#
+#  Derechos patrimoniales: CentroGeo (2025)
+#
+#  Nota:
+#    Este código fue desarrollado para el proyecto SIGIC de
+#    CentroGeo. Se mantiene crédito de autoría, pero la titularidad del código
+#    pertenece a CentroGeo conforme a obra por encargo.
+#
+#  SPDX-License-Identifier: LicenseRef-SIGIC-CentroGeo
+# ==============================================================================
+
+"""
+Validación local de SLD contra los XSD de OGC (SLD 1.0.0 y SLD 1.1.0 / SE 1.1.0).
+
+Los XSD viven en `SIGIC_SLD_SCHEMAS_DIR` (por defecto `utils/schemas/`),
+con la misma ruta que en schemas.opengis.net. Un `etree.Resolver` redirige
+ahí los `schemaLocation` absolutos (filter, gml, xlink...), así que la
+compilación nunca sale a la red.
+
+Cada `XMLSchema` compilado se construye una sola vez por proceso y se
+reutiliza. Para poblar el directorio (p.ej. al construir la imagen):
+
+    python -m sigic_geonode.utils.sld_schema fetch
+    python -m sigic_geonode.utils.sld_schema check
+
+Ambos comandos salen con error si algún XSD no se descarga o no compila;
+el Dockerfile ejecuta `fetch` para que la imagen no se construya sin ellos.
+
+`SIGIC_SLD_SCHEMA_VALIDATION`:
+- `strict` (defecto): un SLD que no cumple el XSD se rechaza
+- `warn`: solo se registra en el log
+- `off`: no se valida
+
+Si aun así faltan los XSD, la carga de estilos no se bloquea, pero en modo
+`strict` cada SLD aceptado sin validar queda registrado como error.
+
+Las `VendorOption` de GeoServer (que QGIS también exporta) no están en los
+XSD de OGC; se quitan de una copia del documento antes de validar.
+"""
+
+import copy
+import logging
+import os
+import sys
+import threading
+from pathlib import Path
+from urllib.parse import urljoin, urlsplit
+
+from lxml import etree
+
+from sigic_geonode.utils.sld_utils import InvalidSLDError
+
+logger = logging.getLogger(__name__)
+
+SCHEMAS_DIR = Path(
+    os.getenv("SIGIC_SLD_SCHEMAS_DIR", Path(__file__).resolve().parent / "schemas")
+)
+SCHEMA_VALIDATION = os.getenv("SIGIC_SLD_SCHEMA_VALIDATION", "strict").lower()
+SCHEMA_MAX_ERRORS = int(os.getenv("SIGIC_SLD_SCHEMA_MAX_ERRORS", "20"))
+
+VALIDATION_STRICT = "strict"
+VALIDATION_WARN = "warn"
+VALIDATION_OFF = "off"
+
+# Punto de entrada por versión del SLD
+SCHEMA_URLS = {
+    "1.0.0": "http://schemas.opengis.net/sld/1.0.0/StyledLayerDescriptor.xsd",
+    "1.1.0": "http://schemas.opengis.net/sld/1.1.0/StyledLayerDescriptor.xsd",
+}
+
+# Hosts que se sirven desde SCHEMAS_DIR (host -> subdirectorio)
+SCHEMA_HOSTS = {
+    "schemas.opengis.net": "",
+    "www.w3.org": "w3c",
+}
+
+_XSD_NS = "http://www.w3.org/2001/XMLSchema"
+
+
+class SLDSchemaError(InvalidSLDError):
+    """El SLD no cumple el XSD. `errors` trae línea, columna y mensaje."""
+
+    def __init__(self, message: str, errors: list):
+        super().__init__(message)
+        self.errors = errors
+
+
+class SchemaUnavailable(Exception):
+    """No están los XSD en SCHEMAS_DIR (o no compilan)."""
+
+    pass
+
+
+def local_path(url: str, schemas_dir: Path = None):
+    """Ruta local de un XSD remoto conocido, o None."""
+    parts = urlsplit(url)
+    if parts.scheme not in ("http", "https") or parts.netloc not in SCHEMA_HOSTS:
+        return None
+    subdir = SCHEMA_HOSTS[parts.netloc]
+    return (schemas_dir or SCHEMAS_DIR) / subdir / parts.path.lstrip("/")
+
+
+class _LocalSchemaResolver(etree.Resolver):
+    def __init__(self, schemas_dir: Path):
+        super().__init__()
+        self.schemas_dir = schemas_dir
+
+    def resolve(self, url, pubid, context):
+        path = local_path(url, self.schemas_dir)
+        if path is None:
+            return None
+        if not path.is_file():
+            raise SchemaUnavailable(f"Falta el XSD {url} en {self.schemas_dir}")
+        return self.resolve_filename(str(path), context)
+
+
+def _schema_parser(schemas_dir: Path) -> etree.XMLParser:
+    parser = etree.XMLParser(no_network=True, resolve_entities=False)
+    parser.resolvers.add(_LocalSchemaResolver(schemas_dir))
+    return parser
+
+
+def compile_schema(version: str, schemas_dir: Path = None) -> etree.XMLSchema:
+    """Compila el XSD de la versión dada desde `schemas_dir`."""
+    schemas_dir = schemas_dir or SCHEMAS_DIR
+    url = SCHEMA_URLS.get(version)
+    if url is None:
+        raise SchemaUnavailable(f"Versión de SLD sin XSD: {version}")
+
+    path = local_path(url, schemas_dir)
+    if not path.is_file():
+        raise SchemaUnavailable(f"Falta el XSD {url} en {schemas_dir}")
+
+    try:
+        doc = etree.parse(str(path), parser=_schema_parser(schemas_dir))
+        return etree.XMLSchema(doc)
+    except (etree.XMLSyntaxError, etree.XMLSchemaParseError) as e:
+        raise SchemaUnavailable(f"No se pudo compilar {url}: {e}") from e
+
+
+# -----------------------------
+# Cache por proceso
+# -----------------------------
+_schemas = {}
+_unavailable = set()
+_compile_lock = threading.Lock()
+# El error_log vive en el objeto XMLSchema: una validación a la vez por schema
+_validate_locks = {version: threading.Lock() for version in SCHEMA_URLS}
+
+
+def get_schema(version: str):
+    """
+    `XMLSchema` compilado para `version`, o None si los XSD no están
+    disponibles (se avisa una sola vez por proceso).
+    """
+    schema = _schemas.get(version)
+    if schema is not None or version in _unavailable:
+        return schema
+
+    with _compile_lock:
+        if version in _schemas or version in _unavailable:
+            return _schemas.get(version)
+        try:
+            _schemas[version] = compile_schema(version)
+        except SchemaUnavailable as e:
+            logger.warning(f"[sld_schema] validación XSD omitida: {e}")
+            _unavailable.add(version)
+        return _schemas.get(version)
+
+
+def _schema_errors(error_log) -> list:
+    return [
+        {"line": e.line, "column": e.column, "message": e.message}
+        for e in list(error_log)[:SCHEMA_MAX_ERRORS]
+    ]
+
+
+def _without_vendor_options(root):
+    """
+    Copia de `root` sin `VendorOption` (de cualquier namespace), o `root`
+    mismo si no tiene. La copia conserva los números de línea.
+    """
+    options = list(root.iter("{*}VendorOption"))
+    if not options:
+        return root
+    root = copy.deepcopy(root)
+    for option in list(root.iter("{*}VendorOption")):
+        option.getparent().remove(option)
+    return root
+
+
+def validate_sld_schema(xml, mode: str = None) -> list:
+    """
+    Valida un SLD (bytes, str o árbol ya parseado) contra el XSD de su
+    versión. Regresa la lista de errores (vacía si es válido o si no hay
+    XSD para esa versión).
+
+    Raises:
+        SLDSchemaError: En modo `strict`, si el SLD no cumple el XSD
+        InvalidSLDError: Si el documento no es XML bien formado
+    """
+    mode = (mode or SCHEMA_VALIDATION).lower()
+    if mode == VALIDATION_OFF:
+        return []
+
+    if isinstance(xml, (bytes, str)):
+        try:
+            root = etree.fromstring(
+                xml.encode("utf-8") if isinstance(xml, str) else xml,
+                parser=etree.XMLParser(resolve_entities=False, no_network=True),
+            )
+        except etree.XMLSyntaxError as e:
+            raise InvalidSLDError(f"XML inválido: {e}") from e
+    else:
+        root = xml
+
+    version = root.get("version") or "1.0.0"
+    schema = get_schema(version)
+    if schema is None:
+        if mode == VALIDATION_STRICT and version in SCHEMA_URLS:
+            logger.error(
+                f"[sld_schema] SLD {version} aceptado SIN validar: faltan los XSD"
+                f" en {SCHEMAS_DIR} (python -m sigic_geonode.utils.sld_schema fetch)"
+            )
+        return []
+
+    with _validate_locks[version]:
+        if schema.validate(_without_vendor_options(root)):
+            return []
+        errors = _schema_errors(schema.error_log)
+
+    if mode == VALIDATION_STRICT:
+        first = errors[0]
+        raise SLDSchemaError(
+            f"El SLD no cumple el XSD de SLD {version} "
+            f"(línea {first['line']}: {first['message']})",
+            errors,
+        )
+
+    logger.warning(
+        f"[sld_schema] SLD no cumple el XSD de SLD {version}: {len(errors)} error(es)"
+    )
+    return errors
+
+
+# -----------------------------
+# Descarga de XSD (línea de comandos)
+# -----------------------------
+def _schema_references(content: bytes):
+    root = etree.fromstring(
+        content, parser=etree.XMLParser(resolve_entities=False, no_network=True)
+    )
+    for tag in ("import", "include", "redefine"):
+        for el in root.iter(f"{{{_XSD_NS}}}{tag}"):
+            location = el.get("schemaLocation")
+            if location:
+                yield location
+
+
+def fetch_schemas(schemas_dir: Path = None, timeout: float = 30) -> list:
+    """
+    Descarga los XSD de `SCHEMA_URLS` y todos los que importan o incluyen
+    a `schemas_dir`. Regresa las rutas escritas.
+    """
+    import requests
+
+    schemas_dir = schemas_dir or SCHEMAS_DIR
+    pending = list(SCHEMA_URLS.values())
+    seen = set()
+    written = []
+
+    with requests.Session() as session:
+        while pending:
+            url = pending.pop()
+            path = local_path(url, schemas_dir)
+            if url in seen or path is None:
+                continue
+            seen.add(url)
+
+            r = session.get(url, timeout=timeout)
+            r.raise_for_status()
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_bytes(r.content)
+            written.append(path)
+
+            for location in _schema_references(r.content):
+                pending.append(urljoin(url, location))
+
+    return written
+
+
+def main(argv=None) -> int:
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        prog="python -m sigic_geonode.utils.sld_schema",
+        description="Administra los XSD de SLD usados en la validación local.",
+    )
+    parser.add_argument("command", choices=("fetch", "check"))
+    parser.add_argument("--dir", type=Path, default=SCHEMAS_DIR)
+    args = parser.parse_args(argv)
+
+    if args.command == "fetch":
+        for path in fetch_schemas(args.dir):
+            print(path.relative_to(args.dir))
+
+    status = 0
+    for version in SCHEMA_URLS:
+        try:
+            compile_schema(version, args.dir)
+            print(f"SLD {version}: OK")
+        except SchemaUnavailable as e:
+            print(f"SLD {version}: {e}", file=sys.stderr)
+            status = 1
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,114 +1,392 @@
+"""
+Normalización y validación de SLD antes de enviarlos a GeoServer.
+
+GeoServer pierde colores y filtros cuando recibe SLD 1.1.0 / SE (QGIS los
+exporta así). `normalize_sld` los convierte a SLD 1.0.0 en un solo recorrido
+del árbol (lxml iterparse), sin regex sobre el documento completo. Las
+exportaciones de QGIS (prefijo `se:` y SvgParameter) se reescriben antes con
+reemplazos de bytes, para no renombrar cada elemento desde Python.
+"""
+
+import io
 import re
+from typing import NamedTuple
 
+from lxml import etree
 
-OGC_NS = 'xmlns:ogc="http://www.opengis.net/ogc"'
-SLD_NS = 'xmlns:sld="http://www.opengis.net/sld"'
+SLD_NS_URI = "http://www.opengis.net/sld"
+SE_NS_URI = "http://www.opengis.net/se"
+OGC_NS_URI = "http://www.opengis.net/ogc"
+XLINK_NS_URI = "http://www.w3.org/1999/xlink"
+XSI_NS_URI = "http://www.w3.org/2001/XMLSchema-instance"
 
+SLD_1_0_SCHEMA_LOCATION = (
+    f"{SLD_NS_URI} http://schemas.opengis.net/sld/1.0.0/StyledLayerDescriptor.xsd"
+)
 
-def _get_root_tag(xml: str) -> str:
-    m = re.search(r"<(?:sld:)?StyledLayerDescriptor\b[^>]*>", xml)
-    return m.group(0) if m else ""
+# Prefijos que QGIS y otros editores usan a veces sin declarar
+KNOWN_PREFIXES = {
+    "sld": SLD_NS_URI,
+    "se": SE_NS_URI,
+    "ogc": OGC_NS_URI,
+    "xlink": XLINK_NS_URI,
+    "xsi": XSI_NS_URI,
+}
 
+ROOT_NSMAP = {
+    "sld": SLD_NS_URI,
+    "ogc": OGC_NS_URI,
+    "xlink": XLINK_NS_URI,
+    "xsi": XSI_NS_URI,
+}
 
-def needs_fix(xml: str) -> bool:
-    """Detecta si un SLD requiere corrección (QGIS, SLD 1.1.0, etc.)."""
-    if isinstance(xml, bytes):
-        xml = xml.decode("utf-8")
-    root = _get_root_tag(xml)
-    return (
-        'version="1.1.0"' in xml
-        or 'xmlns:se="http://www.opengis.net/se"' in xml
-        or re.search(r"\bse:", xml) is not None
-        or re.search(r"<(/?)(?:se:|sld:)?SvgParameter\b", xml) is not None
-        or (re.search(r"\bogc:", xml) is not None and OGC_NS not in root)
-        or (re.search(r"\bsld:", xml) is not None and SLD_NS not in root)
-        or re.search(r"<ogc:PropertyName>\s*[A-Z0-9_]+\s*</ogc:PropertyName>", xml) is not None
-    )
+_SLD = f"{{{SLD_NS_URI}}}"
+_SE = f"{{{SE_NS_URI}}}"
+_OGC_PROPERTY_NAME = f"{{{OGC_NS_URI}}}PropertyName"
+_XSI_SCHEMA_LOCATION = f"{{{XSI_NS_URI}}}schemaLocation"
+
+_UPPERCASE_PROPERTY = re.compile(r"[A-Z0-9_]+")
 
+_SE_DECLARATION = f'xmlns:se="{SE_NS_URI}"'.encode()
+_SLD_DECLARATION = f'xmlns:sld="{SLD_NS_URI}"'.encode()
+_SE_REBOUND = f'xmlns:se="{SLD_NS_URI}"'.encode()
+_SE_TAG_RENAMES = ((b"<se:", b"<sld:"), (b"</se:", b"</sld:"))
+_SVG_PARAMETER_RENAMES = tuple(
+    (f"<{p}SvgParameter".encode(), f"<{p}CssParameter".encode())
+    for p in ("", "/", "sld:", "/sld:")
+)
 
-def _ensure_root_prefix(xml: str) -> str:
-    xml = re.sub(r"<StyledLayerDescriptor\b", "<sld:StyledLayerDescriptor", xml)
-    xml = re.sub(r"</StyledLayerDescriptor>", "</sld:StyledLayerDescriptor>", xml)
-    return xml
 
+class InvalidSLDError(Exception):
+    pass
 
-def _ensure_namespace_in_root(xml: str, namespace_decl: str) -> str:
-    root = _get_root_tag(xml)
-    if not root or namespace_decl in root:
-        return xml
-    new_root = root[:-1] + f" {namespace_decl}>"
-    return xml.replace(root, new_root, 1)
 
+class SLDNeedsNormalization(Exception):
+    """Indica que el SLD necesita ser normalizado antes de enviarse a GeoServer."""
 
-def _normalize_schema_location(xml: str) -> str:
-    replacement = (
-        'xsi:schemaLocation="http://www.opengis.net/sld '
-        'http://schemas.opengis.net/sld/1.0.0/StyledLayerDescriptor.xsd"'
+    pass
+
+
+class NormalizedSLD(NamedTuple):
+    body: bytes
+    changed: bool
+    root: etree._Element
+
+
+def _qualify(name: str):
+    """
+    En modo `recover` un prefijo sin declarar queda literal ("ogc:Filter").
+    Regresa `(nombre_calificado, prefijo_literal)`.
+    """
+    if name.startswith("{") or ":" not in name:
+        return name, None
+    prefix, local = name.split(":", 1)
+    uri = KNOWN_PREFIXES.get(prefix)
+    return (f"{{{uri}}}{local}" if uri else name), prefix
+
+
+class _Normalizer:
+    """
+    Un solo recorrido con `iterparse`: en modo estricto el filtro de tags se
+    evalúa en C y Python solo ve los elementos que hay que tocar (se:*,
+    SvgParameter, PropertyName, ElseFilter, Name).
+
+    Las correcciones que hacen falta para GeoServer (SE → SLD, SvgParameter,
+    versión 1.1.0, prefijos sin declarar, PropertyName en MAYÚSCULAS) se
+    aplican al momento y marcan el documento como modificado. Las cosméticas
+    (PropertyName a minúsculas, ElseFilter, Name vacíos, schemaLocation)
+    solo se aplican si hubo alguna de las primeras, igual que hacía
+    `needs_fix` + `fix_sld`.
+    """
+
+    TAGS = (
+        f"{_SE}*",
+        "{*}SvgParameter",
+        _OGC_PROPERTY_NAME,
+        f"{_SLD}ElseFilter",
+        f"{_SLD}Name",
     )
-    if "xsi:schemaLocation=" in xml:
-        xml = re.sub(r'xsi:schemaLocation="[^"]+"', replacement, xml, count=1)
-    else:
-        root = _get_root_tag(xml)
-        if root:
-            new_root = root[:-1] + f" {replacement}>"
-            xml = xml.replace(root, new_root, 1)
-    return xml
-
-
-def _convert_svg_to_css_parameter(xml: str) -> str:
-    xml = re.sub(r"<(/?)se:SvgParameter\b", r"<\1sld:CssParameter", xml)
-    xml = re.sub(r"<(/?)sld:SvgParameter\b", r"<\1sld:CssParameter", xml)
-    xml = re.sub(r"<(/?)SvgParameter\b", r"<\1CssParameter", xml)
-    return xml
-
-
-def _lowercase_property_names(xml: str) -> str:
-    """Convierte valores de ogc:PropertyName a minúsculas (QGIS exporta nombres en MAYÚSCULAS)."""
-    def repl(match: re.Match) -> str:
-        value = match.group(1).strip()
-        return f"<ogc:PropertyName>{value.lower()}</ogc:PropertyName>"
-
-    return re.sub(
-        r"<ogc:PropertyName>\s*([^<]+?)\s*</ogc:PropertyName>",
-        repl,
-        xml,
+
+    def __init__(self, recover: bool, changed: bool = False):
+        self.recover = recover
+        self.changed = changed
+        self.deferred = []
+
+    def iterparse(self, data: bytes):
+        return etree.iterparse(
+            io.BytesIO(data),
+            events=("end",),
+            # Con prefijos sin declarar los nombres quedan literales y no
+            # coinciden con el filtro: en ese caso se recorre todo.
+            tag=None if self.recover else self.TAGS,
+            recover=self.recover,
+            resolve_entities=False,
+            no_network=True,
+            huge_tree=True,
+        )
+
+    def visit(self, el):
+        tag = el.tag
+        if not isinstance(tag, str):
+            return  # comentarios / PIs
+
+        if self.recover:
+            tag, literal_prefix = _qualify(tag)
+            if literal_prefix:
+                self.changed = True
+            if el.attrib:
+                self._visit_attributes(el)
+
+        if tag.startswith(_SE):
+            tag = _SLD + tag.removeprefix(_SE)
+            self.changed = True
+            if el.attrib:
+                self._visit_attributes(el)
+
+        if tag.endswith("}SvgParameter") or tag == "SvgParameter":
+            tag = tag[: -len("SvgParameter")] + "CssParameter"
+            self.changed = True
+
+        if tag != el.tag:
+            el.tag = tag
+
+        if tag == _OGC_PROPERTY_NAME:
+            self._visit_property_name(el)
+        elif tag == f"{_SLD}ElseFilter":
+            if el.attrib and len(el) == 0:
+                self.deferred.append(el.attrib.clear)
+        elif tag == f"{_SLD}Name":
+            if len(el) == 0 and not (el.text or "").strip():
+                self.deferred.append(lambda el=el: _remove_keeping_tail(el))
+
+    def _visit_attributes(self, el):
+        for name in list(el.attrib):
+            new_name, literal_prefix = _qualify(name)
+            if new_name.startswith(_SE):
+                new_name = _SLD + new_name.removeprefix(_SE)
+            if new_name != name or literal_prefix:
+                el.attrib[new_name] = el.attrib.pop(name)
+                self.changed = True
+
+    def _visit_property_name(self, el):
+        if len(el) or not el.text:
+            return
+        value = el.text.strip()
+        if _UPPERCASE_PROPERTY.fullmatch(value):
+            el.text = value.lower()
+            self.changed = True
+        elif el.text != value.lower():
+            self.deferred.append(
+                lambda el=el, value=value: setattr(el, "text", value.lower())
+            )
+
+    def finish(self, root):
+        """Ajustes de la raíz; regresa la raíz final."""
+        if root.get("version") == "1.1.0":
+            root.set("version", "1.0.0")
+            self.changed = True
+        if SE_NS_URI in root.nsmap.values():
+            self.changed = True
+
+        if not self.changed:
+            return root
+
+        for apply in self.deferred:
+            apply()
+
+        if self.recover or not root.tag.startswith(_SLD):
+            # lxml no permite cambiar el nsmap de un elemento: solo en este
+            # caso (raro) se crea una raíz nueva con los namespaces declarados
+            root = _rebuild_root(root)
+        elif XSI_NS_URI in root.nsmap.values():
+            root.set(_XSI_SCHEMA_LOCATION, SLD_1_0_SCHEMA_LOCATION)
+
+        # Quita xmlns:se y demás declaraciones que ya no se usan
+        etree.cleanup_namespaces(root)
+        return root
+
+
+def _remove_keeping_tail(el):
+    parent = el.getparent()
+    if parent is None:
+        return
+    if el.tail:
+        previous = el.getprevious()
+        if previous is not None:
+            previous.tail = (previous.tail or "") + el.tail
+        else:
+            parent.text = (parent.text or "") + el.tail
+    parent.remove(el)
+
+
+def _rebuild_root(root):
+    """
+    Raíz `sld:StyledLayerDescriptor` con sld/ogc/xlink/xsi declarados y
+    schemaLocation de SLD 1.0.0, moviendo los hijos de la raíz original.
+    """
+    nsmap = dict(ROOT_NSMAP)
+    for prefix, uri in root.nsmap.items():
+        if prefix and prefix not in nsmap and uri not in (SE_NS_URI, *nsmap.values()):
+            nsmap[prefix] = uri
+
+    new_root = etree.Element(
+        _SLD + etree.QName(root).localname.split(":")[-1], nsmap=nsmap
     )
+    for name, value in root.attrib.items():
+        new_root.set(name, value)
+    new_root.set(_XSI_SCHEMA_LOCATION, SLD_1_0_SCHEMA_LOCATION)
+    new_root.text = root.text
+    new_root.extend(list(root))
+    return new_root
+
+
+def _rewrite_qgis_markup(data: bytes):
+    """
+    Reescritura a nivel de bytes de lo que exporta QGIS: etiquetas `se:` a
+    `sld:` y SvgParameter a CssParameter. Es mucho más barata que renombrar
+    cada elemento en el árbol. Regresa None si no había nada que reescribir.
+
+    Solo se toca el prefijo `se` declarado literalmente con la URI de SE; el
+    resto de los casos (otro prefijo, comillas simples, SE como namespace
+    por omisión) los resuelve `_Normalizer` sobre el árbol.
+    """
+    rewritten = data
+    if _SE_DECLARATION in rewritten:
+        if _SLD_DECLARATION in rewritten:
+            # Redeclarar xmlns:sld en el mismo elemento sería XML inválido
+            # ("Attribute xmlns:sld redefined"); xmlns:se queda sin uso y
+            # cleanup_namespaces la quita.
+            rewritten = rewritten.replace(_SE_DECLARATION, _SE_REBOUND)
+        else:
+            rewritten = rewritten.replace(_SE_DECLARATION, _SLD_DECLARATION)
+        for old, new in _SE_TAG_RENAMES:
+            rewritten = rewritten.replace(old, new)
+    for old, new in _SVG_PARAMETER_RENAMES:
+        rewritten = rewritten.replace(old, new)
+    return rewritten if rewritten != data else None
+
+
+def _normalize_pass(data: bytes, recover: bool, changed: bool = False):
+    normalizer = _Normalizer(recover, changed)
+    context = normalizer.iterparse(data)
+    for _, el in context:
+        normalizer.visit(el)
+    if context.root is None:
+        raise InvalidSLDError("El SLD está vacío")
+    return normalizer, normalizer.finish(context.root)
+
+
+def normalize_sld(xml) -> NormalizedSLD:
+    """
+    Normaliza un SLD para GeoServer en un solo recorrido. Acepta str o bytes.
+
+    Transformaciones:
+    - version="1.1.0" → "1.0.0"
+    - Elementos y atributos se:* → sld:*
+    - SvgParameter → CssParameter (con o sin prefijo)
+    - ogc:PropertyName a minúsculas (QGIS exporta en MAYÚSCULAS)
+    - Raíz sld:StyledLayerDescriptor con xmlns sld/ogc declarados
+    - xsi:schemaLocation de SLD 1.0.0
+    - <sld:ElseFilter/> sin atributos y sin <sld:Name> vacíos
+
+    Si el documento no necesita corrección, `body` son los bytes originales
+    y `changed` es False. `root` es el árbol resultante, para validar sin
+    volver a parsear.
+
+    Raises:
+        InvalidSLDError: Si el documento no es XML bien formado
+    """
+    data = xml.encode("utf-8") if isinstance(xml, str) else bytes(xml)
+
+    result = None
+    rewritten = _rewrite_qgis_markup(data)
+    if rewritten is not None:
+        try:
+            result = _normalize_pass(rewritten, recover=False, changed=True)
+        except etree.XMLSyntaxError:
+            # El documento original se corrige (o se rechaza) en el árbol
+            pass
+
+    if result is None:
+        try:
+            result = _normalize_pass(data, recover=False)
+        except etree.XMLSyntaxError as e:
+            # Prefijos sin declarar (ogc:, sld:) son error de namespace, no de
+            # sintaxis: se reintenta en modo recover y _qualify los resuelve.
+            if e.code != etree.ErrorTypes.NS_ERR_UNDEFINED_NAMESPACE:
+                raise InvalidSLDError(f"XML inválido: {e}") from e
+            try:
+                result = _normalize_pass(data, recover=True)
+            except etree.XMLSyntaxError as e2:
+                raise InvalidSLDError(f"XML inválido: {e2}") from e2
+
+    normalizer, root = result
+    if not normalizer.changed:
+        return NormalizedSLD(data, False, root)
+
+    body = etree.tostring(root, xml_declaration=True, encoding="UTF-8")
+    return NormalizedSLD(body, True, root)
+
+
+def needs_fix(xml) -> bool:
+    """Detecta si un SLD requiere corrección (QGIS, SLD 1.1.0, etc.)."""
+    try:
+        return normalize_sld(xml).changed
+    except InvalidSLDError:
+        return False
 
 
 def fix_sld(xml) -> str:
     """
     Normalización completa de SLD para compatibilidad con GeoServer.
-    Acepta str o bytes. Retorna str.
-
-    Transformaciones (en orden):
-    1. version="1.1.0" → "1.0.0"
-    2. xmlns:se → xmlns:sld
-    3. se: → sld: (prefijos de elementos y atributos)
-    4. Raíz: <StyledLayerDescriptor → <sld:StyledLayerDescriptor
-    5. Asegura xmlns:sld en la raíz
-    6. Asegura xmlns:ogc en la raíz si hay referencias ogc:
-    7. Corrige/agrega xsi:schemaLocation a SLD 1.0.0
-    8. SvgParameter → CssParameter (maneja prefijos se:, sld: y sin prefijo)
-    9. Convierte ogc:PropertyName a minúsculas
-    10. Normaliza <sld:ElseFilter/> vacío
-    11. Elimina <sld:Name></sld:Name> vacíos
+    Acepta str o bytes. Retorna str. Ver `normalize_sld`.
     """
-    if isinstance(xml, bytes):
-        xml = xml.decode("utf-8")
+    return normalize_sld(xml).body.decode("utf-8")
 
-    xml = re.sub(r'version="1\.1\.0"', 'version="1.0.0"', xml)
-    xml = xml.replace(
-        'xmlns:se="http://www.opengis.net/se"',
-        'xmlns:sld="http://www.opengis.net/sld"',
-    )
-    xml = re.sub(r"\bse:", "sld:", xml)
-    xml = _ensure_root_prefix(xml)
-    xml = _ensure_namespace_in_root(xml, SLD_NS)
-    if re.search(r"\bogc:", xml):
-        xml = _ensure_namespace_in_root(xml, OGC_NS)
-    xml = _normalize_schema_location(xml)
-    xml = _convert_svg_to_css_parameter(xml)
-    xml = _lowercase_property_names(xml)
-    xml = re.sub(r"<sld:ElseFilter[^>]*/>", "<sld:ElseFilter/>", xml)
-    xml = re.sub(r"<sld:Name>\s*</sld:Name>", "", xml)
-    return xml
+
+def normalize_mixed_sld(xml: bytes) -> bytes:
+    """Convierte SLD 1.1.0 con elementos se: a SLD 1.0.0 válido. Ver `normalize_sld`."""
+    return normalize_sld(xml).body
+
+
+def validate_sld_before_post(xml) -> None:
+    """
+    Valida un SLD antes de enviarlo a GeoServer.
+
+    Acepta bytes o el árbol ya parseado (`NormalizedSLD.root`), para no
+    volver a parsear el documento.
+
+    Detecta:
+    - SLD 1.0.0 con elementos SE inválidos (mezcla de namespaces)
+    - SLD 1.1.0 con elementos se: que necesitan normalización
+
+    Raises:
+        InvalidSLDError: Si el SLD tiene errores que no se pueden corregir
+        SLDNeedsNormalization: Si el SLD necesita ser normalizado
+    """
+    if isinstance(xml, (bytes, str)):
+        try:
+            root = etree.fromstring(
+                xml.encode("utf-8") if isinstance(xml, str) else xml,
+                parser=etree.XMLParser(resolve_entities=False, no_network=True),
+            )
+        except etree.XMLSyntaxError as e:
+            raise InvalidSLDError(f"XML inválido: {e}") from e
+    else:
+        root = xml
+
+    version = root.attrib.get("version")
+
+    # Un solo recorrido en busca de elementos se:
+    illegal = {el.tag for el in root.iter(f"{_SE}*")}
+
+    # SLD 1.1.0 necesita normalización para que GeoServer preserve los estilos
+    if version == "1.1.0" and illegal:
+        raise SLDNeedsNormalization("SLD 1.1.0 con elementos SE necesita normalización")
+
+    # Validar SLD 1.0.0
+    is_sld_1_0 = version == "1.0.0" and root.nsmap.get("sld") == SLD_NS_URI
+    if is_sld_1_0 and illegal:
+        raise InvalidSLDError(
+            "SLD 1.0.0 contiene elementos SE inválidos: " + ", ".join(sorted(illegal))
+        )